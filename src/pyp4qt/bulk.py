@@ -0,0 +1,232 @@
+# Python Modules
+import os
+from P4 import P4, P4Exception
+
+
+# Maximum number of paths sent with a single command
+CHUNK_SIZE = 500
+
+
+class BulkReport(object):
+    """ Results, errors and warnings of a command run over many files.
+
+    Errors and warnings reported by the server start with the path they are about, e.g.
+    "//depot/shots/a.ma - file(s) not on client.", so they can be looked up per file.
+    """
+
+    def __init__(self, command):
+        self._command = command
+        self._commands = 0
+        self._results = list()
+        self._messages = list()
+        self._errors = list()
+        self._warnings = list()
+
+    def __str__(self):
+        return "<BulkReport: {} commands={} results={} errors={} warnings={}>".format(
+            self._command,
+            self._commands,
+            len(self._results),
+            len(self._errors),
+            len(self._warnings)
+        )
+
+    def __repr__(self):
+        return self.__str__()
+
+    @staticmethod
+    def message_path(message):
+        """ Returns the path a server message is about, or an empty string if it doesn't start with one.
+
+        Args:
+            message (str)
+
+        Returns:
+            str
+        """
+        message = str(message).strip()
+
+        if " - " not in message:
+            return str()
+
+        return message.split(" - ", 1)[0]
+
+    def add(self, result, errors=None, warnings=None):
+        """ Adds the output of a command.
+
+        Args:
+            result (list)
+            errors (list[str])
+            warnings (list[str])
+
+        Returns:
+            None
+        """
+        self._commands += 1
+
+        for item in result or list():
+            if isinstance(item, dict):
+                self._results.append(item)
+            else:
+                self._messages.append(str(item))
+
+        self._errors += [str(error) for error in errors or list()]
+        self._warnings += [str(warning) for warning in warnings or list()]
+        return
+
+    def command(self):
+        return self._command
+
+    def commands(self):
+        """ Returns the number of commands sent to the server.
+
+        Returns:
+            int
+        """
+        return self._commands
+
+    def results(self):
+        """ Returns the tagged records of the files the command succeeded on.
+
+        Returns:
+            list[dict]
+        """
+        return list(self._results)
+
+    def messages(self):
+        return list(self._messages)
+
+    def errors(self):
+        return list(self._errors)
+
+    def warnings(self):
+        return list(self._warnings)
+
+    def succeeded(self):
+        """ Returns True if the server reported no errors.
+
+        Returns:
+            bool
+        """
+        return not self._errors
+
+    def failures(self):
+        """ Returns the errors and the warnings about a file, e.g. "//depot/shots/a.ma - file(s) not opened on this
+        client.", which the command left as it was.
+
+        Returns:
+            list[str]
+        """
+        return self._errors + [warning for warning in self._warnings if self.message_path(warning)]
+
+    def complete(self):
+        """ Returns True if the command was applied to every file, i.e. there were no errors or warnings about a file.
+
+        Returns:
+            bool
+        """
+        return not self.failures()
+
+    def files(self, key="clientFile"):
+        """ Returns a field of every result, e.g. the local path of every file the command succeeded on.
+
+        Args:
+            key (str)
+
+        Returns:
+            list[str]
+        """
+        return [item[key] for item in self._results if item.get(key)]
+
+    def errors_by_path(self):
+        """ Returns the errors and warnings keyed by the path they are about.
+
+        Returns:
+            dict[str, str]
+        """
+        result = dict()
+
+        for message in self._warnings + self._errors:
+            path = self.message_path(message)
+
+            if path:
+                result[path] = message
+
+        return result
+
+    def exception(self):
+        """ Returns a P4Exception describing every error and warning about a file, or None if there were none.
+
+        Returns:
+            P4Exception
+        """
+        if self.complete():
+            return None
+
+        warnings = [warning for warning in self._warnings if self.message_path(warning)]
+
+        return P4Exception("[P4#run] Errors during command execution( \"p4 {}\" )\n\n{}".format(
+            self._command,
+            "\n".join(["\t[Error]: '{}'".format(error) for error in self._errors] +
+                      ["\t[Warning]: '{}'".format(warning) for warning in warnings])
+        ))
+
+
+def chunks(paths, chunk_size=CHUNK_SIZE):
+    """ Yields consecutive lists of at most chunk_size paths.
+
+    Args:
+        paths (list[str])
+        chunk_size (int)
+
+    Returns:
+        generator[list[str]]
+    """
+    paths = list(paths)
+    chunk_size = max(int(chunk_size), 1)
+
+    for i in range(0, len(paths), chunk_size):
+        yield paths[i:i + chunk_size]
+
+
+def run_bulk(p4, command, paths, args=None, chunk_size=CHUNK_SIZE):
+    """ Runs a command over many files with as few round trips as possible.
+
+    The paths are sent in chunks of chunk_size per command rather than one command per file. Errors don't raise,
+    they're collected per file in the report along with the results.
+
+    Args:
+        p4 (P4)
+        command (str): e.g. "edit"
+        paths (list[str])
+        args (list[str]): Options passed before the paths, e.g. ["-c", "1234"]
+        chunk_size (int)
+
+    Returns:
+        BulkReport
+    """
+    report = BulkReport(command)
+    args = [str(arg) for arg in args or list()]
+
+    for chunk in chunks(paths, chunk_size):
+        with p4.at_exception_level(P4.RAISE_NONE):
+            result = p4.run(command, *(args + chunk))
+
+        report.add(result, getattr(p4, "errors", None), getattr(p4, "warnings", None))
+
+    return report
+
+
+def normalize_path(path):
+    """ Returns a path normalized to compare local and depot paths reported by the server with the paths given.
+
+    Args:
+        path (str)
+
+    Returns:
+        str
+    """
+    if path.startswith("//"):
+        return path
+
+    return os.path.normcase(os.path.normpath(path))
@@ -0,0 +1,244 @@
+# Python Modules
+import os
+import json
+import time
+import sqlite3
+import threading
+
+# Project Modules
+from pyp4qt import globals
+
+
+class MetadataCache(object):
+    """ SQLite-backed store of depot query results.
+
+    Results of "dirs", "files", "fstat" and "filelog" queries are stored per server and client, keyed by the command
+    that produced them, along with the depot path they cover and the latest submitted change number they were
+    valid at. The cache can be shared between threads.
+
+    The browsers use the cache when the PYP4QT_METADATA_CACHE environment variable is set, see from_environment.
+
+    Examples:
+        cache = MetadataCache()
+        session.set_metadata_cache(cache)
+    """
+
+    FILE_NAME = "metadata_cache.db"
+
+    # Bump when the layout of the entries table changes so stale databases are rebuilt
+    SCHEMA_VERSION = 1
+
+    # Caches shared by the sessions of this process, keyed by database path
+    _shared = dict()
+    _shared_lock = threading.Lock()
+
+    @staticmethod
+    def default_path():
+        """ Returns the path of the cache database within the adapter's settings path.
+
+        Returns:
+            str
+        """
+        from pyp4qt.apps import interop
+        return os.path.join(interop.get_settings_path(), MetadataCache.FILE_NAME)
+
+    @staticmethod
+    def shared(path=None):
+        """ Returns the cache of a database shared by every session of this process, opening it when first needed.
+
+        Args:
+            path (str): Path of the cache database, the default path if None.
+
+        Returns:
+            MetadataCache
+        """
+        path = path or MetadataCache.default_path()
+
+        with MetadataCache._shared_lock:
+            cache = MetadataCache._shared.get(path)
+
+            if cache is None or cache.is_closed():
+                cache = MetadataCache._shared[path] = MetadataCache(path)
+
+        return cache
+
+    @staticmethod
+    def from_environment():
+        """ Returns the shared cache enabled by the PYP4QT_METADATA_CACHE environment variable, or None if it isn't.
+
+        The variable is "1" to use the default database, or the path of a database.
+
+        Returns:
+            MetadataCache
+        """
+        value = os.environ.get(globals.METADATA_CACHE, str()).strip()
+
+        if value.lower() in ("", "0", "false", "no", "off"):
+            return None
+
+        if value.lower() in ("1", "true", "yes", "on"):
+            return MetadataCache.shared()
+
+        return MetadataCache.shared(value)
+
+    def __init__(self, path=None):
+        self._lock = threading.Lock()
+        self._connection = None
+        self._path = path or self.default_path()
+
+        directory = os.path.dirname(self._path)
+
+        if directory and not os.path.isdir(directory):
+            os.makedirs(directory)
+
+        self._connection = sqlite3.connect(self._path, check_same_thread=False)
+        self._create_tables()
+
+    def __del__(self):
+        self.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+        return
+
+    def _create_tables(self):
+        with self._lock, self._connection:
+            version = self._connection.execute("PRAGMA user_version").fetchone()[0]
+
+            if version != MetadataCache.SCHEMA_VERSION:
+                self._connection.execute("DROP TABLE IF EXISTS entries")
+                self._connection.execute("PRAGMA user_version = {}".format(MetadataCache.SCHEMA_VERSION))
+
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS entries ("
+                "server TEXT NOT NULL, "
+                "command TEXT NOT NULL, "
+                "path TEXT NOT NULL, "
+                "change INTEGER NOT NULL, "
+                "time REAL NOT NULL, "
+                "data TEXT NOT NULL, "
+                "PRIMARY KEY (server, command))"
+            )
+            self._connection.execute("CREATE INDEX IF NOT EXISTS entries_path ON entries (server, path)")
+        return
+
+    def path(self):
+        """ Returns the path of the cache database.
+
+        Returns:
+            str
+        """
+        return self._path
+
+    def is_closed(self):
+        """ Returns True if the cache database has been closed.
+
+        Returns:
+            bool
+        """
+        return self._connection is None
+
+    def get(self, server, command):
+        """ Returns the cached change number and results of a command, or None if it hasn't been cached.
+
+        Args:
+            server (str): Server and client the command ran against, e.g. "my_client@ssl:perforce:1666"
+            command (str): Command and arguments, e.g. "files -e //depot/shots/*"
+
+        Returns:
+            tuple(int, list[dict])
+        """
+        with self._lock:
+            if self._connection is None:
+                return None
+
+            row = self._connection.execute(
+                "SELECT change, data FROM entries WHERE server = ? AND command = ?",
+                (server, command)
+            ).fetchone()
+
+        if row is None:
+            return None
+
+        return row[0], json.loads(row[1])
+
+    def put(self, server, command, path, change, data):
+        """ Stores the results of a command.
+
+        Args:
+            server (str)
+            command (str)
+            path (str): Depot path the results cover, e.g. "//depot/shots/..."
+            change (int): Latest submitted change number affecting the path when the command ran.
+            data (list[dict])
+
+        Returns:
+            None
+        """
+        data = json.dumps([item for item in data if isinstance(item, dict)])
+
+        with self._lock:
+            if self._connection is None:
+                return
+
+            with self._connection:
+                self._connection.execute(
+                    "INSERT OR REPLACE INTO entries (server, command, path, change, time, data) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (server, command, path, int(change), time.time(), data)
+                )
+        return
+
+    def invalidate(self, server, path=None):
+        """ Removes cached results for a server, limited to those covering a depot path when one is given.
+
+        Args:
+            server (str)
+            path (str): Depot path, e.g. "//depot/shots"
+
+        Returns:
+            None
+        """
+        with self._lock:
+            if self._connection is None:
+                return
+
+            with self._connection:
+                if path is None:
+                    self._connection.execute("DELETE FROM entries WHERE server = ?", (server,))
+                else:
+                    path = path.rstrip("/.")
+                    self._connection.execute(
+                        "DELETE FROM entries WHERE server = ? AND (path = ? OR substr(path, 1, ?) = ?)",
+                        (server, path + "/...", len(path) + 1, path + "/")
+                    )
+        return
+
+    def clear(self):
+        """ Removes all cached results.
+
+        Returns:
+            None
+        """
+        with self._lock:
+            if self._connection is None:
+                return
+
+            with self._connection:
+                self._connection.execute("DELETE FROM entries")
+        return
+
+    def close(self):
+        """ Closes the cache database.
+
+        Returns:
+            None
+        """
+        with self._lock:
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
+        return
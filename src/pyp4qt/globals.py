@@ -17,3 +17,6 @@ DCC = "standalone"
 CURRENT_COMMENT = "PYP4QT_COMMENT"
 CURRENT_DCC = "PYP4QT_DCC"
 
+# "1" to answer depot queries from the default metadata cache, or the path of a cache database
+METADATA_CACHE = "PYP4QT_METADATA_CACHE"
+
@@ -23,6 +23,9 @@ class OutputProgress(Progress, OutputHandler):
         if 'totalFileCount' in stat:
             self.totalFileCount = int(stat['totalFileCount'])
             Utils.logger().debug("TOTAL FILE COUNT: %s" % (self.totalFileCount))
+
+            # Parallel transfers report the files in the order threads finish them, keep the overall bar on the total
+            self.ui.setTotalFiles(self.totalFileCount)
         if 'totalFileSize' in stat:
             self.totalFileSize = int(stat['totalFileSize'])
             Utils.logger().debug("TOTAL FILE SIZE: %s" % (self.totalFileSize))
@@ -4,6 +4,7 @@ from P4 import P4
 from PySide2 import QtCore, QtGui, QtWidgets
 from pyp4qt import utils
 from pyp4qt.apps import interop
+from pyp4qt.session import FileQuery
 
 
 class PerforceItem(object):
@@ -59,6 +60,10 @@ class PerforceItem(object):
         return list(reversed(result))
 
 class PerforceItemModel(QtCore.QAbstractItemModel):
+    # fstat fields read when populating a directory, "dir" keeps the directory records
+    FSTAT_FIELDS = ['dir', 'depotFile', 'clientFile', 'change', 'action', 'type', 'workRev',
+                    'headAction', 'headType', 'headTime', 'headRev']
+
     def __init__(self, p4, parent=None):
         super(PerforceItemModel, self).__init__(parent)
 
@@ -95,10 +100,13 @@ class PerforceItemModel(QtCore.QAbstractItemModel):
         # dirpath = '/'.join([p4path,'*'])
 
         with self.p4.at_exception_level(P4.RAISE_ERRORS):
-            fstat_args = ['-Olhp', '-Dl', '/'.join([p4path,'*'])]
-            # if not showDeleted:
-            #     fstat_args.insert(1, '-F "^headAction=delete & ^headAction=move/delete"')
-            p4fstat = self.p4.run_fstat(*fstat_args)
+            query = FileQuery(self.p4, p4path).option('-Olhp', '-Dl').fields(*self.FSTAT_FIELDS)
+
+            # Only show deleted files in depot view (for the purpose of undeleting them)
+            if isClientPath and not self.showDeleted:
+                query.exclude_deleted()
+
+            p4fstat = query.run()
 
             files = []
             folders = []
@@ -124,30 +132,21 @@ class PerforceItemModel(QtCore.QAbstractItemModel):
                 # Check if this is in a pending changelist,
                 # which gives us different fields to query
                 if f.get('change'):
-                    if f['action'] in ['delete','move/delete'] and isClientPath:
-                        continue
-
                     treeItem.appendFileItem( filepath, f['type'], '', f['action'], f['workRev'] )
                 else:
-                    # Only show deleted files in depot view (for the purpose of undeleting them)
-                    if f['headAction'] in ['delete','move/delete'] and isClientPath:
-                        continue
-
                     treeItem.appendFileItem( filepath, f['headType'], f['headTime'], f['headAction'], f['headRev'] )
 
             # Show pending changelist folders in client view
             # (fstat is configured to automatically add the files above if they exist in the current directory,
             # but if they exist in a subdir they won't be found by default)
             if isClientPath:
-                # if not showDeleted:
-                #     fstat_args.insert(1, '-F "^headAction=delete & ^headAction=move/delete"')
-
                 # Query pending changes (just default for now)
-                fstat_pending_args = ['-Or', '-F', 'change=default', '/'.join([p4path,'...'])]
-                p4fstat = self.p4.run_fstat(*fstat_pending_args)
+                pendingQuery = FileQuery(self.p4, p4path, recursive=True).option('-Or').where('change', ['default'])
+                pendingQuery.fields('clientFile')
+                p4fstat = pendingQuery.run()
                 if p4fstat:
                     p4fstat = p4fstat[0]
-                    utils.logger().debug('fstat(%s): %s' % (fstat_pending_args, p4fstat['clientFile']))
+                    utils.logger().debug('fstat(%s): %s' % (pendingQuery, p4fstat['clientFile']))
 
                     workspaceRoot = os.path.normpath(self.p4.run_info()[0]['client_root'].replace('\\', '/'))
                     p4path = os.path.normpath(p4path).replace(workspaceRoot, '')
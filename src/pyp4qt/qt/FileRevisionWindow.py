@@ -1,19 +1,30 @@
 import os
 import sys
+import datetime
 from P4 import P4, P4Exception
 from PySide2 import QtCore, QtGui, QtWidgets
 
 import pyp4qt.utils
 from pyp4qt import utils
 from pyp4qt.apps import interop
+from pyp4qt.session import Session
 from pyp4qt.qt.ErrorMessageWindow import displayErrorUI
 from pyp4qt.qt import DepotClientViewModel
 
 class BaseRevisionTab(QtWidgets.QWidget):
+    # Number of revisions loaded at a time, older pages are loaded when scrolling to the end of the table
+    REVISION_PAGE_SIZE = 50
+
     def __init__(self, p4, parent=None):
         super(BaseRevisionTab, self).__init__(parent)
 
         self.p4 = p4
+        self.revisionPath = None
+        self.revisionsComplete = False
+
+        # Opt-in, histories viewed before are answered from the metadata cache
+        if isinstance(self.p4, Session):
+            self.p4.use_environment_cache()
 
         path = os.path.join(interop.get_icons_path(), "p4.png")
         icon = QtGui.QIcon(path)
@@ -44,6 +55,7 @@ class BaseRevisionTab(QtWidgets.QWidget):
         self.getLatestBtn = QtWidgets.QPushButton("Sync to Latest Revision")
         self.getPreviewBtn = QtWidgets.QPushButton("Preview Scene")
         self.getPreviewBtn.setEnabled(False)
+        self.rollbackBtn = QtWidgets.QPushButton("Rollback Selected Files...")
 
         self.getRevisionBtn.setVisible(False)
         self.getLatestBtn.setVisible(False)
@@ -56,6 +68,7 @@ class BaseRevisionTab(QtWidgets.QWidget):
         # self.model.populate('//depot', showDeleted=True)
 
         self.fileTree = QtWidgets.QTreeView()
+        self.fileTree.setSelectionMode(QtWidgets.QAbstractItemView.ExtendedSelection)
         self.fileTree.expandAll()
         # self.fileTree.setModel(self.model)
 
@@ -109,6 +122,8 @@ class BaseRevisionTab(QtWidgets.QWidget):
         bottomLayout.addWidget(self.getPreviewBtn)
         bottomLayout.addSpacerItem(QtWidgets.QSpacerItem(20, 16))
         bottomLayout.addWidget(self.getLatestBtn)
+        bottomLayout.addSpacerItem(QtWidgets.QSpacerItem(20, 16))
+        bottomLayout.addWidget(self.rollbackBtn)
 
         main_layout.addLayout(bottomLayout)
         main_layout.addWidget(self.horizontalLine)
@@ -125,6 +140,8 @@ class BaseRevisionTab(QtWidgets.QWidget):
         pyp4qt.utils.connect(self.onSyncLatest)
         pyp4qt.utils.connect(self.onRevertToSelection)
         pyp4qt.utils.connect(self.getPreview)
+        self.tableWidget.verticalScrollBar().valueChanged.connect(self.onRevisionsScrolled)
+        self.rollbackBtn.clicked.connect(self.onRollbackSelection)
 
     #--------------------------------------------------------------------------
     # SLOTS
@@ -171,9 +188,68 @@ class BaseRevisionTab(QtWidgets.QWidget):
             displayErrorUI(e)
 
     def clearRevisions(self):
+        self.fileRevisions = []
+        self.revisionPath = None
+        self.revisionsComplete = False
         self.tableWidget.clearContents()
         self.tableWidget.setRowCount(0)
 
+    def onRevisionsScrolled(self, value):
+        if value == self.tableWidget.verticalScrollBar().maximum():
+            self.fetchOlderRevisions()
+
+    def hasOlderRevisions(self):
+        if not self.revisionPath or not self.fileRevisions or self.revisionsComplete:
+            return False
+
+        return int(self.fileRevisions[-1]['revision']) > 1
+
+    def fetchOlderRevisions(self):
+        if not self.hasOlderRevisions():
+            return
+
+        oldestRevision = self.fileRevisions[-1]['revision']
+
+        try:
+            revisions = self.loadRevisions(self.revisionPath, oldestRevision)
+        except P4Exception as e:
+            displayErrorUI(e)
+            return
+
+        # An empty page ends the history even if older revisions were expected, e.g. purged or archived ones
+        if not revisions:
+            self.revisionsComplete = True
+            return
+
+        self.appendFileRevisions(revisions)
+
+    def loadRevisions(self, path, beforeRevision=None):
+        # Only a page of revisions is loaded, with descriptions truncated to 250 characters
+        if isinstance(self.p4, Session):
+            return [{"revision": int(revision['rev']),
+                     "action": revision['action'],
+                     "date": datetime.datetime.fromtimestamp(int(revision['time'])),
+                     "desc": revision['desc'],
+                     "user": revision['user'],
+                     "client": revision['client']
+                     } for revision in self.p4.file_history(path, self.REVISION_PAGE_SIZE, beforeRevision, True)]
+
+        spec = Session.history_spec(path, beforeRevision)
+
+        with self.p4.at_exception_level(P4.RAISE_ERRORS):
+            files = self.p4.run_filelog("-L", "-m", str(self.REVISION_PAGE_SIZE), spec)
+
+        if not files:
+            return []
+
+        return [{"revision": revision.rev,
+                 "action": revision.action,
+                 "date": revision.time,
+                 "desc": revision.desc,
+                 "user": revision.user,
+                 "client": revision.client
+                 } for revision in files[0].each_revision()]
+
     def getSelectedTreeItemData(self):
         index = self.fileTree.selectedIndexes()[0]
         if not index.isValid():
@@ -199,12 +275,77 @@ class BaseRevisionTab(QtWidgets.QWidget):
 
         Utils.logger().debug(filePath)
 
+        if not self.confirmRevertOpened([filePath]):
+            return
+
         desc = "Rollback #{0} to #{1}".format(currentRevision, rollbackRevision)
-        if pyp4qt.utils.sync_previous_revision(self.p4, filePath, rollbackRevision, desc):
+        if pyp4qt.utils.sync_previous_revision(self.p4, filePath, rollbackRevision, desc, revertOpened=True):
             QtWidgets.QMessageBox.information(interop.main_parent_window(), "Success", "Successful {0}".format(desc))
 
         self.populateFileRevisions()
 
+    def confirmRevertOpened(self, paths):
+        # Rolling back takes opened files out of their change lists, so the user has to agree to lose their edits
+        try:
+            opened = pyp4qt.utils.opened_files(self.p4, paths)
+        except P4Exception as e:
+            displayErrorUI(e)
+            return False
+
+        if not opened:
+            return True
+
+        listed = "\n".join(opened[:10]) + ("\n..." if len(opened) > 10 else "")
+        answer = QtWidgets.QMessageBox.question(
+            interop.main_parent_window(), "Rollback Opened Files",
+            "{0} files are opened in your workspace:\n\n{1}\n\nRolling back reverts them and overwrites their local "
+            "changes. Continue?".format(len(opened), listed))
+
+        return answer == QtWidgets.QMessageBox.Yes
+
+    def getSelectedTreePaths(self):
+        paths = []
+
+        for index in self.fileTree.selectionModel().selectedRows():
+            data = index.internalPointer().data
+            if not data:
+                continue
+
+            # Full path is stored in the final column, folders roll back everything below them
+            paths.append(data[-1] + "/..." if data[1] == 'Folder' else data[-1])
+
+        return paths
+
+    def onRollbackSelection(self, *args):
+        paths = self.getSelectedTreePaths()
+        if not paths:
+            return
+
+        target, ok = QtWidgets.QInputDialog.getText(
+            self, "Rollback Files",
+            "Roll {0} selected items back to a changelist (1234), revision (#3) or date (2024/01/31):".format(len(paths)))
+
+        if not ok or not target.strip():
+            return
+
+        if not self.confirmRevertOpened(paths):
+            return
+
+        # Every file is rolled back in one changelist
+        selection = paths[0] if len(paths) == 1 else "{0} items".format(len(paths))
+        desc = "Rollback {0} to {1}".format(selection, target.strip())
+
+        try:
+            change = pyp4qt.utils.rollback_files(self.p4, paths, target, desc, revertOpened=True)
+        except P4Exception as e:
+            displayErrorUI(e)
+            return
+
+        QtWidgets.QMessageBox.information(interop.main_parent_window(), "Success",
+                                          "Successful {0} in change {1}".format(desc, change))
+
+        self.populateFileRevisions()
+
     def onSyncLatest(self, *args):
         data = self.getSelectedTreeItemData()
         if not data:
@@ -297,9 +438,10 @@ class BaseRevisionTab(QtWidgets.QWidget):
             self.isSceneFile = False
 
 
+        self.clearRevisions()
+
         try:
-            with self.p4.at_exception_level(P4.RAISE_ERRORS):
-                files = self.p4.run_filelog("-l", fullname)
+            revisions = self.loadRevisions(fullname)
         except P4Exception as e:
             # TODO - Better error handling here, what if we can't connect etc
             #eMsg, type = parse_perforce_error(e)
@@ -337,45 +479,43 @@ class BaseRevisionTab(QtWidgets.QWidget):
             self.statusBar.showMessage("{0} is not checked out".format(os.path.basename(fullname)))
             self.getRevisionBtn.setEnabled(True)
 
-        # Generate revision dictionary
-        self.fileRevisions = []
+        self.revisionPath = fullname
+        self.appendFileRevisions(revisions)
+
+    def appendFileRevisions(self, revisions):
+        if not revisions:
+            return
 
-        if files:
-            Utils.logger().debug('filelog(%s):%s' % (fullname, files))
-
-            for revision in files[0].each_revision():
-                self.fileRevisions.append({"revision": revision.rev,
-                                           "action": revision.action,
-                                           "date": revision.time,
-                                           "desc": revision.desc,
-                                           "user": revision.user,
-                                           "client": revision.client
-                                           })
-
-            self.tableWidget.setRowCount(len(self.fileRevisions))
-
-            # Map a file action to the path of it's UI icon
-            actionToIcon = {
-                    'edit':         os.path.join(interop.get_icons_path(), "File0440.png"),
-                    'add':          os.path.join(interop.get_icons_path(), "File0242.png"),
-                    'delete':       os.path.join(interop.get_icons_path(), "File0253.png"),
-                    'move/delete':  os.path.join(interop.get_icons_path(), "File0253.png"),
-                    'purge':        os.path.join(interop.get_icons_path(), "File0253.png")
-                }
-
-            # Populate table
-            for i, revision in enumerate(self.fileRevisions):
-                columns = [ 
-                        ("#{0}".format(revision['revision']), None, False),
-                        (revision['user'],  None, False),
-                        (revision['action'].capitalize(), actionToIcon.get(revision['action']), False),
-                        (revision['date'], None, False),
-                        (revision['client'], None, False),
-                        (revision['desc'], None, True)
-                    ]
-
-                for j, data in enumerate(columns):
-                    self.setRevisionTableColumn(i, j, *data)
+        utils.logger().debug('filelog(%s):%s' % (self.revisionPath, revisions))
+
+        first = len(self.fileRevisions)
+        self.fileRevisions += revisions
+
+        self.tableWidget.setRowCount(len(self.fileRevisions))
+
+        # Map a file action to the path of it's UI icon
+        actionToIcon = {
+                'edit':         os.path.join(interop.get_icons_path(), "File0440.png"),
+                'add':          os.path.join(interop.get_icons_path(), "File0242.png"),
+                'delete':       os.path.join(interop.get_icons_path(), "File0253.png"),
+                'move/delete':  os.path.join(interop.get_icons_path(), "File0253.png"),
+                'purge':        os.path.join(interop.get_icons_path(), "File0253.png")
+            }
+
+        # Populate table
+        for i in range(first, len(self.fileRevisions)):
+            revision = self.fileRevisions[i]
+            columns = [ 
+                    ("#{0}".format(revision['revision']), None, False),
+                    (revision['user'],  None, False),
+                    (revision['action'].capitalize(), actionToIcon.get(revision['action']), False),
+                    (revision['date'], None, False),
+                    (revision['client'], None, False),
+                    (revision['desc'], None, True)
+                ]
+
+            for j, data in enumerate(columns):
+                self.setRevisionTableColumn(i, j, *data)
 
         self.tableWidget.resizeColumnsToContents()
         self.tableWidget.resizeRowsToContents()
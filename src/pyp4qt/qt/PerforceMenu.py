@@ -8,7 +8,10 @@ from P4 import P4, P4Exception
 import pyp4qt.utils
 from pyp4qt import utils
 from pyp4qt.apps import interop
+from pyp4qt.bulk import run_bulk, normalize_path
 from pyp4qt.output_progress import OutputProgress
+from pyp4qt.session import Session, SessionPool
+from pyp4qt.transfer import SyncWorker
 from pyp4qt.qt.SubmitProgressWindow import SubmitProgressUI
 
 from pyp4qt.qt.LoginWindow import firstTimeLogin
@@ -25,6 +28,9 @@ class MainShelf:
         self.p4 = p4
         self.deleteUI = None
         self.submitUI = None
+        self.syncThread = None
+        self.syncWorker = None
+        self.syncProgress = None
 
     def close(self):
         # @ToDo this stll seems to be maya specific
@@ -351,27 +357,43 @@ class MainShelf:
         utils.force_changelist_delete(self.p4, changes)
 
     def run_checkoutFile(self, *args):
-        for file in args[1:]:
-            utils.logger().info("Processing {0}...".format(file))
-            result = None
-            try:
-                # @ToDO set this up to use p4.at_exception_level
-                result = self.p4.run_fstat(file)
-            except P4Exception as e:
-                pass
+        files = list(args[1:])
 
-            try:
-                if result:
-                    if 'otherLock' in result[0]:
-                        raise P4Exception("[Warning]: {0} already locked by {1}\"".format(file, result[0]['otherLock'][0]))
-                    else:
-                        utils.logger().info(self.p4.run_edit(file))
-                        utils.logger().info(self.p4.run_lock(file))
-                else:
-                    utils.logger().info(self.p4.run_add(file))
-                    utils.logger().info(self.p4.run_lock(file))
-            except P4Exception as e:
-                displayErrorUI(e)
+        if not files:
+            return
+
+        utils.logger().info("Processing {0}...".format(", ".join(files)))
+
+        # Query every file at once and only the fields used, files missing from the depot are reported as warnings
+        known = {}
+        fields = Session.field_args(['clientFile', 'depotFile', 'otherLock'])
+        for f in run_bulk(self.p4, "fstat", files, fields).results():
+            for key in ['clientFile', 'depotFile']:
+                if f.get(key):
+                    known[normalize_path(f[key])] = f
+
+        editFiles = []
+        addFiles = []
+        for file in files:
+            result = known.get(normalize_path(file))
+
+            if not result:
+                addFiles.append(file)
+            elif 'otherLock' in result:
+                displayErrorUI(P4Exception("[Warning]: {0} already locked by {1}\"".format(file, result['otherLock'][0])))
+            else:
+                editFiles.append(file)
+
+        # Only the files that were opened can be locked
+        reports = [run_bulk(self.p4, "edit", editFiles), run_bulk(self.p4, "add", addFiles)]
+        reports.append(run_bulk(self.p4, "lock", reports[0].files() + reports[1].files()))
+
+        for report in reports:
+            for result in report.results():
+                utils.logger().info(result)
+
+            if not report.complete():
+                displayErrorUI(report.exception())
 
     def deleteFile(self, *args):
         self.__processClientFile(
@@ -507,22 +529,52 @@ class MainShelf:
         if reply == QtWidgets.QMessageBox.No:
             return
 
-        # progress = SubmitProgressUI(len(files))
-        # progress.create("Submit Progress")
+        self.__runSync("Sync Progress", force=True)
 
-        # callback = OutputProgress(progress)
+    def syncAllChanged(self, *args):
+        self.__runSync("Sync Progress", force=False)
 
-        # progress.show()
+    # Sync the workspace on a separate connection within a QThread, so the DCC stays responsive
+    # and the transfer can be followed and cancelled from a progress dialog
+    def __runSync(self, title, force):
+        if self.syncThread and self.syncThread.isRunning():
+            utils.logger().warning("A sync is already running.")
+            return
 
-        try:
-            self.p4.run_sync("-f", "...")
-            utils.logger().info("Got latest revisions for client")
-        except P4Exception as e:
-            displayErrorUI(e)
+        progress = SubmitProgressUI(0)
+        progress.create(title)
 
-    def syncAllChanged(self, *args):
-        try:
-            self.p4.run_sync("...")
-            utils.logger().info("Got latest revisions for client")
-        except P4Exception as e:
-            displayErrorUI(e)
\ No newline at end of file
+        pool = SessionPool.from_session(self.p4, max_size=1)
+        thread = QtCore.QThread()
+        worker = SyncWorker(["..."], force=force, pool=pool)
+        worker.moveToThread(thread)
+        worker.connectToThread(thread)
+
+        progress.setHandler(worker)
+        progress.setMinimum(0)
+
+        def onFinished(stats):
+            utils.logger().info("Got latest revisions for client. {0}".format(stats))
+            progress.setComplete(not stats.cancelled and not stats.errors)
+
+        def onFailed():
+            progress.setComplete(False)
+            displayErrorUI(P4Exception("\n".join(worker.stats().errors)))
+
+        def onFileProgress(position, total):
+            progress.setMaximum(total)
+            progress.setValue(position)
+
+        worker.totalChanged.connect(lambda files, size: progress.setTotalFiles(files))
+        worker.progressChanged.connect(lambda files, total: progress.setCurrent(files))
+        worker.fileProgressChanged.connect(onFileProgress)
+        worker.syncFinished.connect(onFinished)
+        worker.workFailed.connect(onFailed)
+        thread.finished.connect(pool.close)
+
+        self.syncThread = thread
+        self.syncWorker = worker
+        self.syncProgress = progress
+
+        progress.show()
+        thread.start()
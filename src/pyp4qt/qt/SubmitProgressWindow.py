@@ -15,6 +15,7 @@ class SubmitProgressUI(QtWidgets.QDialog):
         self.totalFiles = totalFiles
 
         self.currentFile = 0
+        self.complete = False
 
     def setHandler(self, handler):
         self.handler = handler
@@ -28,6 +29,17 @@ class SubmitProgressUI(QtWidgets.QDialog):
     def setValue(self, val):
         self.fileProgressBar.setValue(val)
 
+    def setTotalFiles(self, totalFiles):
+        self.totalFiles = totalFiles
+        self.overallProgressBar.setMaximum(totalFiles)
+
+    def setCurrent(self, currentFile):
+        self.currentFile = currentFile
+        self.overallProgressBar.setValue(self.currentFile)
+
+        if self.totalFiles and self.currentFile >= self.totalFiles:
+            self.setComplete(True)
+
     def incrementCurrent(self):
         self.currentFile += 1
         self.overallProgressBar.setValue(self.currentFile)
@@ -38,6 +50,8 @@ class SubmitProgressUI(QtWidgets.QDialog):
             self.setComplete(True)
 
     def setComplete(self, success):
+        self.complete = True
+
         if not success:
             self.overallProgressBar.setTextVisible(True)
             self.overallProgressBar.setFormat("Cancelled/Error")
@@ -96,12 +110,16 @@ class SubmitProgressUI(QtWidgets.QDialog):
         Create the signal/slot connections
         '''
         # self.fileTree.clicked.connect( self.populateFileRevisions )
-        pyp4qt.utils.connect(self.cancelProgress)
+        self.quitBtn.clicked.connect(self.cancelProgress)
 
     #--------------------------------------------------------------------------
     # SLOTS
     #--------------------------------------------------------------------------
 
     def cancelProgress(self, *args):
+        if self.complete:
+            self.close()
+            return
+
         self.quitBtn.setText("Cancelling...")
         self.handler.setCancel(True)
\ No newline at end of file
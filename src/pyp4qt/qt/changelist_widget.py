@@ -8,7 +8,7 @@ from pyp4qt import globals
 # Python Modules
 from PySide2.QtCore import Qt
 from PySide2.QtWidgets import QWidget, QSplitter, QTextEdit, QTableWidget, QTableWidgetItem, QVBoxLayout, QLabel, \
-    QAbstractItemView, QDialog, QDialogButtonBox
+    QAbstractItemView, QDialog, QDialogButtonBox, QMessageBox
 
 
 class ChangeListWidget(QWidget):
@@ -153,9 +153,15 @@ class ChangeListDialog(QDialog):
 
         if self._session:
             changelist = self._session.create_changelist(self.widget.description())
-
-            for file in files:
-                self._session.move_to_changelist(file, changelist)
+            report = self._session.reopen_files(files, changelist)
+
+            # Undo the move and keep the dialog open so the files that couldn't be moved can be seen. Each OK creates
+            # a new changelist, so the one created here is deleted rather than left behind.
+            if not report.complete():
+                self._session.reopen_files(report.files("depotFile"), "default")
+                self._session.delete_changelist(changelist)
+                QMessageBox.warning(self, "Move Files", str(report.exception()))
+                return
 
         self.accept()
         pass
@@ -14,6 +14,27 @@ class ConfigDepotItem(DepotItem):
     TYPE_CONFIG = 3
     TYPE_FILE_VERSION = 4
 
+    # Number of versions of a file loaded at a time
+    VERSION_PAGE_SIZE = 50
+
+    # fstat fields read by set_file_info, the only ones requested from the server
+    FILE_INFO_FIELDS = (
+        "clientFile",
+        "isMapped",
+        "headAction",
+        "headTime",
+        "headRev",
+        "headChange",
+        "headModTime",
+        "haveRev",
+        "actionOwner",
+        "workRev",
+        "otherOpen",
+        "otherAction",
+        "otherChange",
+        "otherOpens"
+    )
+
     @classmethod
     def from_dict(cls, session=None, parent=None, data=None):
         """ Return a ConfigDepotItem object from a dictionary.
@@ -154,6 +175,58 @@ class ConfigDepotItem(DepotItem):
     def client_file(self):
         return self._client_file
 
+    def set_file_info(self, info):
+        """ Sets the depot attributes from a fstat dictionary.
+
+        Args:
+            info (dict)
+
+        Returns:
+            None
+        """
+        if not info:
+            return
+
+        self._client_file = info.get("clientFile")
+        self._is_mapped = info.get("isMapped")
+        self._head_action = info.get("headAction")
+        self._head_time = int(info.get("headTime", 0))
+        self._head_rev = int(info.get("headRev", 0))
+        self._head_change = int(info.get("headChange", 0))
+        self._head_mod_time = int(info.get("headModTime", 0))
+        self._have_rev = int(info.get("haveRev", 0))
+        self._action_owner = info.get("actionOwner")
+        self._work_rev = int(info.get("workRev", 0))
+        self._other_open = info.get("otherOpen")
+        self._other_action = info.get("otherAction")
+        self._other_change = info.get("otherChange")
+        self._other_opens = int(info.get("otherOpens", 0))
+        return
+
+    def set_file_log(self, log):
+        """ Sets the user and description from the head revision of a filelog dictionary.
+
+        Args:
+            log (dict)
+
+        Returns:
+            None
+        """
+        if not log:
+            return
+
+        # Revisions are listed from newest to oldest
+        users = log.get("user", list())
+        descriptions = log.get("desc", list())
+
+        if users:
+            self._user = users[0]
+
+        if descriptions:
+            self._description = descriptions[0]
+
+        return
+
     def data(self, index):
         """ Returns data by column index.
 
@@ -190,28 +263,28 @@ class ConfigDepotItem(DepotItem):
 
         return DepotItem.data(self, index)
 
-    def load(self):
-        """ Loads the children from the depot into memory.
+    def query_children(self, session=None):
+        """ Returns new items for the directories and files under a directory, or the next page of older versions of a
+        file.
+
+        Args:
+            session (Session): Session to query with instead of the item's own.
 
         Returns:
-            None
+            list[ConfigDepotItem]
         """
-        if self.type() == ConfigDepotItem.TYPE_CONFIG:
-            if not self.show_dirs() and not self.show_files():
-                return
+        result = list()
 
-        # self._children = list()
+        if session is None:
+            session = self._session
 
-        if not self._session or not self._path:
-            self._is_loaded = False
-            return
+        if not session or not self._path:
+            return result
 
         # Get Directories
         if self.type() in [ConfigDepotItem.TYPE_DIR, ConfigDepotItem.TYPE_CONFIG]:
             try:
-                for _dir in self._session.depot_dirs(self._path):
-                    # dir_item = DepotItem(self._session, self, DepotItem.TYPE_DIR, _dir.dir)
-
+                for _dir in session.depot_dirs(self._path):
                     dir_item = ConfigDepotItem(
                         session=self._session,
                         parent=self,
@@ -220,147 +293,144 @@ class ConfigDepotItem(DepotItem):
                         comment=self._comment
                     )
 
-                    self._children.append(dir_item)
+                    result.append(dir_item)
             except P4Exception:
                 pass
 
             # Get Files
             try:
-                for file in self._session.depot_files(self._path):
-                    # file_item = DepotItem(self._session, self, DepotItem.TYPE_FILE, file.depotFile)
-                    file_item = ConfigDepotItem(
-                        session=self._session,
-                        parent=self,
-                        type=ConfigDepotItem.TYPE_FILE,
-                        path=file.depotFile,
-                        comment=self._comment
-                    )
+                files = session.depot_files(self._path)
+            except P4Exception:
+                files = list()
 
-                    file_item._rev = int(file.rev)
-                    file_item._change = int(file.change)
-                    file_item._action = file.action
-                    file_item._time = file.time
-
-                    # Get Info
-                    info = dict()
-                    log = dict()
-
-                    if self._session:
-                        # info = self._session.file_info(file_item.path())
-                        info = self._session.run("fstat", file_item.path())[0]
-                        log = self._session.run("filelog", file_item.path())[0]
-
-                    if info:
-                        file_item._client_file = info.get("clientFile")
-                        file_item._is_mapped = info.get("isMapped")
-                        file_item._head_action = info.get("headAction")
-                        file_item._head_time = int(info.get("headTime", 0))
-                        file_item._head_rev = int(info.get("headRev", 0))
-                        file_item._head_change = int(info.get("headChange", 0))
-                        file_item._head_mod_time = int(info.get("headModTime", 0))
-                        file_item._have_rev = int(info.get("haveRev", 0))
-                        file_item._action_owner = info.get("actionOwner")
-                        file_item._work_rev = int(info.get("workRev", 0))
-                        file_item._other_open = info.get("otherOpen")
-                        file_item._other_action = info.get("otherAction")
-                        file_item._other_change = info.get("otherChange")
-                        file_item._other_opens = int(info.get("otherOpens", 0))
-
-                    if log:
-                        i = file_item._head_rev - 1
-                        file_item._user = log.get("user")[i]
-                        file_item._description = log.get("desc")[i]
-
-                    self.append_child(file_item)
+            # Query the metadata of every file within the directory at once
+            infos = dict()
+            logs = dict()
 
-            except P4Exception:
-                pass
+            if files:
+                spec = Session.file_spec(self._path)
 
-        elif self.type() == ConfigDepotItem.TYPE_FILE:
-            # Get Versions
-            log = dict()
+                try:
+                    infos = session.files_info(spec, ConfigDepotItem.FILE_INFO_FIELDS)
+                except P4Exception:
+                    pass
 
-            if self._session:
-                # log = self.session().file_log(file_item.path())
-                log = self._session.run("filelog", self.path())[0]
+                try:
+                    logs = session.files_log(spec, max_revisions=1)
+                except P4Exception:
+                    pass
 
-            if log:
-                rev = log.get("rev", list())
+            for file in files:
+                file_item = ConfigDepotItem(
+                    session=self._session,
+                    parent=self,
+                    type=ConfigDepotItem.TYPE_FILE,
+                    path=file.depotFile,
+                    comment=self._comment
+                )
 
-                for i in range(len(rev)):
-                    version_item = ConfigDepotItem(
-                        session=self._session,
-                        parent=self,
-                        type=ConfigDepotItem.TYPE_FILE_VERSION,
-                        path=self.path(),
-                        comment=self._comment
-                    )
+                file_item._rev = int(file.rev)
+                file_item._change = int(file.change)
+                file_item._action = file.action
+                file_item._time = file.time
 
-                    version_item._rev = int(log.get("rev")[i])
-                    version_item._change = int(log.get("change")[i])
-                    version_item._action = log.get("action")[i]
-                    version_item._time = int(log.get("time")[i])
-                    version_item._user = log.get("user")[i]
-                    version_item._client = log.get("client")[i]
-                    version_item._description = log.get("desc")[i]
+                file_item.set_file_info(infos.get(file.depotFile, dict()))
+                file_item.set_file_log(logs.get(file.depotFile, dict()))
 
-                    version_item._is_loaded = True
+                result.append(file_item)
 
-                    if version_item._rev != self._rev:
-                        self.append_child(version_item)
+        elif self.type() == ConfigDepotItem.TYPE_FILE:
+            # Get the next page of older versions, newest first
+            history = session.file_history(self.path(), ConfigDepotItem.VERSION_PAGE_SIZE, self.oldest_version_rev())
 
-        self._is_loaded = True
-        return
+            for revision in history:
+                version_item = ConfigDepotItem(
+                    session=self._session,
+                    parent=self,
+                    type=ConfigDepotItem.TYPE_FILE_VERSION,
+                    path=self.path(),
+                    comment=self._comment
+                )
+
+                version_item._rev = int(revision.get("rev"))
+                version_item._change = int(revision.get("change"))
+                version_item._action = revision.get("action")
+                version_item._time = int(revision.get("time"))
+                version_item._user = revision.get("user")
+                version_item._client = revision.get("client")
+                version_item._description = revision.get("desc")
+
+                version_item._is_loaded = True
+
+                if version_item._rev != self._rev:
+                    result.append(version_item)
 
-    def childCount(self):
+        return result
+
+    def load(self):
+        """ Loads the children from the depot into memory, after any children from the config.
+
+        Returns:
+            None
+        """
         if self.type() == ConfigDepotItem.TYPE_CONFIG:
             if not self.show_dirs() and not self.show_files():
-                return len(self._children)
+                return
 
-        elif self.type() == ConfigDepotItem.TYPE_FILE:
-            if isinstance(self._rev, int):
-                if self._rev == 1:
-                    return 0
+        if not self._session or not self._path:
+            self._is_loaded = False
+            return
 
-                elif self._rev > 1:
-                    return self._rev
+        children = self.query_children()
 
-            return len(self.children())
+        for child in children:
+            self.append_child(child)
 
-        elif self.type() == ConfigDepotItem.TYPE_FILE_VERSION:
-            return 0
-
-        return DepotItem.childCount(self)
+        # An empty page ends the history even if older revisions were expected, e.g. purged or archived ones
+        self._is_loaded = not children or not self.has_older_versions()
+        return
 
-    def sessionChildCount(self):
-        """ Returns the child count of children within the depot.
+    def oldest_version_rev(self):
+        """ Returns the revision of the oldest version loaded, or the head revision before any are loaded.
 
         Returns:
             int
         """
-        if self.type() not in [ConfigDepotItem.TYPE_DIR, ConfigDepotItem.TYPE_CONFIG]:
-            return 0
+        if self._children:
+            return self._children[-1]._rev
 
-        if not self.path():
-            return 0
+        return self._rev
 
-        if not self.session():
-            return 0
+    def has_older_versions(self):
+        """ Returns True if a file has versions older than those loaded.
+
+        Returns:
+            bool
+        """
+        if self.type() != ConfigDepotItem.TYPE_FILE:
+            return False
 
-        dirs = list()
-        files = list()
+        rev = self.oldest_version_rev()
+        return isinstance(rev, int) and rev > 1
 
-        try:
-            dirs = self._session.depot_dirs(self._path)
-        except P4Exception:
-            pass
+    def hasChildren(self):
+        # Answered from the item's own metadata so views never query the server while painting
+        if self._is_loaded:
+            return self.childCount() > 0
 
-        try:
-            files = self._session.depot_files(self._path)
-        except P4Exception:
-            pass
+        if self.type() == ConfigDepotItem.TYPE_CONFIG:
+            if not self.show_dirs() and not self.show_files():
+                return self.childCount() > 0
+
+            return True
 
-        return len(dirs) + len(files)
+        elif self.type() == ConfigDepotItem.TYPE_FILE:
+            return isinstance(self._rev, int) and self._rev > 1
+
+        elif self.type() == ConfigDepotItem.TYPE_FILE_VERSION:
+            return False
+
+        return DepotItem.hasChildren(self)
 
 
 class ConfigDepotModel(QAbstractItemModel):
@@ -371,6 +441,9 @@ class ConfigDepotModel(QAbstractItemModel):
         self._config = config
         self._root = ConfigDepotItem(session, path="//*")
 
+        if self._session:
+            self._session.use_environment_cache()
+
 
     def config(self):
         return self._config
@@ -380,6 +453,9 @@ class ConfigDepotModel(QAbstractItemModel):
 
     def setSession(self, session):
         self._session = session
+
+        if self._session:
+            self._session.use_environment_cache()
         return
 
     def root(self):
@@ -493,10 +569,24 @@ class ConfigDepotModel(QAbstractItemModel):
     def fetchMore(self, parent):
         item = parent.internalPointer()
 
-        if item:
-            self.beginInsertRows(parent, 0, item.childCount() - 1)
-            item.load()
+        if not item or not self._session:
+            return
+
+        children = item.query_children()
+
+        # Depot children are added after any children from the config
+        if children:
+            first = item.childCount()
+            self.beginInsertRows(parent, first, first + len(children) - 1)
+
+            for child in children:
+                item.append_child(child)
+
             self.endInsertRows()
+
+        # Files stay unloaded while older versions remain, so scrolling to the end fetches the next page. An empty
+        # page ends the history even if older revisions were expected, e.g. purged or archived ones
+        item.set_loaded(not children or not item.has_older_versions())
         return
 
     def index(self, row, column, parent):
@@ -1,16 +1,18 @@
 # Project Modules
 import pyp4qt.utils
-from pyp4qt.session import Session, DepotFile, DepotDirectory, P4Exception
+from pyp4qt.session import Session, SessionPool, SessionCallWorker, DepotFile, DepotDirectory, P4Exception
 
 # Python Modules
 import os
-from PySide2.QtCore import QAbstractItemModel, QModelIndex, Qt
+import itertools
+from PySide2.QtCore import QAbstractItemModel, QModelIndex, Qt, QThread, QTimer
 
 
 class DepotItem(object):
     TYPE_NONE = 0
     TYPE_DIR = 1
     TYPE_FILE = 2
+    TYPE_LOADING = -1
 
     def __init__(self, session=None, parent=None, type=0, path=str()):
         self._session = session
@@ -19,6 +21,8 @@ class DepotItem(object):
         self._type = type
         self._children = list()
         self._is_loaded = False
+        self._loaded_change = 0
+        self._row = 0
 
     def type(self):
         return self._type
@@ -44,6 +48,18 @@ class DepotItem(object):
         self._path = path
         return
 
+    def loaded_change(self):
+        """ Returns the highest submitted change number the loaded children are known to be up to date with.
+
+        Returns:
+            int
+        """
+        return self._loaded_change
+
+    def set_loaded_change(self, change):
+        self._loaded_change = int(change)
+        return
+
     def data(self, index):
         """ Returns data by column index.
 
@@ -54,47 +70,76 @@ class DepotItem(object):
             str
         """
         if index == 0:
+            if self._type == DepotItem.TYPE_LOADING:
+                return "Loading\u2026"
+
             if self._path:
                 path_split = self._path.split("/")
                 return path_split[-1]
         return
 
-    def load(self):
-        """ Loads the children from the depot into memory.
+    def query_children(self, session=None):
+        """ Returns new items for the directories and files under this item's path in the depot.
+
+        Args:
+            session (Session): Session to query with instead of the item's own, e.g. a pooled session on a worker.
 
         Returns:
-            None
+            list[DepotItem]
         """
-        self._children = list()
+        result = list()
 
-        if not self._session or not self._path:
-            self._is_loaded = False
-            return
+        if session is None:
+            session = self._session
+
+        if not session or not self._path:
+            return result
 
         # Get Directories
         try:
-            for _dir in self._session.depot_dirs(self._path):
-                dir_item = DepotItem(self._session, self, DepotItem.TYPE_DIR, _dir.dir)
-                self._children.append(dir_item)
+            for _dir in session.depot_dirs(self._path):
+                result.append(DepotItem(self._session, self, DepotItem.TYPE_DIR, _dir.dir))
         except P4Exception:
             pass
 
         # Get Files
         try:
-            for file in self._session.depot_files(self._path):
-                file_item = DepotItem(self._session, self, DepotItem.TYPE_FILE, file.depotFile)
-                self._children.append(file_item)
+            for file in session.depot_files(self._path):
+                result.append(DepotItem(self._session, self, DepotItem.TYPE_FILE, file.depotFile))
         except P4Exception:
             pass
 
+        return result
+
+    def load(self):
+        """ Loads the children from the depot into memory.
+
+        Returns:
+            None
+        """
+        self._children = list()
+
+        if not self._session or not self._path:
+            self._is_loaded = False
+            return
+
+        self.set_children(self.query_children())
         self._is_loaded = True
         return
 
     def isLoaded(self):
         return self._is_loaded
 
+    def set_loaded(self, loaded):
+        self._is_loaded = loaded
+        return
+
     def hasChildren(self):
-        return self.childCount() > 0
+        # Directories are assumed to have children until they're loaded, so expanding them doesn't query the server
+        if self._type == DepotItem.TYPE_DIR and not self._is_loaded:
+            return True
+
+        return len(self._children) > 0
 
     def child(self, index):
         try:
@@ -106,6 +151,22 @@ class DepotItem(object):
     def children(self):
         return self._children
 
+    def set_children(self, children):
+        """ Replaces the child objects.
+
+        Args:
+            children (list[DepotItem])
+
+        Returns:
+            None
+        """
+        for row, child in enumerate(children):
+            child.set_parent(self)
+            child._row = row
+
+        self._children = list(children)
+        return
+
     def append_child(self, child):
         """ Append a child object.
 
@@ -119,52 +180,80 @@ class DepotItem(object):
             raise RuntimeError("Invalid child type.")
 
         child.set_parent(self)
+        child._row = len(self._children)
         self._children.append(child)
         return
 
-    def sessionChildCount(self):
-        """ Returns the child count of children within the depot.
+    def insert_child(self, row, child):
+        """ Inserts a child object at a row.
+
+        Args:
+            row (int)
+            child (DepotItem)
 
         Returns:
-            int
+            None
         """
-        if self._type != DepotItem.TYPE_DIR or not self._path or not self._session:
-            return 0
+        if not isinstance(child, DepotItem):
+            raise RuntimeError("Invalid child type.")
 
-        dirs = list()
-        files = list()
+        child.set_parent(self)
+        self._children.insert(row, child)
+        self._renumber(row)
+        return
 
-        try:
-            dirs = self._session.depot_dirs(self._path)
-        except P4Exception:
-            pass
+    def remove_child(self, row):
+        """ Removes the child object at a row.
 
-        try:
-            files = self._session.depot_files(self._path)
-        except P4Exception:
-            pass
+        Args:
+            row (int)
 
-        return len(dirs) + len(files)
+        Returns:
+            DepotItem
+        """
+        child = self._children.pop(row)
+        child.set_parent(None)
+        self._renumber(row)
+        return child
+
+    def _renumber(self, start=0):
+        for row in range(start, len(self._children)):
+            self._children[row]._row = row
+        return
 
     def childCount(self):
-        if self._is_loaded:
-            return len(self._children)
-
-        return self.sessionChildCount()
+        return len(self._children)
 
     def row(self):
         if self._parent:
-            return self._parent.children().index(self)
+            return self._row
 
         return 0
 
 
 class DepotModel(QAbstractItemModel):
+    # Milliseconds between refreshes of the loaded directories, for views that refresh periodically
+    REFRESH_INTERVAL = 60000
+
     def __init__(self, parent=None, session=None):
         QAbstractItemModel.__init__(self, parent)
 
         self._session = session
         self._root = DepotItem(session, path="//*")
+        self._change = 0
+
+        # Pending fetches by token, and cancelled fetches whose threads haven't finished yet
+        self._pool = None
+        self._fetches = dict()
+        self._cancelled = dict()
+        self._tokens = itertools.count()
+
+        # Token of the pending submitted changes query, and of the pending reloads of the directories it touched
+        self._refresh = None
+        self._reloads = set()
+
+        self._timer = QTimer(self)
+        self._timer.timeout.connect(self.refresh)
 
         if self._session:
             self._populate()
@@ -181,20 +270,268 @@ class DepotModel(QAbstractItemModel):
     def root(self):
         return self._root
 
+    def pool(self):
+        """ Returns the session pool the children are fetched with, created from the session when first needed.
+
+        Returns:
+            SessionPool
+        """
+        if self._pool is None and self._session:
+            self._pool = SessionPool.from_session(self._session)
+
+        return self._pool
+
     def clear(self):
+        for token in list(self._fetches):
+            self._cancelFetch(token)
+
+        self._refresh = None
+        self._reloads = set()
+
+        if self._pool is not None:
+            self._pool.close()
+            self._pool = None
+
         self.beginResetModel()
         self._session = None
         del (self._root)
         self._root = DepotItem(self._session, path="//*")
+        self._change = 0
         self.endResetModel()
         return
 
     def _populate(self):
         self.beginResetModel()
+
+        self._change = 0
+
+        if self._session:
+            # Opt-in, the cache answers depot queries the tree has made before without waiting for the server
+            self._session.use_environment_cache()
+
+            try:
+                self._change = self._session.latest_change("//...")
+            except P4Exception:
+                pass
+
         self._root.load()
+        self._root.set_loaded_change(self._change)
         self.endResetModel()
         return
 
+    def loadedItems(self):
+        """ Returns the loaded directory items, starting with the root.
+
+        Returns:
+            list[DepotItem]
+        """
+        result = list()
+        stack = [self._root]
+
+        while stack:
+            item = stack.pop()
+
+            if not item.isLoaded():
+                continue
+
+            result.append(item)
+            stack += [child for child in item.children() if child.type() == DepotItem.TYPE_DIR]
+
+        return result
+
+    def setRefreshInterval(self, msec):
+        """ Refreshes the loaded directories every msec milliseconds, or stops refreshing if msec is 0.
+
+        Args:
+            msec (int)
+
+        Returns:
+            None
+        """
+        if msec > 0:
+            self._timer.start(msec)
+        else:
+            self._timer.stop()
+        return
+
+    def isRefreshing(self):
+        """ Returns True if the submitted changes or the directories they touched are being queried.
+
+        Returns:
+            bool
+        """
+        return self._refresh is not None or bool(self._reloads)
+
+    def refresh(self):
+        """ Updates the loaded directories with the changes submitted since they were loaded.
+
+        The changes are queried on a worker thread. Only the directories that a new submitted change touched are
+        queried again, also on worker threads, and their rows are updated in place so expanded branches and
+        selections are kept.
+
+        Returns:
+            None
+        """
+        if self.isRefreshing() or not self._session or not self._session.connected():
+            return
+
+        loaded = self.loadedItems()
+
+        if not loaded or self.pool() is None:
+            return
+
+        after = min(item.loaded_change() for item in loaded)
+
+        self._refresh = self._startCall(
+            self._root,
+            lambda session: session.submitted_changelists("//...", after),
+            self._onChangesReady,
+            self._onChangesFailed
+        )
+        return
+
+    def _onChangesReady(self, token, changelists):
+        # Results of a refresh cancelled by clear() are dropped
+        if self._finishFetch(token) is None:
+            return
+
+        self._refresh = None
+
+        if not changelists:
+            return
+
+        loaded = self.loadedItems()
+
+        # The children's paths are looked up for every changed file, so they're collected once per item
+        items = dict()
+        child_paths = dict()
+
+        for item in loaded:
+            items[item.path()] = item
+            child_paths[item.path()] = set(child.path() for child in item.children())
+
+        affected = set()
+
+        for changelist in changelists:
+            change = int(changelist.change)
+
+            for depot_file, action in zip(changelist.depotFile, changelist.action):
+                affected.update(self._affectedItems(items, child_paths, depot_file, action, change))
+
+        self._change = int(changelists[-1].change)
+
+        # The affected items are up to date once their children are reloaded, so a failed reload is retried
+        for item in loaded:
+            if item not in affected:
+                item.set_loaded_change(self._change)
+
+        for item in affected:
+            self._session.invalidate_cache(item.path())
+
+            if not self.isFetching(item):
+                token = self._startCall(item, item.query_children, self._onReloadReady, self._onReloadFailed)
+                self._reloads.add(token)
+
+        return
+
+    def _onChangesFailed(self, token, message):
+        if self._finishFetch(token) is not None:
+            self._refresh = None
+        return
+
+    def _isAttached(self, item):
+        while item is not None:
+            if item == self._root:
+                return True
+
+            item = item.parent()
+
+        return False
+
+    @staticmethod
+    def _affectedItems(items, child_paths, depot_file, action, change):
+        """ Returns the loaded directory items whose children a submitted file action may have changed.
+
+        Args:
+            items (dict[str, DepotItem]): Loaded items by depot path.
+            child_paths (dict[str, set[str]]): Paths of the loaded items' children by depot path.
+            depot_file (str)
+            action (str)
+            change (int)
+
+        Returns:
+            list[DepotItem]
+        """
+        result = list()
+        child_path = depot_file
+        path = depot_file.rsplit("/", 1)[0]
+        structural = action not in ("edit", "integrate")
+
+        while len(path) > 1:
+            item = items.get(path)
+
+            if item is not None and item.loaded_change() < change:
+                if child_path == depot_file or structural:
+                    result.append(item)
+
+                elif child_path not in child_paths[path]:
+                    result.append(item)
+
+            child_path = path
+            path = path.rsplit("/", 1)[0]
+
+        return result
+
+    def _onReloadReady(self, token, children):
+        self._reloads.discard(token)
+        item = self._finishFetch(token)
+
+        # A directory removed by its parent's reload is dropped
+        if item is None or not self._isAttached(item):
+            return
+
+        self._updateChildren(item, children)
+        item.set_loaded_change(self._change)
+        return
+
+    def _onReloadFailed(self, token, message):
+        self._reloads.discard(token)
+        self._finishFetch(token)
+        return
+
+    def _updateChildren(self, item, children):
+        """ Inserts and removes rows for the difference between an item's children and the children queried again.
+
+        Args:
+            item (DepotItem)
+            children (list[DepotItem])
+
+        Returns:
+            None
+        """
+        parent = QModelIndex() if item == self._root else self.createIndex(item.row(), 0, item)
+        paths = set((child.type(), child.path()) for child in children)
+
+        for row in reversed(range(item.childCount())):
+            child = item.child(row)
+
+            if (child.type(), child.path()) not in paths:
+                self.beginRemoveRows(parent, row, row)
+                item.remove_child(row)
+                self.endRemoveRows()
+
+        for row, child in enumerate(children):
+            current = item.child(row)
+
+            if current is not None and (current.type(), current.path()) == (child.type(), child.path()):
+                continue
+
+            self.beginInsertRows(parent, row, row)
+            item.insert_child(row, child)
+            self.endInsertRows()
+
+        return
+
     def data(self, index, role):
         if not index.isValid():
             return None
@@ -251,18 +588,156 @@ class DepotModel(QAbstractItemModel):
 
         item = parent.internalPointer()
 
-        if not item:
+        if not item or item.type() != DepotItem.TYPE_DIR:
             return False
 
-        return not item.isLoaded()
+        return not item.isLoaded() and not self.isFetching(item)
+
+    def isFetching(self, item):
+        """ Returns True if the item's children are being fetched.
+
+        Args:
+            item (DepotItem)
+
+        Returns:
+            bool
+        """
+        for fetch in self._fetches.values():
+            if fetch[0] == item:
+                return True
+
+        return False
 
     def fetchMore(self, parent):
+        """ Inserts a placeholder row and fetches the item's children on a worker thread.
+
+        Args:
+            parent (QModelIndex)
+
+        Returns:
+            None
+        """
         item = parent.internalPointer()
 
-        if item:
-            self.beginInsertRows(parent, 0, item.childCount() - 1)
-            item.load()
+        if not item or item.isLoaded() or self.isFetching(item):
+            return
+
+        if self.pool() is None:
+            return
+
+        self.beginInsertRows(parent, 0, 0)
+        item.insert_child(0, DepotItem(self._session, type=DepotItem.TYPE_LOADING))
+        self.endInsertRows()
+
+        self._startCall(item, item.query_children, self._onFetchReady, self._onFetchFailed)
+        return
+
+    def _startCall(self, item, function, ready, failed):
+        """ Calls a function with a pooled session on a worker thread.
+
+        Args:
+            item (DepotItem): The item the call is made for.
+            function (callable): Called with the session.
+            ready (callable): Slot called with the token and the result.
+            failed (callable): Slot called with the token and the error message.
+
+        Returns:
+            int: The token of the call.
+        """
+        token = next(self._tokens)
+        thread = QThread()
+        worker = SessionCallWorker(function, token=token, pool=self.pool())
+
+        worker.moveToThread(thread)
+        worker.connectToThread(thread)
+        worker.resultReady.connect(ready)
+        worker.callFailed.connect(failed)
+
+        self._fetches[token] = (item, thread, worker)
+        thread.start()
+        return token
+
+    def cancelFetch(self, parent):
+        """ Cancels fetching an item's children, e.g. when it's collapsed, and removes its placeholder row.
+
+        Args:
+            parent (QModelIndex)
+
+        Returns:
+            None
+        """
+        item = parent.internalPointer() if parent.isValid() else None
+
+        for token, fetch in list(self._fetches.items()):
+            if fetch[0] == item:
+                self._cancelFetch(token)
+                self._removePlaceholder(parent, item)
+        return
+
+    def _cancelFetch(self, token):
+        item, thread, worker = self._fetches.pop(token)
+        thread.requestInterruption()
+        self._cancelled[token] = (thread, worker)
+        return
+
+    def _finishFetch(self, token):
+        """ Pops a fetch and waits for its thread to finish.
+
+        Args:
+            token (int)
+
+        Returns:
+            DepotItem: None if the fetch was cancelled.
+        """
+        item = None
+
+        if token in self._fetches:
+            item, thread, worker = self._fetches.pop(token)
+        elif token in self._cancelled:
+            thread, worker = self._cancelled.pop(token)
+        else:
+            return None
+
+        thread.quit()
+        thread.wait()
+        return item
+
+    def _removePlaceholder(self, parent, item):
+        for row in reversed(range(item.childCount())):
+            if item.child(row).type() == DepotItem.TYPE_LOADING:
+                self.beginRemoveRows(parent, row, row)
+                item.remove_child(row)
+                self.endRemoveRows()
+        return
+
+    def _onFetchReady(self, token, children):
+        item = self._finishFetch(token)
+
+        # Results for cancelled fetches or items removed from the model are dropped
+        if item is None or not self._isAttached(item):
+            return
+
+        parent = self.createIndex(item.row(), 0, item)
+        self._removePlaceholder(parent, item)
+
+        if children:
+            self.beginInsertRows(parent, 0, len(children) - 1)
+            item.set_children(children)
+            item.set_loaded(True)
             self.endInsertRows()
+        else:
+            item.set_loaded(True)
+
+        item.set_loaded_change(self._change)
+        return
+
+    def _onFetchFailed(self, token, message):
+        item = self._finishFetch(token)
+
+        if item is None or not self._isAttached(item):
+            return
+
+        self._removePlaceholder(self.createIndex(item.row(), 0, item), item)
         return
 
     def index(self, row, column, parent):
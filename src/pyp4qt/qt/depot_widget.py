@@ -5,6 +5,7 @@ from pyp4qt.qt.workspace_combobox import WorkspaceCombobox
 
 # Python Modules
 from PySide2.QtCore import Qt
+from PySide2.QtGui import QKeySequence
 from PySide2.QtWidgets import QWidget, QVBoxLayout, QTabWidget, QFileSystemModel, QTreeView, QAction, QMenu
 
 
@@ -36,8 +37,16 @@ class DepotWidget(QWidget):
         self._depot_view = QTreeView(self)
         self._depot_view.setHeaderHidden(True)
         self._depot_view.setModel(self._depot_model)
+        self._depot_view.collapsed.connect(self._depot_model.cancelFetch)
         self._tab.addTab(self._depot_view, "Depot")
 
+        # Picks up changes submitted since the directories were loaded, periodically and on demand
+        self._refresh_action = QAction("Refresh", self._depot_view)
+        self._refresh_action.setShortcut(QKeySequence.Refresh)
+        self._refresh_action.triggered.connect(self._depot_model.refresh)
+        self._depot_view.addAction(self._refresh_action)
+        self._depot_model.setRefreshInterval(DepotModel.REFRESH_INTERVAL)
+
         self._depot_view.setContextMenuPolicy(Qt.CustomContextMenu)
         self._depot_view.customContextMenuRequested.connect(self._depot_context_menu)
 
@@ -65,6 +74,7 @@ class DepotWidget(QWidget):
         if index.isValid():
             menu = QMenu()
             action = menu.addAction("Test")
+            menu.addAction(self._refresh_action)
             menu.exec_(self._depot_view.mapToGlobal(point))
 
         return
@@ -1,5 +1,5 @@
 # Project Modules
-from pyp4qt.session import Session, DepotFile, DepotDirectory, P4Exception
+from pyp4qt.session import Session, PendingSnapshot, DepotFile, DepotDirectory, P4Exception
 
 # Python Modules
 import os
@@ -20,6 +20,7 @@ class ChangeListItem(object):
         self._description = description
         self._children = list()
         self._is_loaded = False
+        self._row = 0
 
     def parent(self):
         return self._parent
@@ -30,6 +31,13 @@ class ChangeListItem(object):
     def path(self):
         return self._path
 
+    def description(self):
+        return self._description
+
+    def set_description(self, description):
+        self._description = description
+        return
+
     def isLoaded(self):
         return self._is_loaded
 
@@ -43,14 +51,38 @@ class ChangeListItem(object):
             pass
         return None
 
+    def append_child(self, child):
+        """ Append a child object.
+
+        Args:
+            child (ChangeListItem)
+
+        Returns:
+            None
+        """
+        if not isinstance(child, ChangeListItem):
+            raise RuntimeError("Invalid child type.")
+
+        child._parent = self
+        child._row = len(self._children)
+        self._children.append(child)
+        return
+
+    def clear_children(self):
+        self._children = list()
+        return
+
     def childCount(self):
         return len(self._children)
 
-    def hasChildren(self, session=None):
+    def set_loaded(self, loaded):
+        self._is_loaded = loaded
+        return
+
+    def hasChildren(self):
         """ Returns True if the item has any children.
 
-        Args:
-            session (Session)
+        Items that haven't been loaded are assumed to have children, so views never query the server while painting.
 
         Returns:
             bool
@@ -58,28 +90,11 @@ class ChangeListItem(object):
         if self._is_loaded:
             return self.childCount() > 0
 
-        if not session:
-            return False
-
-        if not session.connected():
-            return False
-
-        if self._type == ChangeListItem.TYPE_ROOT:
-            return len(session.pending_changelists()) > 0
-
-        elif self._type == ChangeListItem.TYPE_DEFAULT:
-            return len(session.get_default_files()) > 0
-
-        elif self._type == ChangeListItem.TYPE_CHANGELIST and self._path:
-            if self._path and self._path.isdigit():
-                data = session.get_changelist(int(self._path))
-                return len(data.depotFile) > 0
-
-        return False
+        return self._type in [ChangeListItem.TYPE_ROOT, ChangeListItem.TYPE_DEFAULT, ChangeListItem.TYPE_CHANGELIST]
 
     def row(self):
         if self._parent:
-            return self._parent.children().index(self)
+            return self._row
 
         return 0
 
@@ -90,46 +105,53 @@ class ChangeListItem(object):
             return self._description
         return
 
-    def load(self, session):
-        """
+    def query_children(self, snapshot):
+        """ Returns new items for the change lists under the root, or the files within a change list.
 
         Args:
-            session (Session)
+            snapshot (PendingSnapshot)
 
         Returns:
-            None
+            list[ChangeListItem]
         """
-        self._is_loaded = True
+        result = list()
 
-        if not session.connected():
-            return
+        if snapshot is None:
+            return result
 
         # Update Root
         if self._type == ChangeListItem.TYPE_ROOT:
 
             # Get default changelist
-            default_item = ChangeListItem(self, ChangeListItem.TYPE_DEFAULT, "default")
-            self._children.append(default_item)
+            result.append(ChangeListItem(self, ChangeListItem.TYPE_DEFAULT, PendingSnapshot.DEFAULT))
 
             # Get other changelists
-            for item in session.pending_changelists():
-                changelist_item = ChangeListItem(self, ChangeListItem.TYPE_CHANGELIST, item.change, item.desc.strip())
+            for item in snapshot.changelists():
+                result.append(ChangeListItem(self, ChangeListItem.TYPE_CHANGELIST, item.change, item.desc.strip()))
+
+        # Update Default and Changelist
+        elif self._type in [ChangeListItem.TYPE_DEFAULT, ChangeListItem.TYPE_CHANGELIST]:
+            for file in snapshot.files(self._path):
+                result.append(ChangeListItem(self, ChangeListItem.TYPE_FILE, file.depotFile))
 
-                self._children.append(changelist_item)
+        return result
 
-        # Update Default
-        elif self._type == ChangeListItem.TYPE_DEFAULT:
-            for file in session.get_default_files():
-                file_item = ChangeListItem(self, ChangeListItem.TYPE_FILE, file.depotFile)
-                self._children.append(file_item)
+    def load(self, snapshot):
+        """ Loads the children and their files from a snapshot.
+
+        Args:
+            snapshot (PendingSnapshot)
+
+        Returns:
+            None
+        """
+        self._is_loaded = True
 
-        # Update Changelist
-        elif self._type == ChangeListItem.TYPE_CHANGELIST:
-            info = session.get_changelist(self._path)
+        for child in self.query_children(snapshot):
+            self.append_child(child)
 
-            for file in info.depotFile:
-                file_item = ChangeListItem(self, ChangeListItem.TYPE_FILE, file)
-                self._children.append(file_item)
+            if child.type() in [ChangeListItem.TYPE_DEFAULT, ChangeListItem.TYPE_CHANGELIST]:
+                child.load(snapshot)
         return
 
 
@@ -139,6 +161,7 @@ class PendingModel(QAbstractItemModel):
 
         self._session = session
         self._root = ChangeListItem(_type=ChangeListItem.TYPE_ROOT)
+        self._snapshot = None
 
         if self._session:
             self._populate()
@@ -159,12 +182,21 @@ class PendingModel(QAbstractItemModel):
         self._session = None
         del (self._root)
         self._root = ChangeListItem(_type=ChangeListItem.TYPE_ROOT)
+        self._snapshot = None
         self.endResetModel()
         return
 
     def session(self):
         return self._session
 
+    def snapshot(self):
+        """ Returns the snapshot of pending change lists the model was built from.
+
+        Returns:
+            PendingSnapshot
+        """
+        return self._snapshot
+
     def setSession(self, session):
         self.clear()
         self._session = session
@@ -176,10 +208,59 @@ class PendingModel(QAbstractItemModel):
             return
 
         self.beginResetModel()
-        self._root.load(self._session)
+        self._snapshot = self._session.pending_snapshot()
+        self._root.load(self._snapshot)
         self.endResetModel()
         return
 
+    def refreshChangelists(self, changelists):
+        """ Updates the files and descriptions of numbered change lists from a single describe query.
+
+        Args:
+            changelists (list[str, int])
+
+        Returns:
+            None
+        """
+        if not self.isValid():
+            return
+
+        items = dict()
+
+        for item in self._root.children():
+            if item.type() == ChangeListItem.TYPE_CHANGELIST:
+                items[str(item.path())] = item
+
+        changes = [str(changelist) for changelist in changelists if str(changelist) in items]
+
+        for changelist in self._session.get_changelists(changes):
+            item = items.get(str(changelist.change))
+
+            if item is None:
+                continue
+
+            parent = self.createIndex(item.row(), 0, item)
+
+            if item.childCount():
+                self.beginRemoveRows(parent, 0, item.childCount() - 1)
+                item.clear_children()
+                self.endRemoveRows()
+
+            if changelist.depotFile:
+                self.beginInsertRows(parent, 0, len(changelist.depotFile) - 1)
+
+                for file in changelist.depotFile:
+                    item.append_child(ChangeListItem(item, ChangeListItem.TYPE_FILE, file))
+
+                self.endInsertRows()
+
+            item.set_loaded(True)
+            item.set_description((changelist.desc or str()).strip())
+
+            index = self.createIndex(item.row(), 1, item)
+            self.dataChanged.emit(index, index)
+        return
+
     def headerData(self, section, orientation, role):
         if orientation == Qt.Horizontal and role == Qt.DisplayRole:
             if section == 0:
@@ -235,10 +316,20 @@ class PendingModel(QAbstractItemModel):
     def fetchMore(self, parent):
         item = parent.internalPointer()
 
-        if item:
-            self.beginInsertRows(parent, 0, item.childCount() - 1)
-            item.load(self._session)
+        if not item:
+            return
+
+        children = item.query_children(self._snapshot)
+
+        if children:
+            self.beginInsertRows(parent, 0, len(children) - 1)
+
+            for child in children:
+                item.append_child(child)
+
             self.endInsertRows()
+
+        item.set_loaded(True)
         return
 
     def index(self, row, column, parent):
@@ -285,7 +376,7 @@ class PendingModel(QAbstractItemModel):
         else:
             item = parent.internalPointer()
 
-        return item.hasChildren(self._session)
+        return item.hasChildren()
 
 
 if __name__ == "__main__":
@@ -5,7 +5,9 @@ from pyp4qt.qt.pending_model import PendingModel
 
 # Python Modules
 from PySide2.QtCore import Qt
-from PySide2.QtWidgets import QMainWindow, QWidget, QVBoxLayout, QSplitter, QTreeView, QTabWidget, QFileSystemModel
+from PySide2.QtGui import QKeySequence
+from PySide2.QtWidgets import QMainWindow, QWidget, QVBoxLayout, QSplitter, QTreeView, QTabWidget, QFileSystemModel, \
+    QAction
 
 
 class Window(QMainWindow):
@@ -38,6 +40,13 @@ class Window(QMainWindow):
         self._depot_view.setModel(self._depot_model)
         depot_tab.addTab(self._depot_view, "Depot")
 
+        # Picks up changes submitted since the directories were loaded, periodically and on demand
+        refresh_action = QAction("Refresh", self._depot_view)
+        refresh_action.setShortcut(QKeySequence.Refresh)
+        refresh_action.triggered.connect(self._depot_model.refresh)
+        self._depot_view.addAction(refresh_action)
+        self._depot_model.setRefreshInterval(DepotModel.REFRESH_INTERVAL)
+
         # Workspace Model / View
         self._workspace_model = QFileSystemModel()
         self._workspace_view = QTreeView()
@@ -0,0 +1,192 @@
+# Python Modules
+import gzip
+import json
+import time
+import threading
+
+
+class SessionRecorder(object):
+    """ Records every command a Session sends, with its arguments, tagged output and timing, to a compact file.
+
+    The recorder is added to a session like a tracer. The file is gzipped JSON lines: a header with the connection
+    settings followed by one entry per command, in the order the commands finished. Marks can be added to label the
+    user actions within a recording, e.g. "expand shot".
+
+    Examples:
+        recorder = SessionRecorder("/tmp/browse.p4rec.gz")
+        recorder.start(session)
+
+        recorder.mark("open browser")
+        ...
+
+        recorder.stop()
+    """
+
+    VERSION = 1
+
+    # Streamed commands are recorded with their full output
+    KEEP_OUTPUT = True
+
+    def __init__(self, path):
+        self._path = path
+        self._lock = threading.Lock()
+        self._file = None
+        self._sessions = list()
+        self._start = 0.0
+        self._count = 0
+
+    def __del__(self):
+        self.stop()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+        return
+
+    def path(self):
+        return self._path
+
+    def count(self):
+        """ Returns the number of commands recorded.
+
+        Returns:
+            int
+        """
+        return self._count
+
+    def is_recording(self):
+        return self._file is not None
+
+    def start(self, session):
+        """ Starts recording the commands of a session. Can be called again to record more sessions to the same file.
+
+        Args:
+            session (Session)
+
+        Returns:
+            None
+        """
+        with self._lock:
+            if self._file is None:
+                self._file = gzip.open(self._path, "wt", encoding="utf-8")
+                self._start = time.time()
+                self._write({
+                    "version": SessionRecorder.VERSION,
+                    "time": self._start,
+                    "port": session.port,
+                    "user": session.user,
+                    "client": session.client
+                })
+
+            if session not in self._sessions:
+                self._sessions.append(session)
+
+        session.add_tracer(self)
+        return
+
+    def stop(self):
+        """ Stops recording and closes the file.
+
+        Returns:
+            None
+        """
+        for session in list(self._sessions):
+            session.remove_tracer(self)
+
+        with self._lock:
+            self._sessions = list()
+
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+        return
+
+    def mark(self, label):
+        """ Adds a label to the recording, e.g. the name of the user action about to run.
+
+        Args:
+            label (str)
+
+        Returns:
+            None
+        """
+        with self._lock:
+            if self._file is not None:
+                self._write({"mark": label, "offset": time.time() - self._start})
+        return
+
+    def trace(self, session, args, result, elapsed, error=None):
+        """ Records a command that ran on a session.
+
+        Args:
+            session (P4)
+            args (list): Command and arguments as passed to run().
+            result (list)
+            elapsed (float): Wall time in seconds.
+            error (Exception): The exception raised by the command, if any.
+
+        Returns:
+            None
+        """
+        entry = {
+            "offset": time.time() - elapsed - self._start,
+            "args": self._flatten(args),
+            "elapsed": elapsed,
+            "result": list(result or list()),
+            "error": str(error) if error is not None else None
+        }
+
+        with self._lock:
+            if self._file is not None:
+                self._write(entry)
+                self._count += 1
+        return
+
+    def _write(self, data):
+        self._file.write(json.dumps(data, default=str, separators=(",", ":")))
+        self._file.write("\n")
+        return
+
+    @staticmethod
+    def _flatten(args):
+        result = list()
+
+        for arg in args:
+            if isinstance(arg, (list, tuple)):
+                result += SessionRecorder._flatten(arg)
+            else:
+                result.append(str(arg))
+
+        return result
+
+
+def load_recording(path):
+    """ Returns the header, commands and marks of a recording.
+
+    Args:
+        path (str)
+
+    Returns:
+        tuple(dict, list[dict], list[dict])
+    """
+    header = dict()
+    commands = list()
+    marks = list()
+
+    with gzip.open(path, "rt", encoding="utf-8") as _file:
+        for i, line in enumerate(_file):
+            if not line.strip():
+                continue
+
+            data = json.loads(line)
+
+            if i == 0:
+                header = data
+            elif "mark" in data:
+                marks.append(data)
+            else:
+                commands.append(data)
+
+    return header, commands, marks
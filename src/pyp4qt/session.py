@@ -1,15 +1,51 @@
 # Python Modules
 import os
-from P4 import P4, P4Exception
+import time
+import threading
+from contextlib import contextmanager
+from queue import Queue, Full
+from P4 import P4, P4Exception, OutputHandler
+
+# Project Modules
+from pyp4qt.bulk import CHUNK_SIZE, run_bulk
+from pyp4qt.cache import MetadataCache
+from pyp4qt.tracing import CommandTracer, StreamedOutput
 
 # Qt Modules
 from PySide2.QtCore import QObject, Signal, QThread
 
 
+@contextmanager
+def ignore_warnings(p4):
+    """ Raises only on errors for the commands run within the context. Specs without matches, files already up to
+    date and nothing being opened are reported by the server as warnings, which aren't failures of the command.
+
+    Args:
+        p4 (P4)
+    """
+    with p4.at_exception_level(P4.RAISE_ERRORS):
+        yield
+
+
+class PrivateAttributes(object):
+    """ Mixin for P4 subclasses. The P4 adapter only accepts its own settings as attributes, so private attributes
+    are kept in the instance dictionary.
+    """
+
+    def __setattr__(self, key, value):
+        if key.startswith("_"):
+            self.__dict__[key] = value
+        else:
+            super(PrivateAttributes, self).__setattr__(key, value)
+        return
+
+
 class DictStruct:
     """ Struct that can be constructed to and from a dictionary.
     """
 
+    __slots__ = ()
+
     @classmethod
     def from_dict(cls, data):
         """ Constructs an object from a dictionary.
@@ -54,7 +90,7 @@ class DictStruct:
 
     def __str__(self):
         result = "<" + self.__class__.__name__ + ": "
-        result += str(vars(self))
+        result += str(self.to_dict())
         result += ">"
         return result
 
@@ -67,529 +103,2129 @@ class DictStruct:
         return default_value
 
 
-class DepotDirectory(DictStruct):
-    """ Struct that stores data for directories within the depot.
+class SlotStruct(DictStruct):
+    """ Compact DictStruct that stores its fields in __slots__ rather than a per-instance dictionary.
+
+    Subclasses declare their fields in __slots__ and the fields that default to an empty list in LIST_FIELDS. The
+    slot setters are collected once per class so building records from query results avoids any per-key lookups.
     """
 
+    __slots__ = ()
+
+    LIST_FIELDS = ()
+
+    _FIELDS = ()
+    _SETTERS = ()
+
+    def __init_subclass__(cls, **kwargs):
+        super(SlotStruct, cls).__init_subclass__(**kwargs)
+
+        fields = list()
+
+        for klass in reversed(cls.__mro__):
+            for name in klass.__dict__.get("__slots__", ()):
+                if name not in fields:
+                    fields.append(name)
+
+        cls._FIELDS = tuple(fields)
+        cls._SETTERS = tuple((name, getattr(cls, name).__set__, name in cls.LIST_FIELDS) for name in fields)
+
+    @classmethod
+    def from_dict(cls, data):
+        """ Constructs an object from a dictionary.
+
+        Args:
+            data (dict)
+
+        Returns:
+            SlotStruct
+        """
+        if not isinstance(data, dict):
+            raise RuntimeError("Must provide a dictionary.")
+
+        obj = cls.__new__(cls)
+        get = data.get
+
+        for name, setter, is_list in cls._SETTERS:
+            value = get(name)
+
+            if value is None and is_list:
+                value = list()
+
+            setter(obj, value)
+
+        return obj
+
+    @classmethod
+    def from_rows(cls, rows):
+        """ Constructs a list of objects from query results, skipping any rows that aren't dictionaries.
+
+        Args:
+            rows (list[dict])
+
+        Returns:
+            list[SlotStruct]
+        """
+        result = list()
+        append = result.append
+        new = cls.__new__
+        setters = cls._SETTERS
+
+        for row in rows:
+            if not isinstance(row, dict):
+                continue
+
+            obj = new(cls)
+            get = row.get
+
+            for name, setter, is_list in setters:
+                value = get(name)
+
+                if value is None and is_list:
+                    value = list()
+
+                setter(obj, value)
+
+            append(obj)
+
+        return result
+
     def __init__(self):
-        self.dir = None
+        for name, setter, is_list in self._SETTERS:
+            setter(self, list() if is_list else None)
+
+    def to_dict(self):
+        """ Returns a dictionary of class attributes.
+
+        Returns:
+            dict
+        """
+        return {name: getattr(self, name) for name in self._FIELDS}
+
+
+class DepotDirectory(SlotStruct):
+    """ Struct that stores data for directories within the depot.
+    """
 
+    __slots__ = ("dir",)
 
-class DepotFile(DictStruct):
+
+class DepotFile(SlotStruct):
     """ Struct that stores data for files within the depot.
     """
 
-    def __init__(self):
-        self.depotFile = None
-        self.rev = None
-        self.change = None
-        self.action = None
-        self.type = None
-        self.time = None
-        self.haveRev = None
-        self.client = None
-        self.user = None
-        self.clientFile = None
-
-
-class ChangeList(DictStruct):
+    __slots__ = (
+        "depotFile",
+        "rev",
+        "change",
+        "action",
+        "type",
+        "time",
+        "haveRev",
+        "client",
+        "user",
+        "clientFile"
+    )
+
+
+class ChangeList(SlotStruct):
     """ Struct that stores data for change lists
     """
 
-    def __init__(self):
-        self.change = None
-        self.time = None
-        self.user = None
-        self.client = None
-        self.status = None
-        self.changeType = None
-        self.desc = None
-        self.depotFile = list()
-        self.action = list()
-        self.type = list()
-        self.rev = list()
-
-
-class Session(P4):
-    """ Subclass of a P4 Session with convenience methods.
+    __slots__ = (
+        "change",
+        "time",
+        "user",
+        "client",
+        "status",
+        "changeType",
+        "desc",
+        "depotFile",
+        "action",
+        "type",
+        "rev"
+    )
+
+    LIST_FIELDS = ("depotFile", "action", "type", "rev")
+
+
+class PendingSnapshot(object):
+    """ In-memory snapshot of a client's pending change lists and the files opened in them.
+
+    Built from two queries: the pending change lists and every opened file, grouped by change number. Files opened
+    in the default change list are grouped under "default".
+
+    Examples:
+        snapshot = session.pending_snapshot()
+
+        for changelist in snapshot.changelists():
+            print(changelist.change, len(snapshot.files(changelist.change)))
     """
 
-    def __del__(self):
-        if self.connected():
-            self.disconnect()
+    DEFAULT = "default"
 
-    def __enter__(self):
-        self.connect()
-        return self
+    def __init__(self, changelists=None, files=None):
+        self._changelists = list(changelists or list())
+        self._changes = dict()
+        self._files = dict()
+        self._time = time.time()
 
-    def __exit__(self, exc_type, exc_val, exc_tb):
-        if self.connected():
-            self.disconnect()
-        return
+        for changelist in self._changelists:
+            self._changes[str(changelist.change)] = changelist
 
-    def info(self):
-        """ Returns a dictionary of information from the current P4 session.
+        for file in files or list():
+            self._files.setdefault(str(file.change), list()).append(file)
+
+    def time(self):
+        """ Returns the time the snapshot was taken.
 
         Returns:
-            dict()
+            float
         """
-        result = dict()
-
-        if not self.connected():
-            return result
+        return self._time
 
-        info = self.run("info")
+    def changelists(self):
+        """ Returns the numbered pending change lists.
 
-        if info:
-            result = info[0]
+        Returns:
+            list[ChangeList]
+        """
+        return list(self._changelists)
 
-        return result
+    def changelist(self, change):
+        """ Returns a numbered pending change list, or None if it isn't in the snapshot.
 
-    def user_name(self):
-        """ Returns the string name of the user.
+        Args:
+            change (str, int)
 
         Returns:
-            str
+            ChangeList
         """
-        return self.info().get("userName", str())
+        return self._changes.get(str(change))
 
-    def client_name(self):
-        """ Returns the string name of the client
+    def files(self, change=DEFAULT):
+        """ Returns the files opened in a change list.
+
+        Args:
+            change (str, int)
 
         Returns:
-            str
+            list[DepotFile]
         """
-        return self.info().get("clientName", str())
+        return list(self._files.get(str(change), list()))
 
-    def client_root(self):
-        """ Returns the current client root directory.
+    def file_count(self, change=DEFAULT):
+        """ Returns the number of files opened in a change list.
+
+        Args:
+            change (str, int)
 
         Returns:
-            str
+            int
         """
-        return self.info().get("clientRoot", str())
+        return len(self._files.get(str(change), list()))
 
-    def last_user(self, path):
-        """ Returns the name of the last user from a depot file path.
+
+class FileQuery(object):
+    """ Builder of an fstat query whose predicates the server evaluates, so only matching files are returned.
+
+    Extensions compile to one file spec per extension, opened status to "-Ro", and head action, opened action and
+    modification time to an "fstat -F" filter expression. The last submitter isn't an fstat field, so a user
+    predicate is resolved with a single "filelog -m 1" over the same specs. Works with a Session or a plain P4
+    connection.
+
+    Examples:
+        query = session.file_query("//depot/shots").extensions([".ma", ".mb"]).head_action("delete", exclude=True)
+
+        for item in query.run():
+            print(item["depotFile"], item["headRev"])
+    """
+
+    DELETE_ACTIONS = ("delete", "move/delete")
+
+    # Characters with a meaning in filter expressions that have to be escaped in values
+    SPECIAL_CHARACTERS = " \t&|()^=<>\""
+
+    @staticmethod
+    def escape(value):
+        """ Returns a value escaped for use in a filter expression.
 
         Args:
-            path (str)
+            value (str)
 
         Returns:
             str
         """
+        return "".join("\\" + char if char in FileQuery.SPECIAL_CHARACTERS else char for char in str(value))
 
-        log = self.run("filelog", path)[0]
-        users = log.get("user")
+    def __init__(self, p4, path, recursive=False):
+        self._p4 = p4
+        self._path = path
+        self._recursive = recursive
+        self._options = list()
+        self._extensions = None
+        self._filters = list()
+        self._user = None
+        self._fields = None
 
-        if users:
-            return users[0]
+    def __str__(self):
+        return " ".join(self.args())
 
-        return str()
+    def fields(self, *fields):
+        """ Limits the fields returned for every file, "depotFile" is always included.
 
-    def has_user(self, path, user):
-        """ Returns True if a user made modifications on depot file.
+        Args:
+            *fields (str): fstat fields, e.g. "headRev", "headAction"
+
+        Returns:
+            FileQuery
+        """
+        self._fields = list(fields) if fields else None
+        return self
+
+    def option(self, *args):
+        """ Adds fstat options as is, e.g. "-Olhp".
 
         Args:
-            path (str)
-            user (str)
+            *args (str)
 
         Returns:
-            bool
+            FileQuery
         """
-        log = self.run("filelog", path)[0]
+        self._options += [str(arg) for arg in args]
+        return self
 
-        if user in log.get("user", list()):
-            return True
+    def extensions(self, extensions):
+        """ Limits the query to files with any of the extensions.
 
-        return False
+        Args:
+            extensions (list[str]): e.g. [".ma", ".mb"]
 
-    def depot_dirs(self, path=str(), recursive=False):
-        """ Returns a list of DepotDirectory subdirectories from a root path.
+        Returns:
+            FileQuery
+        """
+        self._extensions = list(extensions) if extensions else None
+        return self
+
+    def where(self, field, values, exclude=False):
+        """ Adds a predicate matching files whose field equals any of the values, or none of them when excluding.
 
         Args:
-            path (str)
-            recursive (bool)
+            field (str): fstat field, e.g. "headAction"
+            values (list[str])
+            exclude (bool)
 
         Returns:
-            list[DepotDirectory]
+            FileQuery
         """
-        result = list()
+        values = [self.escape(value) for value in values]
 
-        if not self.connected():
-            return result
+        if not values:
+            return self
 
-        # Fix Path for querying
-        if not path:
-            path = "//*"
+        if exclude:
+            self._filters.append(" & ".join("^{}={}".format(field, value) for value in values))
+        elif len(values) == 1:
+            self._filters.append("{}={}".format(field, values[0]))
         else:
-            if path.endswith("/"):
-                path += "*"
-            elif path.endswith("*"):
-                pass
-            else:
-                path += "/*"
+            self._filters.append("({})".format(" | ".join("{}={}".format(field, value) for value in values)))
 
-        # Get dirs
-        query = self.run("dirs", path)
+        return self
 
-        for item in query:
-            obj = DepotDirectory.from_dict(item)
-            result.append(obj)
+    def head_action(self, *actions, exclude=False):
+        """ Limits the query to files whose head revision was submitted with any of the actions.
 
-        return result
+        Args:
+            *actions (str): e.g. "delete", "move/delete"
+            exclude (bool): Matches files whose head action is none of the actions instead.
 
-    def depot_files(self, path, recursive=False, extension_filter=None, user_filter=None):
-        """ Returns a list of DepotFile files from a root path.
+        Returns:
+            FileQuery
+        """
+        return self.where("headAction", actions, exclude)
+
+    def action(self, *actions, exclude=False):
+        """ Limits the query to files opened with any of the actions.
 
         Args:
-            path (str)
-            recursive (bool)
-            extension_filter (list)
-            user_filter (str)
+            *actions (str): e.g. "edit", "add"
+            exclude (bool): Matches files not opened with any of the actions instead, including unopened files.
 
         Returns:
-            list[DepotFile]
+            FileQuery
         """
-        result = list()
+        return self.where("action", actions, exclude)
 
-        if not self.connected():
-            return result
+    def exclude_deleted(self):
+        """ Leaves out files deleted at their head revision or opened for delete.
 
-        # Fix filter
-        if isinstance(extension_filter, list):
-            for i in range(len(extension_filter)):
-                string = extension_filter[i]
+        The opened action takes precedence over the head action, so files opened for add on top of a deleted head
+        revision are kept.
 
-                if isinstance(string, str) and not string.startswith("."):
-                    extension_filter[i] = ".{}".format(string)
+        Returns:
+            FileQuery
+        """
+        def excluded(field):
+            return " & ".join("^{}={}".format(field, self.escape(action)) for action in FileQuery.DELETE_ACTIONS)
 
-        # Fix Path for querying
-        if recursive:
-            if path.endswith("/"):
-                path += "..."
-            elif path.endswith("/..."):
-                pass
-            else:
-                path += "/..."
-        else:
-            if path.endswith("/"):
-                path += "*"
-            elif path.endswith("/*"):
-                pass
-            else:
-                path += "/*"
+        self._filters.append("((action=* & {}) | (^action=* & {}))".format(excluded("action"), excluded("headAction")))
+        return self
+
+    def modified_after(self, value):
+        """ Limits the query to files whose head revision was submitted after a time.
 
-        # Get files
-        if extension_filter and isinstance(extension_filter, list):
-            for f in extension_filter:
+        Args:
+            value (int, float, datetime.datetime): Seconds since the epoch or a datetime.
 
-                try:
-                    query = self.run("files", "-e", path + f)
-                except P4Exception:
-                    return result
+        Returns:
+            FileQuery
+        """
+        if hasattr(value, "timestamp"):
+            value = value.timestamp()
 
-                if user_filter:
-                    for item in query:
-                        obj = DepotFile.from_dict(item)
+        self._filters.append("headTime>{}".format(int(value)))
+        return self
 
-                        if self.last_user(obj.depotFile) in user_filter:
-                              result.append(DepotFile.from_dict(item))
+    def opened(self, change=None):
+        """ Limits the query to files opened in the client, optionally in a change list.
 
-                else:
-                    result += [DepotFile.from_dict(item) for item in query]
-        else:
-            try:
-                query = self.run("files", "-e", path)
-            except:
-                return result
+        Args:
+            change (str, int): Change number or "default".
 
-            if user_filter:
-                for item in query:
-                    obj = DepotFile.from_dict(item)
+        Returns:
+            FileQuery
+        """
+        if "-Ro" not in self._options:
+            self._options.append("-Ro")
 
-                    if self.last_user(obj.depotFile) in user_filter:
-                        result.append(DepotFile.from_dict(item))
-            else:
-                result = [DepotFile.from_dict(item) for item in query]
+        if change is not None:
+            self.where("change", [str(change)])
 
-        return result
+        return self
 
-    def create_changelist(self, description):
-        """ Create a new changelist and returns its id. Returns -1 if unable to create a new changelist.
+    def user(self, user):
+        """ Limits the query to files last submitted by a user.
 
         Args:
-            description (str)
+            user (str)
 
         Returns:
-            int
+            FileQuery
         """
-        if not self.connected():
-            return -1
+        self._user = user
+        return self
 
-        result = self.save_change({"Change": "new", "Description": description})[0]
-        return int(result.split()[1])
+    def specs(self):
+        """ Returns the file specs the query covers.
 
-    def pending_changelists(self):
-        """ Returns a list of pending change lists.
+        Returns:
+            list[str]
+        """
+        return Session.extension_specs(Session.file_spec(self._path, self._recursive), self._extensions)
+
+    def expression(self):
+        """ Returns the filter expression passed to "fstat -F", or an empty string without predicates.
 
         Returns:
-            list[Changelist]
+            str
         """
-        result = list()
+        return " & ".join(self._filters)
 
-        if not self.connected():
-            return result
+    def args(self):
+        """ Returns the fstat command and arguments of the query.
 
-        info = self.info()
-        query = self.run_changes("-s", "pending", "-u", self.user_name())
+        Returns:
+            list[str]
+        """
+        args = ["fstat"] + self._options + Session.field_args(self._fields)
+        expression = self.expression()
 
-        for item in query:
-            if item.get("user") == info.get("userName") and item.get("client") == info.get("clientName"):
-                changelist = ChangeList.from_dict(item)
-                result.append(changelist)
+        if expression:
+            args += ["-F", expression]
 
-        return result
+        return args + self.specs()
 
-    def revert_file(self, path):
-        """ Revert the file from its path.
+    def run(self):
+        """ Runs the query and returns the fstat records of the matching files.
 
-        Args:
+        Returns:
+            list[dict]
+        """
+        specs = self.specs()
+
+        with ignore_warnings(self._p4):
+            query = self._p4.run(*self.args())
+
+            if self._user is None:
+                return [item for item in query if isinstance(item, dict)]
+
+            users = dict()
+
+            for log in self._p4.run("filelog", "-m", "1", *specs):
+                if isinstance(log, dict) and log.get("user"):
+                    users[log.get("depotFile")] = log["user"][0]
+
+        return [item for item in query if isinstance(item, dict) and users.get(item.get("depotFile")) == self._user]
+
+
+class StreamHandler(OutputHandler):
+    """ Output handler that forwards tagged records to a bounded queue as the server sends them.
+
+    The handler blocks the command while the queue is full, so at most the queue's size of records is held in
+    memory. Calling cancel() stops the command at the next record.
+    """
+
+    END = object()
+
+    def __init__(self, queue):
+        OutputHandler.__init__(self)
+
+        self._queue = queue
+        self._cancelled = threading.Event()
+        self.count = 0
+
+    def cancel(self):
+        self._cancelled.set()
+        return
+
+    def is_cancelled(self):
+        return self._cancelled.is_set()
+
+    def put(self, item):
+        """ Adds an item to the queue, waiting for space unless the handler gets cancelled.
+
+        Args:
+            item (object)
+
+        Returns:
+            bool
+        """
+        while not self._cancelled.is_set():
+            try:
+                self._queue.put(item, timeout=0.1)
+                return True
+            except Full:
+                pass
+
+        return False
+
+    def outputStat(self, stat):
+        if not self.put(stat):
+            return OutputHandler.HANDLED | OutputHandler.CANCEL
+
+        self.count += 1
+        return OutputHandler.HANDLED
+
+
+class TracingHandler(OutputHandler):
+    """ Output handler that counts the output it forwards to another handler, so tracers see streamed commands.
+
+    The records are only kept when keep_output is set, e.g. for a SessionRecorder.
+    """
+
+    def __init__(self, handler, keep_output=False):
+        OutputHandler.__init__(self)
+
+        self._handler = handler
+        self._keep_output = keep_output
+        self.output = StreamedOutput()
+
+    def _add(self, record):
+        self.output.rows += 1
+        self.output.size += CommandTracer.payload_size([record])
+
+        if self._keep_output:
+            self.output.append(record)
+        return
+
+    def outputStat(self, stat):
+        self._add(stat)
+        return self._handler.outputStat(stat)
+
+    def outputInfo(self, info):
+        self._add(info)
+        return self._handler.outputInfo(info)
+
+    def outputMessage(self, message):
+        self._add(str(message))
+        return self._handler.outputMessage(message)
+
+    def outputText(self, text):
+        return self._handler.outputText(text)
+
+    def outputBinary(self, data):
+        return self._handler.outputBinary(data)
+
+
+class Session(PrivateAttributes, P4):
+    """ Subclass of a P4 Session with convenience methods.
+    """
+
+    # Seconds the result of "p4 info" is reused before querying the server again
+    INFO_TTL = 30.0
+
+    # Maximum number of streamed records held in memory before the server output is throttled
+    STREAM_BUFFER_SIZE = 1000
+
+    # Number of revisions returned per page of a file's history
+    HISTORY_PAGE_SIZE = 50
+
+    # Attributes that change the answer of "p4 info" when set
+    INFO_ATTRIBUTES = ("port", "user", "client", "cwd")
+
+    # Commands whose results depend on the client's state and not only on submitted changes, never cached
+    CLIENT_COMMANDS = ("fstat",)
+
+    def __init__(self, *args, **kwargs):
+        super(Session, self).__init__(*args, **kwargs)
+
+        self._info = dict()
+        self._info_time = 0.0
+        self._info_ttl = Session.INFO_TTL
+
+        self._cache = None
+        self._cache_pool = None
+        self._cache_owns_pool = False
+        self._cache_pending = set()
+        self._cache_lock = threading.Lock()
+
+        self._tracers = list()
+
+    def __setattr__(self, key, value):
+        if key in Session.INFO_ATTRIBUTES:
+            self.invalidate_info()
+
+        super(Session, self).__setattr__(key, value)
+        return
+
+    def __del__(self):
+        if self.connected():
+            self.disconnect()
+
+    def __enter__(self):
+        self.connect()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if self.connected():
+            self.disconnect()
+        return
+
+    def connect(self):
+        self.invalidate_info()
+        return super(Session, self).connect()
+
+    def disconnect(self):
+        self.invalidate_info()
+        return super(Session, self).disconnect()
+
+    def run(self, *args, **kwargs):
+        """ Runs a command, reporting its timing and results to the session's tracers.
+
+        The run_*, fetch_* and save_* helpers all go through this method.
+
+        Returns:
+            list
+        """
+        if not self._tracers:
+            return super(Session, self).run(*args, **kwargs)
+
+        result = None
+        error = None
+        handler = kwargs.get("handler")
+
+        if isinstance(handler, OutputHandler):
+            keep_output = any(getattr(tracer, "KEEP_OUTPUT", False) for tracer in self._tracers)
+            handler = kwargs["handler"] = TracingHandler(handler, keep_output)
+
+        start = time.perf_counter()
+
+        try:
+            result = super(Session, self).run(*args, **kwargs)
+            return result
+
+        except P4Exception as e:
+            error = e
+            raise
+
+        finally:
+            elapsed = time.perf_counter() - start
+
+            if isinstance(handler, TracingHandler):
+                result = handler.output
+
+            for tracer in list(self._tracers):
+                tracer.trace(self, args, result, elapsed, error)
+
+    def tracers(self):
+        """ Returns the tracers commands are reported to.
+
+        Returns:
+            list[CommandTracer]
+        """
+        return list(self._tracers)
+
+    def add_tracer(self, tracer):
+        """ Reports every command run on this session to a tracer.
+
+        Args:
+            tracer (CommandTracer): Any object with a trace(session, args, result, elapsed, error) method.
+
+        Returns:
+            None
+        """
+        if tracer not in self._tracers:
+            self._tracers.append(tracer)
+        return
+
+    def remove_tracer(self, tracer):
+        """ Stops reporting commands to a tracer.
+
+        Args:
+            tracer (CommandTracer)
+
+        Returns:
+            None
+        """
+        if tracer in self._tracers:
+            self._tracers.remove(tracer)
+        return
+
+    def info_ttl(self):
+        """ Returns the number of seconds the cached session info is valid for.
+
+        Returns:
+            float
+        """
+        return self._info_ttl
+
+    def set_info_ttl(self, seconds):
+        """ Sets the number of seconds the cached session info is valid for. A value of 0 disables the cache.
+
+        Args:
+            seconds (float)
+
+        Returns:
+            None
+        """
+        self._info_ttl = float(seconds)
+        return
+
+    def invalidate_info(self):
+        """ Clears the cached session info so the next call queries the server.
+
+        Returns:
+            None
+        """
+        self._info = dict()
+        self._info_time = 0.0
+        return
+
+    def info(self, refresh=False):
+        """ Returns a dictionary of information from the current P4 session.
+
+        The result of "p4 info" is cached for the session's info TTL and cleared on reconnect or when the port,
+        user, client or cwd changes.
+
+        Args:
+            refresh (bool): Ignores the cached info and queries the server.
+
+        Returns:
+            dict()
+        """
+        if not self.connected():
+            return dict()
+
+        now = time.time()
+
+        if refresh or not self._info or now - self._info_time >= self._info_ttl:
+            info = self.run("info")
+
+            self._info = info[0] if info else dict()
+            self._info_time = now
+
+        return dict(self._info)
+
+    def metadata_cache(self):
+        """ Returns the metadata cache used to answer depot queries, or None if caching is disabled.
+
+        Returns:
+            MetadataCache
+        """
+        return self._cache
+
+    def set_metadata_cache(self, cache, pool=None):
+        """ Sets the metadata cache used to answer depot queries. Passing None disables caching.
+
+        Cached results are returned immediately and revalidated in the background on a pooled session.
+
+        Args:
+            cache (MetadataCache)
+            pool (SessionPool): Pool used for background revalidation, one is created from this session if None.
+
+        Returns:
+            None
+        """
+        if self._cache_owns_pool and self._cache_pool is not None and self._cache_pool is not pool:
+            self._cache_pool.close()
+
+        self._cache = None
+        self._cache_pool = pool
+        self._cache_owns_pool = False
+
+        # Created before the cache is set so the revalidating sessions query the server themselves
+        if cache is not None and pool is None:
+            self._cache_pool = SessionPool.from_session(self, max_size=1)
+            self._cache_owns_pool = True
+
+        self._cache = cache
+        return
+
+    def metadata_cache_pool(self):
+        """ Returns the session pool cached results are revalidated with, or None if caching is disabled.
+
+        Returns:
+            SessionPool
+        """
+        return self._cache_pool
+
+    def use_environment_cache(self):
+        """ Uses the metadata cache shared by the process if the PYP4QT_METADATA_CACHE environment variable enables
+        it and the session doesn't have a cache yet.
+
+        Returns:
+            None
+        """
+        if self._cache is None:
+            cache = MetadataCache.from_environment()
+
+            if cache is not None:
+                self.set_metadata_cache(cache)
+        return
+
+    def cache_key(self):
+        """ Returns the key of this session's server and client within the metadata cache.
+
+        Returns:
+            str
+        """
+        return "{}@{}".format(self.client, self.port)
+
+    def invalidate_cache(self, path=None):
+        """ Removes this session's cached results, limited to those covering a depot path when one is given.
+
+        Args:
+            path (str): Depot path, e.g. "//depot/shots"
+
+        Returns:
+            None
+        """
+        if self._cache is not None:
+            self._cache.invalidate(self.cache_key(), path)
+        return
+
+    @staticmethod
+    def cache_scope(spec):
+        """ Returns the recursive depot path whose submitted changes invalidate the results of a file spec.
+
+        Args:
+            spec (str): File spec, e.g. "//depot/shots/*.ma"
+
+        Returns:
+            str
+        """
+        return spec[:spec.rfind("/")] + "/..."
+
+    def latest_change(self, path):
+        """ Returns the number of the most recent submitted change affecting a path, or 0 if there are none.
+
+        Args:
+            path (str): File spec, e.g. "//depot/shots/..."
+
+        Returns:
+            int
+        """
+        if not self.connected():
+            return 0
+
+        with ignore_warnings(self):
+            query = self.run("changes", "-m", "1", "-s", "submitted", path)
+
+        for item in query:
+            if isinstance(item, dict):
+                return int(item.get("change", 0))
+
+        return 0
+
+    def cached_run(self, *args):
+        """ Runs a depot query, answering from the metadata cache when the query has been cached before.
+
+        Cached results are revalidated in the background against the latest submitted change of the queried
+        path, so the following call sees any changes. Without a metadata cache, or for commands reporting the
+        client's state such as fstat, this is the same as run().
+
+        Args:
+            *args (str): Command and arguments, the last of which is the queried file spec.
+
+        Returns:
+            list[dict]
+        """
+        if self._cache is None or args[0] in Session.CLIENT_COMMANDS:
+            return self.run(*args)
+
+        key = self.cache_key()
+        command = " ".join(args)
+        scope = self.cache_scope(args[-1])
+        entry = self._cache.get(key, command)
+
+        if entry is not None:
+            self._revalidate(key, command, scope, entry[0], args)
+            return entry[1]
+
+        change = self.latest_change(scope)
+        result = self.run(*args)
+        self._cache.put(key, command, scope, change, result)
+
+        return result
+
+    def _revalidate(self, key, command, scope, change, args):
+        with self._cache_lock:
+            if command in self._cache_pending:
+                return
+
+            self._cache_pending.add(command)
+
+        cache = self._cache
+        pool = self._cache_pool
+
+        def revalidate():
+            try:
+                with pool.session() as session:
+                    latest = session.latest_change(scope)
+
+                    if latest == change:
+                        return
+
+                    with ignore_warnings(session):
+                        result = session.run(*args)
+
+                    cache.put(key, command, scope, latest, result)
+
+            except (P4Exception, RuntimeError):
+                pass
+
+            finally:
+                with self._cache_lock:
+                    self._cache_pending.discard(command)
+
+        thread = threading.Thread(target=revalidate)
+        thread.daemon = True
+        thread.start()
+        return
+
+    def user_name(self):
+        """ Returns the string name of the user.
+
+        Returns:
+            str
+        """
+        return self.info().get("userName", str())
+
+    def client_name(self):
+        """ Returns the string name of the client
+
+        Returns:
+            str
+        """
+        return self.info().get("clientName", str())
+
+    def client_root(self):
+        """ Returns the current client root directory.
+
+        Returns:
+            str
+        """
+        return self.info().get("clientRoot", str())
+
+    def last_user(self, path):
+        """ Returns the name of the last user from a depot file path.
+
+        Args:
+            path (str)
+
+        Returns:
+            str
+        """
+
+        log = self.run("filelog", "-m", "1", path)[0]
+        users = log.get("user")
+
+        if users:
+            return users[0]
+
+        return str()
+
+    def last_users(self, path):
+        """ Returns the name of the last user of every file matching a file spec from a single query.
+
+        Args:
+            path (str, list[str]): File spec or specs, e.g. "//depot/shots/*"
+
+        Returns:
+            dict[str, str]: User names keyed by depot file path.
+        """
+        result = dict()
+
+        for depot_file, log in self.files_log(path, max_revisions=1).items():
+            users = log.get("user")
+
+            if users:
+                result[depot_file] = users[0]
+
+        return result
+
+    def has_user(self, path, user):
+        """ Returns True if a user made modifications on depot file.
+
+        Args:
+            path (str)
+            user (str)
+
+        Returns:
+            bool
+        """
+        log = self.run("filelog", path)[0]
+
+        if user in log.get("user", list()):
+            return True
+
+        return False
+
+    @staticmethod
+    def file_spec(path, recursive=False):
+        """ Returns a file spec matching the files within a directory path.
+
+        Args:
+            path (str)
+            recursive (bool)
+
+        Returns:
+            str
+        """
+        if recursive:
+            if path.endswith("/"):
+                path += "..."
+            elif path.endswith("/..."):
+                pass
+            else:
+                path += "/..."
+        else:
+            if path.endswith("/"):
+                path += "*"
+            elif path.endswith("/*"):
+                pass
+            else:
+                path += "/*"
+
+        return path
+
+    @staticmethod
+    def dir_spec(path):
+        """ Returns a spec matching the subdirectories of a directory path.
+
+        Args:
+            path (str)
+
+        Returns:
+            str
+        """
+        if not path:
+            path = "//*"
+        else:
+            if path.endswith("/"):
+                path += "*"
+            elif path.endswith("*"):
+                pass
+            else:
+                path += "/*"
+
+        return path
+
+    @staticmethod
+    def extension_specs(path, extension_filter=None):
+        """ Returns a list of file specs for each extension of the filter, or the path itself without a filter.
+
+        Args:
+            path (str)
+            extension_filter (list)
+
+        Returns:
+            list[str]
+        """
+        if not extension_filter or not isinstance(extension_filter, list):
+            return [path]
+
+        result = list()
+
+        for extension in extension_filter:
+            if isinstance(extension, str) and not extension.startswith("."):
+                extension = ".{}".format(extension)
+
+            result.append(path + extension)
+
+        return result
+
+    def file_query(self, path, recursive=False):
+        """ Returns a FileQuery of the files within a directory path, filtered by the server.
+
+        Args:
+            path (str)
+            recursive (bool)
+
+        Returns:
+            FileQuery
+        """
+        return FileQuery(self, path, recursive)
+
+    def iter_run(self, *args):
+        """ Runs a command and yields its tagged records while the server is still sending them.
+
+        The command runs on a separate thread that is throttled once STREAM_BUFFER_SIZE records are waiting, so
+        memory stays bounded. Closing the generator early cancels the command. The session must not run other
+        commands until the generator is exhausted or closed.
+
+        Args:
+            *args: Command and arguments, e.g. ("files", "//depot/...")
+
+        Returns:
+            generator[dict]
+        """
+        records = Queue(maxsize=self.STREAM_BUFFER_SIZE)
+        handler = StreamHandler(records)
+        errors = list()
+
+        def produce():
+            try:
+                with ignore_warnings(self):
+                    self.run(*args, handler=handler)
+            except P4Exception as e:
+                errors.append(e)
+            finally:
+                handler.put(StreamHandler.END)
+
+        thread = threading.Thread(target=produce)
+        thread.daemon = True
+        thread.start()
+
+        try:
+            while True:
+                item = records.get()
+
+                if item is StreamHandler.END:
+                    break
+
+                yield item
+        finally:
+            handler.cancel()
+            thread.join()
+
+        if errors:
+            raise errors[0]
+
+    def iter_depot_dirs(self, path=str(), recursive=False):
+        """ Yields DepotDirectory subdirectories from a root path as the server returns them.
+
+        Args:
+            path (str)
+            recursive (bool)
+
+        Returns:
+            generator[DepotDirectory]
+        """
+        if not self.connected():
+            return
+
+        try:
+            for item in self.iter_run("dirs", self.dir_spec(path)):
+                yield DepotDirectory.from_dict(item)
+        except P4Exception:
+            return
+
+    def iter_depot_files(self, path, recursive=False, extension_filter=None, user_filter=None):
+        """ Yields DepotFile files from a root path as the server returns them.
+
+        Args:
+            path (str)
+            recursive (bool)
+            extension_filter (list)
+            user_filter (str)
+
+        Returns:
+            generator[DepotFile]
+        """
+        if not self.connected():
+            return
+
+        # Filtering by user needs a file log query, which can't run while the listing streams.
+        if user_filter:
+            for obj in self.depot_files(path, recursive, list(extension_filter or list()), user_filter):
+                yield obj
+            return
+
+        specs = self.extension_specs(self.file_spec(path, recursive), extension_filter)
+        found = set()
+
+        try:
+            for item in self.iter_run("files", "-e", *specs):
+                if item.get("depotFile") not in found:
+                    found.add(item.get("depotFile"))
+                    yield DepotFile.from_dict(item)
+        except P4Exception:
+            return
+
+    def depot_dirs(self, path=str(), recursive=False):
+        """ Returns a list of DepotDirectory subdirectories from a root path.
+
+        Args:
+            path (str)
+            recursive (bool)
+
+        Returns:
+            list[DepotDirectory]
+        """
+        result = list()
+
+        if not self.connected():
+            return result
+
+        # Get dirs
+        query = self.cached_run("dirs", self.dir_spec(path))
+
+        return DepotDirectory.from_rows(query)
+
+    def depot_files(self, path, recursive=False, extension_filter=None, user_filter=None):
+        """ Returns a list of DepotFile files from a root path.
+
+        Args:
+            path (str)
+            recursive (bool)
+            extension_filter (list)
+            user_filter (str, list[str]): A user name or a list of user names.
+
+        Returns:
+            list[DepotFile]
+        """
+        result = list()
+
+        if not self.connected():
+            return result
+
+        if isinstance(user_filter, str):
+            user_filter = [user_filter]
+
+        names = set(user_filter or list())
+        specs = self.extension_specs(self.file_spec(path, recursive), extension_filter)
+
+        # One query for every extension
+        try:
+            with ignore_warnings(self):
+                query = self.cached_run("files", "-e", *specs)
+        except P4Exception:
+            return result
+
+        users = self.last_users(specs) if names else None
+        found = set()
+
+        for obj in DepotFile.from_rows(query):
+            if obj.depotFile in found:
+                continue
+
+            found.add(obj.depotFile)
+
+            if users is None or users.get(obj.depotFile, str()) in names:
+                result.append(obj)
+
+        return result
+
+    def create_changelist(self, description):
+        """ Create a new changelist and returns its id. Returns -1 if unable to create a new changelist.
+
+        Args:
+            description (str)
+
+        Returns:
+            int
+        """
+        if not self.connected():
+            return -1
+
+        result = self.save_change({"Change": "new", "Description": description})[0]
+        return int(result.split()[1])
+
+    def pending_changelists(self):
+        """ Returns a list of pending change lists.
+
+        Returns:
+            list[Changelist]
+        """
+        result = list()
+
+        if not self.connected():
+            return result
+
+        info = self.info()
+        query = self.run_changes("-s", "pending", "-u", self.user_name())
+
+        for item in query:
+            if item.get("user") == info.get("userName") and item.get("client") == info.get("clientName"):
+                changelist = ChangeList.from_dict(item)
+                result.append(changelist)
+
+        return result
+
+    def pending_snapshot(self):
+        """ Returns a snapshot of the client's pending change lists and opened files from two queries.
+
+        Returns:
+            PendingSnapshot
+        """
+        if not self.connected():
+            return PendingSnapshot()
+
+        user = self.user_name()
+        client = self.client_name()
+
+        with ignore_warnings(self):
+            changes = self.run("changes", "-s", "pending", "-u", user, "-c", client)
+            opened = self.run("opened", "-u", user, "-C", client)
+
+        return PendingSnapshot(ChangeList.from_rows(changes), DepotFile.from_rows(opened))
+
+    def submitted_changelists(self, path, after=0):
+        """ Returns the submitted change lists affecting a path that are newer than a change number, oldest first.
+
+        Only the change lists themselves and their file lists are queried, not the file diffs.
+
+        Args:
+            path (str): File spec, e.g. "//depot/shots/..."
+            after (int): Change number the change lists must be newer than.
+
+        Returns:
+            list[ChangeList]
+        """
+        result = list()
+
+        if not self.connected():
+            return result
+
+        with ignore_warnings(self):
+            query = self.run("changes", "-s", "submitted", "{}@>{}".format(path, int(after)))
+
+        changes = [item["change"] for item in query if isinstance(item, dict) and item.get("change")]
+
+        if not changes:
+            return result
+
+        result = self.get_changelists(changes)
+        result.sort(key=lambda changelist: int(changelist.change))
+
+        return result
+
+    def revert_file(self, path):
+        """ Revert the file from its path.
+
+        Args:
+            path (str)
+
+        Returns:
+            None
+        """
+        if not self.connected():
+            return
+
+        self.run("revert", "-a", path)
+        return
+
+    def checkout_file(self, path, changelist="default"):
+        """ Checkout a file from its depot path and return its local path.
+
+        Args:
+            path (str)
+            changelist (str, int)
+
+        Returns:
+            str
+        """
+        if not self.connected():
+            return
+
+        result = self.run("edit", "-c", changelist, path)[0]
+
+        if isinstance(result, str):
+            raise P4Exception(result)
+
+        return result.get("clientFile", str())
+
+    def move_to_changelist(self, path, changelist="default"):
+        """ Move the file path to the provided changelist.
+
+        Args:
             path (str)
+            changelist (str, int)
+
+        Returns:
+            None
+        """
+        if not self.connected():
+            return
+
+        self.run("reopen", "-c", changelist, path)
+        return
+
+    def checkout_files(self, paths, changelist="default", chunk_size=CHUNK_SIZE):
+        """ Checks out many files with as few commands as possible.
+
+        Args:
+            paths (list[str])
+            changelist (str, int)
+            chunk_size (int): Maximum number of paths per command.
+
+        Returns:
+            BulkReport
+        """
+        return run_bulk(self, "edit", paths, ["-c", changelist], chunk_size)
+
+    def add_files(self, paths, changelist="default", chunk_size=CHUNK_SIZE):
+        """ Opens many new files for add with as few commands as possible.
+
+        Args:
+            paths (list[str])
+            changelist (str, int)
+            chunk_size (int): Maximum number of paths per command.
+
+        Returns:
+            BulkReport
+        """
+        return run_bulk(self, "add", paths, ["-c", changelist], chunk_size)
+
+    def revert_files(self, paths, unchanged_only=True, chunk_size=CHUNK_SIZE):
+        """ Reverts many files with as few commands as possible.
+
+        Args:
+            paths (list[str])
+            unchanged_only (bool): Only reverts files that haven't been modified, like revert_file.
+            chunk_size (int): Maximum number of paths per command.
+
+        Returns:
+            BulkReport
+        """
+        return run_bulk(self, "revert", paths, ["-a"] if unchanged_only else list(), chunk_size)
+
+    def reopen_files(self, paths, changelist="default", chunk_size=CHUNK_SIZE):
+        """ Moves many opened files to a changelist with as few commands as possible.
+
+        Args:
+            paths (list[str])
+            changelist (str, int)
+            chunk_size (int): Maximum number of paths per command.
+
+        Returns:
+            BulkReport
+        """
+        return run_bulk(self, "reopen", paths, ["-c", changelist], chunk_size)
+
+    def lock_files(self, paths, chunk_size=CHUNK_SIZE):
+        """ Locks many opened files with as few commands as possible.
+
+        Args:
+            paths (list[str])
+            chunk_size (int): Maximum number of paths per command.
+
+        Returns:
+            BulkReport
+        """
+        return run_bulk(self, "lock", paths, None, chunk_size)
+
+    def delete_changelist(self, changelist):
+        """ Deletes the changelist
+
+        Args:
+            changelist (int)
+
+        Returns:
+            None
+        """
+        if not self.connected():
+            return
+
+        self.run("change", "-d", changelist)
+        return
+
+    def revert_changelist(self, changelist):
+        """
+
+        Args:
+            changelist (int)
+
+        Returns:
+            None
+        """
+        if not self.connected():
+            return
+
+        self.run("revert", "-a", "-c", changelist)
+        return
+
+    def edit_changelist_description(self, changelist, description):
+        """ Edit the change list's description.
+
+        Args:
+            changelist (int)
+            description (str)
 
         Returns:
             None
         """
+
         if not self.connected():
             return
 
-        self.run("revert", "-a", path)
-        return
+        data = self.fetch_change(changelist)
+        data["Description"] = description
+
+        self.save_change(data)
+        return
+
+    def submit_changelist(self, changelist):
+        """ Submit the specified changelist
+
+        Args:
+            changelist (int)
+
+        Returns:
+            None
+        """
+        raise NotImplemented
+
+    def get_changelist(self, changelist, metadata_only=True):
+        """ Returns a Changelist object from a change list id.
+
+        Args:
+            changelist (str, int)
+            metadata_only (bool): Leaves out the diffs of the change list's files.
+
+        Returns:
+            ChangeList
+        """
+        result = list()
+
+        if not self.connected():
+            return result
+
+        args = ["describe"]
+
+        if metadata_only:
+            args.append("-s")
+
+        args.append(str(changelist))
+
+        result = self.run(*args)[0]
+        return ChangeList.from_dict(result)
+
+    def get_changelists(self, changelists, metadata_only=True):
+        """ Returns Changelist objects for several change list ids from a single query.
+
+        Args:
+            changelists (list[str, int])
+            metadata_only (bool): Leaves out the diffs of the change lists' files.
+
+        Returns:
+            list[ChangeList]
+        """
+        result = list()
+
+        if not self.connected() or not changelists:
+            return result
+
+        args = ["describe"]
+
+        if metadata_only:
+            args.append("-s")
+
+        args += [str(changelist) for changelist in changelists]
+
+        with ignore_warnings(self):
+            query = self.run(*args)
+
+        return ChangeList.from_rows(query)
+
+    def get_default_files(self):
+        """ Returns a list of DepotFiles with the "default" change list.
+
+        Returns:
+            list[DepotFile]
+        """
+        result = list()
+
+        if not self.connected():
+            return result
+
+        return DepotFile.from_rows(self.run("opened"))
+
+    def workspaces(self):
+        """ Returns a list of workspace strings.
+
+        Returns:
+            list[str]
+        """
+        result = list()
+
+        if not self.connected():
+            return result
+
+        data = self.run("clients", "-u", self.user_name())
+
+        for item in data:
+            workspace = item.get("client")
+
+            if workspace:
+                result.append(workspace)
+
+        return result
+
+    @staticmethod
+    def field_args(fields=None):
+        """ Returns the fstat arguments limiting its output to fields, or no arguments to return every field.
+
+        Args:
+            fields (list[str])
+
+        Returns:
+            list[str]
+        """
+        if not fields:
+            return list()
+
+        fields = list(fields)
+
+        # Results are keyed by depot file path
+        if "depotFile" not in fields:
+            fields.insert(0, "depotFile")
+
+        return ["-T", ",".join(fields)]
+
+    def file_info(self, path, fields=None):
+        """ Returns a dictionary of metadata from a depot file path.
+
+        Args:
+            path (str)
+            fields (list[str]): fstat fields to return, all of them if None.
+
+        Returns:
+            dict
+        """
+        data = dict()
+
+        if not self.connected():
+            return data
+
+        data = self.run("fstat", *(self.field_args(fields) + [path]))[0]
+
+        return data
+
+    def file_log(self, path):
+        """ Returns a dictionary of file log metadata from a depot file path.
+
+        Args:
+            path (str)
+
+        Returns:
+            dict
+        """
+        data = dict()
+
+        if not self.connected():
+            return data
+
+        try:
+            data = _test.run("filelog", path)[0]
+        except:
+            pass
+
+        return data
+
+    def files_info(self, path, fields=None):
+        """ Returns a dictionary of fstat metadata keyed by depot file path from a single query.
+
+        Args:
+            path (str): File spec, e.g. "//depot/shots/*"
+            fields (list[str]): fstat fields to return, all of them if None.
+
+        Returns:
+            dict[str, dict]
+        """
+        result = dict()
+
+        if not self.connected():
+            return result
+
+        with ignore_warnings(self):
+            query = self.cached_run("fstat", *(self.field_args(fields) + [path]))
+
+        for item in query:
+            if isinstance(item, dict) and item.get("depotFile"):
+                result[item["depotFile"]] = item
+
+        return result
+
+    def files_log(self, path, max_revisions=None):
+        """ Returns a dictionary of file log metadata keyed by depot file path from a single query.
+
+        Args:
+            path (str, list[str]): File spec or specs, e.g. "//depot/shots/*"
+            max_revisions (int): Limits the number of revisions returned per file.
+
+        Returns:
+            dict[str, dict]
+        """
+        result = dict()
+
+        if not self.connected():
+            return result
+
+        args = ["filelog"]
+
+        if max_revisions:
+            args += ["-m", str(max_revisions)]
+
+        args += path if isinstance(path, (list, tuple)) else [path]
+
+        with ignore_warnings(self):
+            query = self.cached_run(*args)
+
+        for item in query:
+            if isinstance(item, dict) and item.get("depotFile"):
+                result[item["depotFile"]] = item
+
+        return result
+
+    @staticmethod
+    def history_spec(path, before_rev=None):
+        """ Returns a file spec of the revisions of a file older than a revision, or all of them.
+
+        Args:
+            path (str)
+            before_rev (int)
+
+        Returns:
+            str
+        """
+        if before_rev is None:
+            return path
+
+        return "{}#1,#{}".format(path, max(int(before_rev) - 1, 0))
+
+    def file_history(self, path, limit=HISTORY_PAGE_SIZE, before_rev=None, long_descriptions=False):
+        """ Returns a page of the revisions of a file, newest first.
+
+        Pages are read from the newest revision down, passing the oldest revision of a page as before_rev to get
+        the next one.
+
+        Args:
+            path (str)
+            limit (int): Maximum number of revisions returned, all of them if None.
+            before_rev (int): Only returns revisions older than this one.
+            long_descriptions (bool): Returns descriptions up to 250 characters instead of the first 31.
+
+        Returns:
+            list[dict]: Revision metadata such as "rev", "change", "action", "time", "user", "client" and "desc".
+        """
+        result = list()
+
+        if not self.connected() or (before_rev is not None and int(before_rev) <= 1):
+            return result
+
+        args = ["filelog"]
+
+        if long_descriptions:
+            args.append("-L")
+
+        if limit:
+            args += ["-m", str(limit)]
+
+        args.append(self.history_spec(path, before_rev))
+
+        with ignore_warnings(self):
+            query = self.cached_run(*args)
+
+        log = query[0] if query and isinstance(query[0], dict) else dict()
+        revs = log.get("rev", list())
+
+        # Revision fields are parallel lists, nested lists hold the integrations of each revision
+        fields = [key for key, value in log.items() if isinstance(value, list) and len(value) == len(revs)]
+
+        for i in range(len(revs)):
+            result.append({key: log[key][i] for key in fields})
+
+        return result
+
+    def is_valid_dir(self, path):
+        """ Returns True if the directory is within the client's root.
+
+        Args:
+            path (str)
+
+        Returns:
+            bool
+        """
+        # Fix Path
+        if path.endswith("/..."):
+            pass
+        elif path.endswith("/"):
+            path += "..."
+        elif path.endswith("..."):
+            pass
+        else:
+            path += "/..."
+
+        result = False
+
+        try:
+            result = True if self.run("where", path) else False
+
+        except:
+            pass
+
+        return result
+
+
+class SessionPool(object):
+    """ Thread-safe pool of connected Sessions that share the same port, user, client and cwd.
+
+    Every thread checks out its own connection, so workers, models and menu commands can query the server in
+    parallel without sharing a single P4 connection. Sessions left idle for longer than the idle timeout are
+    disconnected.
+
+    Examples:
+        pool = SessionPool.from_session(session, max_size=4)
+
+        with pool.session() as pooled:
+            files = pooled.depot_files("//depot/shots")
+    """
+
+    MAX_SIZE = 4
+    IDLE_TIMEOUT = 300.0
 
-    def checkout_file(self, path, changelist="default"):
-        """ Checkout a file from its depot path and return its local path.
+    @classmethod
+    def from_session(cls, session, max_size=MAX_SIZE, idle_timeout=IDLE_TIMEOUT):
+        """ Returns a pool with the connection settings and Session class of an existing session.
 
         Args:
-            path (str)
-            changelist (str, int)
+            session (P4)
+            max_size (int)
+            idle_timeout (float)
 
         Returns:
-            str
+            SessionPool
         """
-        if not self.connected():
-            return
+        pool = cls(
+            port=session.port,
+            user=session.user,
+            client=session.client,
+            cwd=session.cwd,
+            password=session.password,
+            max_size=max_size,
+            idle_timeout=idle_timeout,
+            session_class=type(session) if isinstance(session, Session) else Session
+        )
 
-        result = self.run("edit", "-c", changelist, path)[0]
+        for tracer in getattr(session, "tracers", list)():
+            pool.add_tracer(tracer)
 
-        if isinstance(result, str):
-            raise P4Exception(result)
+        if isinstance(session, Session) and session.metadata_cache() is not None:
+            pool.set_metadata_cache(session.metadata_cache(), session.metadata_cache_pool())
 
-        return result.get("clientFile", str())
+        return pool
 
-    def move_to_changelist(self, path, changelist="default"):
-        """ Move the file path to the provided changelist.
+    def __init__(self,
+                 port=None,
+                 user=None,
+                 client=None,
+                 cwd=None,
+                 password=None,
+                 max_size=MAX_SIZE,
+                 idle_timeout=IDLE_TIMEOUT,
+                 session_class=None
+                 ):
 
-        Args:
-            path (str)
-            changelist (str, int)
+        if max_size < 1:
+            raise RuntimeError("Pool size must be at least 1.")
+
+        self._settings = [
+            ("port", port),
+            ("user", user),
+            ("client", client),
+            ("cwd", cwd),
+            ("password", password)
+        ]
+
+        self._max_size = max_size
+        self._idle_timeout = idle_timeout
+        self._idle = list()
+        self._count = 0
+        self._closed = False
+        self._condition = threading.Condition()
+        self._tracers = list()
+        self._cache = None
+        self._cache_pool = None
+        self._session_class = session_class or Session
 
-        Returns:
-            None
-        """
-        if not self.connected():
-            return
+    def __del__(self):
+        self.close()
 
-        self.run("reopen", "-c", changelist, path)
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
         return
 
-    def delete_changelist(self, changelist):
-        """ Deletes the changelist
+    def max_size(self):
+        return self._max_size
 
-        Args:
-            changelist (int)
+    def idle_timeout(self):
+        return self._idle_timeout
+
+    def size(self):
+        """ Returns the number of sessions currently open, idle or in use.
 
         Returns:
-            None
+            int
         """
-        if not self.connected():
-            return
+        with self._condition:
+            return self._count
 
-        self.run("change", "-d", changelist)
-        return
+    def idle_count(self):
+        """ Returns the number of sessions waiting to be checked out.
 
-    def revert_changelist(self, changelist):
+        Returns:
+            int
         """
+        with self._condition:
+            return len(self._idle)
+
+    def add_tracer(self, tracer):
+        """ Reports every command run on the pool's sessions to a tracer, including idle sessions.
 
         Args:
-            changelist (int)
+            tracer (CommandTracer)
 
         Returns:
             None
         """
-        if not self.connected():
-            return
+        with self._condition:
+            if tracer not in self._tracers:
+                self._tracers.append(tracer)
 
-        self.run("revert", "-a", "-c", changelist)
+            for session, released in self._idle:
+                session.add_tracer(tracer)
         return
 
-    def edit_changelist_description(self, changelist, description):
-        """ Edit the change list's description.
+    def set_metadata_cache(self, cache, pool=None):
+        """ Sets the metadata cache the pool's sessions answer depot queries from, including idle sessions.
 
         Args:
-            changelist (int)
-            description (str)
+            cache (MetadataCache)
+            pool (SessionPool): Pool used for background revalidation, each session creates one if None.
 
         Returns:
             None
         """
+        with self._condition:
+            self._cache = cache
+            self._cache_pool = pool
 
-        if not self.connected():
-            return
-
-        data = self.fetch_change(changelist)
-        data["Description"] = description
-
-        self.save_change(data)
+            for session, released in self._idle:
+                session.set_metadata_cache(cache, pool)
         return
 
-    def submit_changelist(self, changelist):
-        """ Submit the specified changelist
+    def _create(self):
+        session = self._session_class()
 
-        Args:
-            changelist (int)
+        for key, value in self._settings:
+            if value:
+                setattr(session, key, value)
 
-        Returns:
-            None
-        """
-        raise NotImplemented
+        for tracer in list(self._tracers):
+            session.add_tracer(tracer)
 
-    def get_changelist(self, changelist):
-        """ Returns a Changelist object from a change list id.
+        if self._cache is not None:
+            session.set_metadata_cache(self._cache, self._cache_pool)
 
-        Args:
-            changelist (str, int)
+        session.connect()
+        return session
+
+    def _take_expired(self):
+        """ Removes idle sessions past the idle timeout. Must be called while holding the lock.
 
         Returns:
-            ChangeList
+            list[Session]
         """
-        result = list()
+        now = time.time()
+        expired = [session for session, released in self._idle if now - released >= self._idle_timeout]
 
-        if not self.connected():
-            return result
+        if expired:
+            self._idle = [(session, released) for session, released in self._idle if session not in expired]
+            self._count -= len(expired)
+            self._condition.notify_all()
 
-        result = self.run("describe", changelist)[0]
-        return ChangeList.from_dict(result)
+        return expired
 
-    def get_default_files(self):
-        """ Returns a list of DepotFiles with the "default" change list.
+    @staticmethod
+    def _disconnect(sessions):
+        for session in sessions:
+            try:
+                if session.connected():
+                    session.disconnect()
+            except P4Exception:
+                pass
+        return
+
+    def reap(self):
+        """ Disconnects the sessions that have been idle for longer than the idle timeout.
 
         Returns:
-            list[DepotFile]
+            int
         """
-        result = list()
-
-        if not self.connected():
-            return result
+        with self._condition:
+            expired = self._take_expired()
 
-        for item in self.run("opened"):
-            file = DepotFile.from_dict(item)
-            result.append(file)
+        self._disconnect(expired)
+        return len(expired)
 
-        return result
+    def acquire(self, timeout=None):
+        """ Returns a connected session, blocking while the pool is at its maximum size.
 
-    def workspaces(self):
-        """ Returns a list of workspace strings.
+        Args:
+            timeout (float): Seconds to wait for a session, or None to wait forever.
 
         Returns:
-            list[str]
+            Session
         """
-        result = list()
+        deadline = None if timeout is None else time.time() + timeout
+        expired = list()
+        session = None
 
-        if not self.connected():
-            return result
+        with self._condition:
+            while True:
+                if self._closed:
+                    raise RuntimeError("Session pool is closed.")
 
-        data = self.run("clients", "-u", self.user_name())
+                expired += self._take_expired()
 
-        for item in data:
-            workspace = item.get("client")
+                # Reuse the most recently released session that is still connected
+                while self._idle and session is None:
+                    candidate = self._idle.pop()[0]
 
-            if workspace:
-                result.append(workspace)
+                    if candidate.connected():
+                        session = candidate
+                    else:
+                        self._count -= 1
 
-        return result
+                if session is not None:
+                    break
 
-    def file_info(self, path):
-        """ Returns a dictionary of metadata from a depot file path.
+                if self._count < self._max_size:
+                    self._count += 1
+                    break
 
-        Args:
-            path (str)
+                remaining = None if deadline is None else deadline - time.time()
 
-        Returns:
-            dict
-        """
-        data = dict()
+                if remaining is not None and remaining <= 0:
+                    raise RuntimeError("Timed out waiting for a session from the pool.")
 
-        if not self.connected():
-            return data
+                self._condition.wait(remaining)
 
-        data = self.run("fstat", path)[0]
+        self._disconnect(expired)
 
-        return data
+        if session is not None:
+            return session
 
-    def file_log(self, path):
-        """ Returns a dictionary of file log metadata from a depot file path.
+        # Connecting can be slow, so it happens outside of the lock
+        try:
+            return self._create()
+        except Exception:
+            with self._condition:
+                self._count -= 1
+                self._condition.notify()
+            raise
+
+    def release(self, session):
+        """ Returns a session to the pool.
 
         Args:
-            path (str)
+            session (Session)
 
         Returns:
-            dict
+            None
         """
-        data = dict()
+        discard = False
 
-        if not self.connected():
-            return data
+        with self._condition:
+            if self._closed or not session.connected():
+                self._count -= 1
+                discard = True
+            else:
+                self._idle.append((session, time.time()))
 
-        try:
-            data = _test.run("filelog", path)[0]
-        except:
-            pass
+            self._condition.notify()
 
-        return data
+        if discard:
+            self._disconnect([session])
 
-    def is_valid_dir(self, path):
-        """ Returns True if the directory is within the client's root.
+        return
+
+    @contextmanager
+    def session(self, timeout=None):
+        """ Context manager that checks out a session and returns it to the pool on exit.
 
         Args:
-            path (str)
+            timeout (float)
 
         Returns:
-            bool
+            Session
         """
-        # Fix Path
-        if path.endswith("/..."):
-            pass
-        elif path.endswith("/"):
-            path += "..."
-        elif path.endswith("..."):
-            pass
-        else:
-            path += "/..."
-
-        result = False
+        session = self.acquire(timeout)
 
         try:
-            result = True if self.run("where", path) else False
+            yield session
+        finally:
+            self.release(session)
 
-        except:
-            pass
+    def close(self):
+        """ Disconnects the idle sessions and refuses further checkouts. Sessions in use are disconnected when
+        they are released.
 
-        return result
+        Returns:
+            None
+        """
+        with self._condition:
+            self._closed = True
+            idle = [session for session, released in self._idle]
+            self._idle = list()
+            self._count -= len(idle)
+            self._condition.notify_all()
+
+        self._disconnect(idle)
+        return
 
 
 class SessionCollectionWorker(QObject):
     """ Class that handles collection of directories, files, or changelists within a QThread.
 
+    When a SessionPool is given, the worker checks out its own connection for the duration of the work, so several
+    workers can run at the same time without touching the caller's session.
+
     Examples:
         def slot(item):
             print(item.to_dict())
@@ -599,7 +2235,8 @@ class SessionCollectionWorker(QObject):
                 session=session,
                 type=SessionCollectWorker.TYPE_FILE,
                 path=path,
-                recursive=True
+                recursive=True,
+                pool=pool
                 )
 
         worker.moveToThread(thread)
@@ -629,12 +2266,14 @@ class SessionCollectionWorker(QObject):
                  path=None,
                  recursive=False,
                  extension_filter=None,
-                 user_filter=None
+                 user_filter=None,
+                 pool=None
                  ):
 
         QObject.__init__(self)
 
         self._session = session
+        self._pool = pool
         self._type = type
         self._path = path
         self._recursive = recursive
@@ -663,22 +2302,41 @@ class SessionCollectionWorker(QObject):
         self.workFailed.connect(targetThread.quit)
         return
 
+    def _results(self, session):
+        """ Yields the results of the worker's type as the server returns them.
+
+        Args:
+            session (Session)
+
+        Returns:
+            generator[DictStruct]
+        """
+        if self._type in [self.TYPE_DIR, self.TYPE_DIR_FILE]:
+            self.statusChanged.emit("Retrieving directories from depot: " + self._path)
+
+            for item in session.iter_depot_dirs(path=self._path, recursive=self._recursive):
+                yield item
+
+        if self._type in [self.TYPE_FILE, self.TYPE_DIR_FILE]:
+            self.statusChanged.emit("Retrieving files from depot: " + self._path)
+
+            for item in session.iter_depot_files(path=self._path,
+                                                 recursive=self._recursive,
+                                                 extension_filter=self._extension_filter):
+                yield item
+
+        if self._type == self.TYPE_CHANGELIST:
+            self.statusChanged.emit("Retrieving pending changelists.")
+
+            for item in session.pending_changelists():
+                yield item
+
     def doWork(self):
         """ Expensive operation that's handled within the QThread.
 
         Returns:
             None
         """
-        # if not self._session:
-        #     self.work_failed.emit()
-        #     self.work_finished.emit()
-        #     return
-
-        if not self._session.connected():
-            self.statusChanged.emit("Session is not connected.")
-            self.workFailed.emit()
-            return
-
         if self._type == self.TYPE_NONE:
             self.statusChanged.emit("Type is None.")
             self.workFailed.emit()
@@ -689,34 +2347,143 @@ class SessionCollectionWorker(QObject):
             self.workFailed.emit()
             return
 
-        total = 0
-        result = list()
+        try:
+            if self._pool is not None:
+                with self._pool.session() as session:
+                    self._collect(session)
+            else:
+                if not self._session or not self._session.connected():
+                    self.statusChanged.emit("Session is not connected.")
+                    self.workFailed.emit()
+                    return
 
-        if self._type in [self.TYPE_DIR, self.TYPE_DIR_FILE]:
-            self.statusChanged.emit("Retrieving directories from depot: " + self._path)
-            dirs = self._session.depot_dirs(path=self._path, recursive=self._recursive)
-            result += dirs
-            total += len(dirs) - 1
+                self._collect(self._session)
 
-        if self._type in [self.TYPE_FILE, self.TYPE_DIR_FILE]:
-            self.statusChanged.emit("Retrieving files from depot: " + self._path)
-            files = self._session.depot_files(path=self._path, recursive=self._recursive, extension_filter=self._extension_filter)
-            result += files
-            total += len(files) - 1
+        except (P4Exception, RuntimeError) as e:
+            self.statusChanged.emit(str(e))
+            self.workFailed.emit()
+            return
 
-        if self._type == self.TYPE_CHANGELIST:
-            self.statusChanged.emit("Retrieving pending changelists.")
-            changelist = self._session.pending_changelists()
-            result = changelist
-            total = len(changelist) - 1
+        self.workFinished.emit()
+        return
 
-        self.progressTotalChanged.emit(total)
+    def _collect(self, session):
+        """ Emits the results from a connected session.
 
-        for i in range(total):
-            self.resultReady.emit(result[i])
-            self.progressChanged.emit(i)
+        Args:
+            session (Session)
+
+        Returns:
+            None
+        """
+        # The total isn't known until the server has finished sending results
+        self.progressTotalChanged.emit(0)
+
+        count = 0
+        results = self._results(session)
+
+        try:
+            for item in results:
+                if QThread.currentThread().isInterruptionRequested():
+                    self.statusChanged.emit("Cancelled.")
+                    break
+
+                self.resultReady.emit(item)
+                count += 1
+                self.progressChanged.emit(count)
+        finally:
+            results.close()
+
+        self.progressTotalChanged.emit(count)
+        self.progressChanged.emit(count)
+        return
+
+
+class SessionCallWorker(QObject):
+    """ Class that calls a function with a connected session within a QThread and emits its result.
+
+    The token is passed back with the result, so the receiver can tell which request it belongs to and drop results
+    that are no longer wanted.
+
+    Examples:
+        def slot(token, result):
+            print(token, result)
+
+        thread = QThread()
+        worker = SessionCallWorker(lambda session: session.depot_dirs(path), token=path, pool=pool)
+
+        worker.moveToThread(thread)
+        worker.connectToThread(thread)
+        worker.resultReady.connect(slot)
+        thread.start()
+    """
+
+    resultReady = Signal(object, object)
+    callFailed = Signal(object, str)
+    workFinished = Signal()
+    workFailed = Signal()
+
+    statusChanged = Signal(str)
+
+    def __init__(self, function, token=None, session=None, pool=None):
+        QObject.__init__(self)
+
+        self._function = function
+        self._token = token
+        self._session = session
+        self._pool = pool
+
+    def token(self):
+        return self._token
+
+    def connectToThread(self, targetThread):
+        """ Convenience method of connecting this worker's signals and slots to a QThread it will be moved to.
+
+        Args:
+            targetThread (QThread)
+
+        Returns:
+            None
+        """
+        targetThread.started.connect(self.doWork)
+        targetThread.finished.connect(self.deleteLater)
+
+        self.workFinished.connect(targetThread.quit)
+        self.workFailed.connect(targetThread.quit)
+        return
+
+    def _fail(self, message):
+        self.statusChanged.emit(message)
+        self.callFailed.emit(self._token, message)
+        self.workFailed.emit()
+        return
+
+    def doWork(self):
+        """ Expensive operation that's handled within the QThread.
+
+        Returns:
+            None
+        """
+        try:
+            if self._pool is not None:
+                with self._pool.session() as session:
+                    result = self._function(session)
+            else:
+                if not self._session or not self._session.connected():
+                    self._fail("Session is not connected.")
+                    return
+
+                result = self._function(self._session)
+
+        except (P4Exception, RuntimeError) as e:
+            self._fail(str(e))
+            return
+
+        if QThread.currentThread().isInterruptionRequested():
+            self._fail("Cancelled.")
+            return
 
-        self._session.disconnect()
+        self.resultReady.emit(self._token, result)
         self.workFinished.emit()
         return
 
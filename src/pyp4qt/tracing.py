@@ -0,0 +1,292 @@
+# Python Modules
+import json
+import time
+import logging
+import threading
+from logging.handlers import RotatingFileHandler
+
+
+class StreamedOutput(list):
+    """ Output of a command streamed through a handler, counted as the records arrive.
+
+    The records themselves are only kept when a tracer asks for them, so tracing a streamed listing doesn't hold it
+    in memory.
+    """
+
+    def __init__(self):
+        list.__init__(self)
+
+        self.rows = 0
+        self.size = 0
+
+
+class CommandStats(object):
+    """ Running totals and a latency histogram for a single P4 command.
+    """
+
+    # Upper bounds in seconds of the latency histogram's buckets, the last bucket holds everything slower
+    BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+    def __init__(self, command):
+        self.command = command
+        self.count = 0
+        self.errors = 0
+        self.total_time = 0.0
+        self.min_time = None
+        self.max_time = 0.0
+        self.rows = 0
+        self.size = 0
+        self.histogram = [0] * (len(CommandStats.BUCKETS) + 1)
+
+    def add(self, elapsed, rows, size, error=False):
+        """ Adds a call to the totals.
+
+        Args:
+            elapsed (float): Wall time in seconds.
+            rows (int)
+            size (int): Approximate payload size in bytes.
+            error (bool)
+
+        Returns:
+            None
+        """
+        self.count += 1
+        self.errors += 1 if error else 0
+        self.total_time += elapsed
+        self.min_time = elapsed if self.min_time is None else min(self.min_time, elapsed)
+        self.max_time = max(self.max_time, elapsed)
+        self.rows += rows
+        self.size += size
+
+        for i, bound in enumerate(CommandStats.BUCKETS):
+            if elapsed <= bound:
+                self.histogram[i] += 1
+                break
+        else:
+            self.histogram[-1] += 1
+
+        return
+
+    def mean_time(self):
+        return self.total_time / self.count if self.count else 0.0
+
+    def to_dict(self):
+        """ Returns a dictionary of the totals.
+
+        Returns:
+            dict
+        """
+        return {
+            "command": self.command,
+            "count": self.count,
+            "errors": self.errors,
+            "totalTime": self.total_time,
+            "meanTime": self.mean_time(),
+            "minTime": self.min_time or 0.0,
+            "maxTime": self.max_time,
+            "rows": self.rows,
+            "size": self.size,
+            "histogram": list(zip(list(CommandStats.BUCKETS) + [None], self.histogram))
+        }
+
+
+class CommandTracer(object):
+    """ Opt-in instrumentation of the commands a Session sends to the server.
+
+    Every command run through a Session the tracer is added to is recorded with its name, argument count, wall time,
+    number of result rows and approximate payload size. Totals and latency histograms are kept in memory per
+    command, and each call can also be written as a line of JSON to a rotating trace file. A tracer can be shared by
+    several sessions and threads.
+
+    Examples:
+        tracer = CommandTracer("/tmp/p4_trace.jsonl")
+        session.add_tracer(tracer)
+
+        ...
+
+        print(tracer.summary())
+    """
+
+    MAX_BYTES = 10 * 1024 * 1024
+    BACKUP_COUNT = 3
+
+    # Only the number and size of the rows are recorded, streamed records don't need to be kept
+    KEEP_OUTPUT = False
+
+    @staticmethod
+    def payload_size(result):
+        """ Returns the approximate size in bytes of a command's result.
+
+        Args:
+            result (list)
+
+        Returns:
+            int
+        """
+        size = 0
+
+        for item in result or list():
+            if isinstance(item, dict):
+                for key, value in item.items():
+                    size += len(key)
+
+                    if isinstance(value, (list, tuple)):
+                        size += sum(len(str(v)) for v in value)
+                    else:
+                        size += len(str(value))
+            else:
+                size += len(str(item))
+
+        return size
+
+    def __init__(self, path=None, max_bytes=MAX_BYTES, backup_count=BACKUP_COUNT):
+        self._path = path
+        self._lock = threading.Lock()
+        self._stats = dict()
+        self._logger = None
+        self._handler = None
+
+        if path:
+            self._handler = RotatingFileHandler(path, maxBytes=max_bytes, backupCount=backup_count)
+            self._handler.setFormatter(logging.Formatter("%(message)s"))
+
+            self._logger = logging.getLogger("pyp4qt.tracing.{}".format(id(self)))
+            self._logger.propagate = False
+            self._logger.setLevel(logging.INFO)
+            self._logger.addHandler(self._handler)
+
+    def __del__(self):
+        self.close()
+
+    def path(self):
+        return self._path
+
+    def trace(self, session, args, result, elapsed, error=None):
+        """ Records a command that ran on a session.
+
+        Args:
+            session (P4)
+            args (list): Command and arguments as passed to run().
+            result (list)
+            elapsed (float): Wall time in seconds.
+            error (Exception): The exception raised by the command, if any.
+
+        Returns:
+            None
+        """
+        args = self._flatten(args)
+        command = str(args[0]) if args else str()
+        if isinstance(result, StreamedOutput):
+            rows, size = result.rows, result.size
+        else:
+            rows = len(result) if result else 0
+            size = self.payload_size(result)
+
+        with self._lock:
+            stats = self._stats.get(command)
+
+            if stats is None:
+                stats = self._stats[command] = CommandStats(command)
+
+            stats.add(elapsed, rows, size, error is not None)
+
+        if self._logger is not None:
+            self._logger.info(json.dumps({
+                "time": time.time(),
+                "port": getattr(session, "port", None),
+                "command": command,
+                "args": len(args) - 1,
+                "elapsed": elapsed,
+                "rows": rows,
+                "size": size,
+                "error": str(error) if error is not None else None
+            }))
+        return
+
+    @staticmethod
+    def _flatten(args):
+        result = list()
+
+        for arg in args:
+            if isinstance(arg, (list, tuple)):
+                result += CommandTracer._flatten(arg)
+            else:
+                result.append(arg)
+
+        return result
+
+    def stats(self):
+        """ Returns the totals of every recorded command keyed by command name.
+
+        Returns:
+            dict[str, dict]
+        """
+        with self._lock:
+            return {command: stats.to_dict() for command, stats in self._stats.items()}
+
+    def top_commands(self, key="totalTime", limit=10):
+        """ Returns the totals of the commands with the highest value of a key, such as "totalTime" or "count".
+
+        Args:
+            key (str)
+            limit (int)
+
+        Returns:
+            list[dict]
+        """
+        result = sorted(self.stats().values(), key=lambda stats: stats[key], reverse=True)
+        return result[:limit]
+
+    def summary(self, limit=10):
+        """ Returns a readable summary of the top commands by total time and by call count.
+
+        Args:
+            limit (int)
+
+        Returns:
+            str
+        """
+        lines = list()
+        line = "{:<16} {:>8} {:>10} {:>10} {:>10} {:>10} {:>12}"
+
+        for title, key in [("By total time", "totalTime"), ("By call count", "count")]:
+            lines.append(title)
+            lines.append(line.format("command", "calls", "total s", "mean ms", "max ms", "rows", "bytes"))
+
+            for stats in self.top_commands(key, limit):
+                lines.append(line.format(
+                    stats["command"],
+                    stats["count"],
+                    "{:.3f}".format(stats["totalTime"]),
+                    "{:.1f}".format(stats["meanTime"] * 1000.0),
+                    "{:.1f}".format(stats["maxTime"] * 1000.0),
+                    stats["rows"],
+                    stats["size"]
+                ))
+
+            lines.append(str())
+
+        return "\n".join(lines)
+
+    def reset(self):
+        """ Clears the recorded totals.
+
+        Returns:
+            None
+        """
+        with self._lock:
+            self._stats = dict()
+        return
+
+    def close(self):
+        """ Closes the trace file.
+
+        Returns:
+            None
+        """
+        if self._handler is not None:
+            self._logger.removeHandler(self._handler)
+            self._handler.close()
+            self._handler = None
+            self._logger = None
+        return
@@ -0,0 +1,328 @@
+# Python Modules
+import time
+from P4 import P4, P4Exception, OutputHandler, Progress
+
+# Project Modules
+from pyp4qt.session import ignore_warnings
+
+# Qt Modules
+from PySide2.QtCore import QObject, Signal, QThread
+
+
+# Defaults of "submit --parallel", changes with fewer files than SUBMIT_MIN_FILES are sent on one thread
+SUBMIT_THREADS = 4
+SUBMIT_BATCH = 8
+SUBMIT_MIN_FILES = 9
+
+
+def parallel_option(threads, batch=None, batch_size=None, min_files=None, min_size=None):
+    """ Returns the "--parallel" option of a sync or submit, or None to transfer files on a single thread.
+
+    Args:
+        threads (int): Number of threads transferring files.
+        batch (int): Number of files sent per batch.
+        batch_size (int): Number of bytes sent per batch.
+        min_files (int): Minimum number of files for the transfer to run in parallel.
+        min_size (int): Minimum number of bytes for the transfer to run in parallel.
+
+    Returns:
+        str
+    """
+    if not threads or threads < 2:
+        return None
+
+    values = [("threads", threads), ("batch", batch), ("batchsize", batch_size), ("min", min_files),
+              ("minsize", min_size)]
+
+    return "--parallel=" + ",".join("{}={}".format(key, int(value)) for key, value in values if value)
+
+
+class TransferStats(object):
+    """ Totals of a file transfer, used to report its throughput once it finishes.
+    """
+
+    def __init__(self):
+        self.files = 0
+        self.bytes = 0
+        self.total_files = 0
+        self.total_bytes = 0
+        self.elapsed = 0.0
+        self.cancelled = False
+        self.errors = list()
+
+    def __str__(self):
+        return "{} {} of {} files ({:.1f} MB) in {:.1f}s, {:.1f} files/s, {:.2f} MB/s".format(
+            "Cancelled after" if self.cancelled else "Transferred",
+            self.files,
+            self.total_files or self.files,
+            self.bytes / 1048576.0,
+            self.elapsed,
+            self.files_per_second(),
+            self.bytes_per_second() / 1048576.0
+        )
+
+    def files_per_second(self):
+        return self.files / self.elapsed if self.elapsed > 0 else 0.0
+
+    def bytes_per_second(self):
+        return self.bytes / self.elapsed if self.elapsed > 0 else 0.0
+
+    def to_dict(self):
+        """ Returns a dictionary of the totals.
+
+        Returns:
+            dict
+        """
+        return {
+            "files": self.files,
+            "bytes": self.bytes,
+            "totalFiles": self.total_files,
+            "totalBytes": self.total_bytes,
+            "elapsed": self.elapsed,
+            "filesPerSecond": self.files_per_second(),
+            "bytesPerSecond": self.bytes_per_second(),
+            "cancelled": self.cancelled,
+            "errors": list(self.errors)
+        }
+
+
+class TransferHandler(OutputHandler, Progress):
+    """ Output handler and progress callback that counts the files and bytes of a transfer as the server reports them.
+
+    The first record of a sync carries the totals of the whole transfer, every following record is a file. The
+    transfer can be cancelled from another thread, the server stops it at the next record.
+    """
+
+    def __init__(self, on_total=None, on_file=None, on_progress=None):
+        OutputHandler.__init__(self)
+        Progress.__init__(self)
+
+        self.stats = TransferStats()
+
+        self._on_total = on_total
+        self._on_file = on_file
+        self._on_progress = on_progress
+        self._cancelled = False
+        self._total = 0
+
+    def cancel(self):
+        self._cancelled = True
+        return
+
+    def setCancel(self, val):
+        self._cancelled = bool(val)
+        return
+
+    def is_cancelled(self):
+        return self._cancelled
+
+    def _status(self):
+        if self._cancelled:
+            self.stats.cancelled = True
+            return OutputHandler.REPORT | OutputHandler.CANCEL
+
+        return OutputHandler.HANDLED
+
+    def outputStat(self, stat):
+        if "totalFileCount" in stat:
+            self.stats.total_files = int(stat.get("totalFileCount", 0))
+            self.stats.total_bytes = int(stat.get("totalFileSize", 0))
+
+            if self._on_total:
+                self._on_total(self.stats.total_files, self.stats.total_bytes)
+
+        if stat.get("depotFile"):
+            self.stats.files += 1
+            self.stats.bytes += int(stat.get("fileSize", 0) or 0)
+
+            if self._on_file:
+                self._on_file(stat)
+
+        return self._status()
+
+    def outputInfo(self, info):
+        return self._status()
+
+    def outputMessage(self, message):
+        # Warnings such as "file(s) up-to-date." aren't failures
+        if getattr(message, "severity", P4.E_FAILED) >= P4.E_FAILED:
+            self.stats.errors.append(str(message))
+
+        return self._status()
+
+    def setTotal(self, total):
+        self._total = total
+        return
+
+    def update(self, position):
+        if self._on_progress:
+            self._on_progress(position, self._total)
+        return
+
+
+class SyncWorker(QObject):
+    """ Class that syncs a workspace within a QThread using parallel transfers, reporting progress as it goes.
+
+    Files are transferred by several threads on the server connection with "sync --parallel". Progress is emitted at
+    most every PROGRESS_INTERVAL seconds, so syncing hundreds of thousands of files doesn't flood the GUI thread.
+
+    Examples:
+        thread = QThread()
+        worker = SyncWorker(["//my_client/shots/..."], threads=8, pool=pool)
+
+        worker.moveToThread(thread)
+        worker.connectToThread(thread)
+        worker.syncFinished.connect(lambda stats: print(stats))
+        thread.start()
+    """
+
+    THREADS = 4
+    BATCH = 8
+    PROGRESS_INTERVAL = 0.1
+
+    totalChanged = Signal(int, int)
+    progressChanged = Signal(int, int)
+    fileProgressChanged = Signal(int, int)
+    syncFinished = Signal(object)
+    workFinished = Signal()
+    workFailed = Signal()
+
+    statusChanged = Signal(str)
+
+    def __init__(self, paths=None, force=False, threads=THREADS, batch=BATCH, session=None, pool=None):
+        QObject.__init__(self)
+
+        self._paths = list(paths or ["..."])
+        self._force = force
+        self._threads = threads
+        self._batch = batch
+        self._session = session
+        self._pool = pool
+        self._last_progress = 0.0
+
+        self._handler = TransferHandler(self._on_total, self._on_file, self._on_progress)
+
+    def stats(self):
+        """ Returns the totals of the sync so far.
+
+        Returns:
+            TransferStats
+        """
+        return self._handler.stats
+
+    def cancel(self):
+        """ Stops the sync at the next file. Can be called from any thread.
+
+        Returns:
+            None
+        """
+        self._handler.cancel()
+        return
+
+    def setCancel(self, val):
+        # Same interface as OutputProgress so progress dialogs can cancel the sync
+        self._handler.setCancel(val)
+        return
+
+    def args(self):
+        """ Returns the sync command and arguments.
+
+        Returns:
+            list[str]
+        """
+        args = ["sync"]
+
+        if self._force:
+            args.append("-f")
+
+        parallel = parallel_option(self._threads, self._batch)
+
+        if parallel:
+            args.append(parallel)
+
+        return args + self._paths
+
+    def connectToThread(self, targetThread):
+        """ Convenience method of connecting this worker's signals and slots to a QThread it will be moved to.
+
+        Args:
+            targetThread (QThread)
+
+        Returns:
+            None
+        """
+        targetThread.started.connect(self.doWork)
+        targetThread.finished.connect(self.deleteLater)
+
+        self.workFinished.connect(targetThread.quit)
+        self.workFailed.connect(targetThread.quit)
+        return
+
+    def _on_total(self, files, size):
+        self.totalChanged.emit(files, size)
+        return
+
+    def _on_file(self, stat):
+        now = time.time()
+
+        if now - self._last_progress >= self.PROGRESS_INTERVAL:
+            self._last_progress = now
+            self.progressChanged.emit(self._handler.stats.files, self._handler.stats.total_files)
+
+        if QThread.currentThread().isInterruptionRequested():
+            self._handler.cancel()
+        return
+
+    def _on_progress(self, position, total):
+        self.fileProgressChanged.emit(position, total)
+        return
+
+    def _sync(self, session):
+        progress = session.progress
+        session.progress = self._handler
+
+        try:
+            with ignore_warnings(session):
+                session.run(*self.args(), handler=self._handler)
+        finally:
+            session.progress = progress
+
+        return
+
+    def doWork(self):
+        """ Expensive operation that's handled within the QThread.
+
+        Returns:
+            None
+        """
+        stats = self._handler.stats
+        start = time.perf_counter()
+        self.statusChanged.emit("Syncing {}...".format(", ".join(self._paths)))
+
+        try:
+            if self._pool is not None:
+                with self._pool.session() as session:
+                    self._sync(session)
+            else:
+                if not self._session or not self._session.connected():
+                    raise RuntimeError("Session is not connected.")
+
+                self._sync(self._session)
+
+        except (P4Exception, RuntimeError) as e:
+            # Cancelling stops the command with an error on some servers
+            if not self._handler.is_cancelled():
+                stats.elapsed = time.perf_counter() - start
+                stats.errors.append(str(e))
+                self.statusChanged.emit(str(e))
+                self.workFailed.emit()
+                return
+
+        stats.elapsed = time.perf_counter() - start
+        stats.cancelled = stats.cancelled or self._handler.is_cancelled()
+
+        self.progressChanged.emit(stats.files, stats.total_files)
+        self.statusChanged.emit(str(stats))
+        self.syncFinished.emit(stats)
+        self.workFinished.emit()
+        return
@@ -2,6 +2,9 @@
 from pyp4qt.qt import PerforceMenu as PerforceMenu
 from pyp4qt.qt.ErrorMessageWindow import displayErrorUI
 from pyp4qt import globals
+from pyp4qt.session import Session
+from pyp4qt.bulk import normalize_path, run_bulk
+from pyp4qt.transfer import parallel_option, SUBMIT_THREADS, SUBMIT_BATCH, SUBMIT_MIN_FILES
 
 # Python Modules
 import os
@@ -163,6 +166,9 @@ def session_info(session):
     """
     result = dict()
 
+    if isinstance(session, Session):
+        return session.info()
+
     if session.connected():
         info = session.run("info")
 
@@ -195,7 +201,7 @@ def is_path_in_client_root(session, path):
         bool
     """
     if session.connected():
-        client_root = session.run("info")[0].get("client_root", "")
+        client_root = session_info(session).get("client_root", "")
         # print(root, path)
         # print(os.path.commonpath([root, path]) == root)
 
@@ -324,51 +330,78 @@ def query_changelists(p4, status=None):
         raise e
 
 
-def submit_change(p4, files, description, callback, keepCheckedOut=False):
-    # Shitty method #1
+def submit_change(p4, files, description, callback, keepCheckedOut=False,
+                  threads=SUBMIT_THREADS, batch=SUBMIT_BATCH, minFiles=SUBMIT_MIN_FILES, minSize=None):
     logger().info("Files Passed for submission = {0}".format(files))
 
-    print("Opened ", p4.run_opened("..."))
-
+    # One query for every opened file, the selection is matched against both the client and depot paths
     fullChangelist = p4.run_opened("-u", p4.user, "-C", p4.client, "...")
 
     if not fullChangelist:
         raise P4Exception("File changelist is empty")
 
+    selected = set(normalize_path(path) for path in files)
+    openedPaths = set()
     fileList = []
-    opened = [p4.run_opened("-u", p4.user, "-C", p4.client, file)[0] for file in files]
+    fileChanges = {}
 
-    changeFiles = [entry['clientFile'] for entry in opened]  # change._files
+    for entry in fullChangelist:
+        paths = set(normalize_path(entry[key]) for key in ("clientFile", "depotFile") if entry.get(key))
+        openedPaths |= paths
 
-    logger().info("Changelist = {0}".format(changeFiles))
+        if paths & selected:
+            fileList.append(entry['depotFile'])
+            fileChanges[entry['depotFile']] = entry.get('change', "default")
 
-    for changeFile in changeFiles:
-        if changeFile in files:
-            fileList.append(changeFile)
-        else:
-            logger().warning(
-                "File {0} ({1}) not in changelist".format(changeFile, p4.run_opened(changeFile)[0]['action']))
+    for path in files:
+        if normalize_path(path) not in openedPaths:
+            logger().warning("File {0} not in changelist".format(path))
+
+    if not fileList:
+        raise P4Exception("None of the selected files are opened")
 
     logger().info("Final changelist files = {0}".format(fileList))
 
-    logger().debug([x['clientFile'] for x in fullChangelist])
-    logger().debug([x['clientFile'] for x in opened])
+    # Submit the selection as its own change, the user's other opened files stay where they are
+    result = p4.save_change({"Change": "new", "Description": description})
+    m = re.match("Change ([1-9][0-9]*) created.", result[0])
+
+    if not m:
+        raise P4Exception("Unable to create a changelist: {0}".format(result[0]))
+
+    changeId = m.group(1)
+
+    report = run_bulk(p4, "reopen", fileList, ["-c", changeId])
+    if not report.complete():
+        # Put the files that were moved back in their change lists rather than leave a partial change behind
+        moved = {}
+        for path in report.files("depotFile"):
+            moved.setdefault(fileChanges.get(path, "default"), []).append(path)
+
+        for change, paths in moved.items():
+            logger().info(run_bulk(p4, "reopen", paths, ["-c", change]))
+
+        logger().info(p4.run_change("-d", changeId))
+        raise report.exception()
+
+    # Send the files on several threads, large binary changes are limited by a single stream otherwise
+    submitArgs = ["-c", changeId]
 
-    notSubmitted = list(set([x['clientFile'] for x in fullChangelist]) - set([x['clientFile'] for x in opened]))
+    if keepCheckedOut:
+        submitArgs.append("-r")
 
-    if notSubmitted:
-        p4.run_revert("-k", notSubmitted)
+    parallel = parallel_option(threads, batch, min_files=minFiles, min_size=minSize)
+    if parallel:
+        submitArgs.append(parallel)
 
     try:
         p4.progress = callback
         p4.handler = callback
 
-        if keepCheckedOut:
-            result = p4.run_submit("-r", "-d", description, progress=callback, handler=callback)
-        else:
-            result = p4.run_submit("-d", description, progress=callback, handler=callback)
+        result = p4.run_submit(*submitArgs, progress=callback, handler=callback)
         logger().info(result)
     except P4Exception as e:
+        # The files stay in the numbered change so the submit can be retried
         logger().warning(e)
         raise e
 
@@ -392,56 +425,151 @@ def submit_change(p4, files, description, callback, keepCheckedOut=False):
     #     raise e
 
 
-def sync_previous_revision(p4, file, revision, description):
-    logger().info(p4.run_sync("-f", "{0}#{1}".format(file, revision)))
+# First server release with "p4 undo", older servers roll back with edit, sync and resolve
+UNDO_SERVER_VERSION = (2016, 2)
 
-    change = p4.fetch_change()
-    change._description = description
 
-    result = p4.save_change(change)
-    r = re.compile("Change ([1-9][0-9]*) created.")
-    m = r.match(result[0])
-    changeId = "0"
-    if m:
-        changeId = m.group(1)
+def rollback_target(target):
+    """ Returns the revision specifier of a rollback target.
 
-    # Terrible exception handling but I need all the info I can for this to be artist proof
-    try:
-        errors = []
+    Args:
+        target (str, int): A revision "#3", a changelist 1234 or "@1234", or a date "2024/01/31" or "@2024/01/31"
 
-        # Try to remove from changelist if we have it checked out
-        try:
-            logger().info(p4.run_revert("-k", file))
-        except P4Exception as e:
-            errors.append(e)
+    Returns:
+        str
+    """
+    target = str(target).strip()
 
-        try:
-            logger().info(p4.run_edit("-c", changeId, file))
-        except P4Exception as e:
-            errors.append(e)
+    if target.startswith("#") or target.startswith("@"):
+        return target
 
-        try:
-            logger().info(p4.run_sync("-f", file))
-        except P4Exception as e:
-            errors.append(e)
+    return "@" + target
 
-        try:
-            logger().info(p4.run_resolve("-ay"))
-        except P4Exception as e:
-            errors.append(e)
 
-        try:
-            change = p4.fetch_change(changeId)
-        except P4Exception as e:
-            errors.append(e)
+def server_supports_undo(p4):
+    """ Returns True if the server has the undo command.
 
-        try:
-            logger().info(p4.run_submit(change))
-        except P4Exception as e:
-            errors.append(e)
+    Args:
+        p4 (P4)
+
+    Returns:
+        bool
+    """
+    # e.g. "P4D/LINUX26X86_64/2019.1/1797168 (2019/05/21)"
+    version = p4.run_info()[0].get("serverVersion", "")
+    m = re.search(r"/(\d{4})\.(\d+)/", version)
+
+    if not m:
+        return False
+
+    return (int(m.group(1)), int(m.group(2))) >= UNDO_SERVER_VERSION
 
-        if errors:
-            raise tuple(errors)
+
+def opened_files(p4, files):
+    """ Returns the depot paths of the files opened in the client, from one query over every file.
+
+    Args:
+        p4 (P4)
+        files (list[str]): Local, client or depot paths, folders can be given as "//depot/shots/..."
+
+    Returns:
+        list[str]
+    """
+    return run_bulk(p4, "opened", files).files("depotFile")
+
+
+def rollback_files(p4, files, target, description, submit=True, revertOpened=False):
+    """ Rolls many files back to a revision, changelist or date in a single changelist.
+
+    The server undoes the newer revisions with "p4 undo" when it supports it and the target is a revision or a
+    changelist. Otherwise the files are synced to the target, opened for edit, synced to head and resolved keeping
+    the target content, each step being one command over every file rather than one per file.
+
+    Args:
+        p4 (P4)
+        files (list[str]): Local, client or depot paths, folders can be given as "//depot/shots/..."
+        target (str, int): See rollback_target
+        description (str)
+        submit (bool): Leave the changelist pending if False
+        revertOpened (bool): Takes files the client has opened out of their change lists, keeping their local
+            content only until it's overwritten by the rollback. Raises if files are opened and this is False.
+
+    Returns:
+        int: The changelist number
+    """
+    target = rollback_target(target)
+    paths = list(files)
+
+    if not paths:
+        raise P4Exception("No files to roll back")
+
+    # Files opened elsewhere would fail to open in the rollback change, and their edits would be overwritten
+    opened = opened_files(p4, paths)
+
+    if opened and not revertOpened:
+        raise P4Exception("Files are opened and would lose their changes:\n{0}".format("\n".join(opened)))
+
+    # The revisions the client has, to put the files back if the rollback fails part way
+    have = ["{0}#{1}".format(item["depotFile"], item["haveRev"])
+            for item in run_bulk(p4, "have", paths).results() if item.get("haveRev")]
+
+    result = p4.save_change({"Change": "new", "Description": description})
+    m = re.match("Change ([1-9][0-9]*) created.", result[0])
+
+    if not m:
+        raise P4Exception("Unable to create a changelist: {0}".format(result[0]))
+
+    changeId = m.group(1)
+
+    if opened:
+        logger().info(run_bulk(p4, "revert", opened, ["-k"]))
+
+    def run(command, specs, args=None):
+        report = run_bulk(p4, command, specs, args)
+        logger().info(report)
+
+        if not report.succeeded():
+            raise report.exception()
+
+        return report
+
+    # Undo everything newer than the target, dates can't be offset so they roll back with resolve
+    number = target[1:]
+    try:
+        if number.isdigit() and server_supports_undo(p4):
+            if target.startswith("#"):
+                newer = "#{0},#head".format(int(number) + 1)
+            else:
+                newer = "@{0},@now".format(int(number) + 1)
+
+            opened = run("undo", [path + newer for path in paths], ["-c", changeId])
+        else:
+            run("sync", [path + target for path in paths], ["-f"])
+            opened = run("edit", paths, ["-c", changeId])
+            run("sync", paths)
+            run("resolve", paths, ["-ay"])
+    except P4Exception:
+        # Nothing is left opened or pending, and the files are back at the revisions the client had. The clean up
+        # doesn't raise so the error of the failed step is the one reported.
+        logger().info(run_bulk(p4, "revert", paths, ["-k", "-c", changeId]))
+        logger().info(run_bulk(p4, "change", [changeId], ["-d"]))
+        logger().info(run_bulk(p4, "sync", have, ["-f"]))
+        raise
+
+    if not opened.results():
+        p4.run_change("-d", changeId)
+        raise P4Exception("Files are already at {0}".format(target))
+
+    if submit:
+        logger().info(p4.run_submit("-c", changeId))
+
+    return int(changeId)
+
+
+def sync_previous_revision(p4, file, revision, description, revertOpened=False):
+    # Terrible exception handling but I need all the info I can for this to be artist proof
+    try:
+        rollback_files(p4, [file], "#{0}".format(revision), description, revertOpened=revertOpened)
     except P4Exception as e:
         displayErrorUI(e)
         return False
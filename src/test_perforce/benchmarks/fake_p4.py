@@ -0,0 +1,823 @@
+# Python Modules
+import math
+import time
+import fnmatch
+from P4 import P4, P4Exception, OutputHandler
+
+# Project Modules
+from pyp4qt.session import Session, PrivateAttributes
+
+
+class SyntheticDepot(object):
+    """ Deterministic depot of configurable shape that's generated on demand rather than held in memory.
+
+    Files live in leaf directories of a tree with a fixed fan-out, named "//depot/d3/d0/d7/file00042.ma". Every file
+    has the same number of revisions, and revision r of file i was submitted in change (r - 1) * files + i + 1, so
+    the newest submitted change is revisions * files. Pending change lists are numbered after that and the first
+    opened files are spread across them and the default change list.
+
+    Examples:
+        depot = SyntheticDepot(files=100000, fan_out=10, files_per_dir=100)
+        FakeP4.register("fake:1666", depot)
+    """
+
+    EXTENSIONS = (".ma", ".mb", ".nk", ".exr", ".png")
+
+    def __init__(self,
+                 files=1000,
+                 fan_out=10,
+                 files_per_dir=100,
+                 revisions=3,
+                 pending_changelists=10,
+                 opened_files=100,
+                 name="depot",
+                 user="artist",
+                 client="artist_ws",
+                 root="/tmp/artist_ws"
+                 ):
+
+        if files < 1 or fan_out < 2 or files_per_dir < 1 or revisions < 1:
+            raise RuntimeError("Invalid depot shape.")
+
+        self.files = files
+        self.fan_out = fan_out
+        self.files_per_dir = files_per_dir
+        self.revisions = revisions
+        self.name = name
+        self.user = user
+        self.client = client
+        self.root = root
+
+        self.leaf_count = int(math.ceil(files / float(files_per_dir)))
+        self.depth = max(1, int(math.ceil(math.log(self.leaf_count) / math.log(fan_out) - 1e-9)))
+        self.latest_change = revisions * files
+
+        self.pending = [self.latest_change + i + 1 for i in range(pending_changelists)]
+        self.opened_files = min(opened_files, files)
+
+    # Paths
+
+    def root_path(self):
+        return "//" + self.name
+
+    def dir_path(self, prefix):
+        return self.root_path() + "".join("/d{}".format(digit) for digit in prefix)
+
+    def leaf_prefix(self, leaf):
+        digits = list()
+
+        for i in range(self.depth):
+            digits.append(leaf % self.fan_out)
+            leaf //= self.fan_out
+
+        return tuple(reversed(digits))
+
+    def leaf_range(self, prefix):
+        """ Returns the first and last + 1 leaf indices under a directory prefix.
+
+        Args:
+            prefix (tuple[int])
+
+        Returns:
+            tuple(int, int)
+        """
+        span = self.fan_out ** (self.depth - len(prefix))
+        value = 0
+
+        for digit in prefix:
+            value = value * self.fan_out + digit
+
+        return value * span, min((value + 1) * span, self.leaf_count)
+
+    def dir_exists(self, prefix):
+        if len(prefix) > self.depth or any(digit >= self.fan_out for digit in prefix):
+            return False
+
+        first, last = self.leaf_range(prefix)
+        return first < last
+
+    def subdirs(self, prefix):
+        if len(prefix) >= self.depth:
+            return list()
+
+        return [prefix + (digit,) for digit in range(self.fan_out) if self.dir_exists(prefix + (digit,))]
+
+    def leaf_file_count(self, leaf):
+        if leaf == self.leaf_count - 1:
+            return self.files - leaf * self.files_per_dir
+
+        return self.files_per_dir
+
+    def file_name(self, index):
+        j = index % self.files_per_dir
+        return "file{:05d}{}".format(j, self.EXTENSIONS[j % len(self.EXTENSIONS)])
+
+    def file_path(self, index):
+        leaf = index // self.files_per_dir
+        return self.dir_path(self.leaf_prefix(leaf)) + "/" + self.file_name(index)
+
+    def client_path(self, index):
+        return self.root + self.file_path(index)[len(self.root_path()):]
+
+    def parse(self, spec):
+        """ Returns the directory prefix, the kind of match and the file name or extension of a file spec.
+
+        The kind is "file" for a single file, "dir" for the files directly within a directory and "recursive" for
+        every file below it. Revision specifiers are ignored and relative specs are resolved from the client root.
+
+        Args:
+            spec (str)
+
+        Returns:
+            tuple(tuple[int], str, str)
+        """
+        spec = spec.split("#")[0].split("@")[0]
+
+        if spec.startswith(self.client_root()):
+            spec = self.root_path() + spec[len(self.root):]
+
+        # Relative specs are resolved from the client root
+        elif not spec.startswith("//"):
+            spec = self.root_path() + "/" + spec
+
+        if not spec.startswith(self.root_path()):
+            return None
+
+        parts = spec[len(self.root_path()):].split("/")[1:]
+
+        if not parts:
+            return tuple(), "dir", str()
+
+        last = parts[-1]
+
+        if last.startswith("..."):
+            kind, pattern = "recursive", last[3:]
+        elif last.startswith("*"):
+            kind, pattern = "dir", last[1:]
+        else:
+            kind, pattern = "file", last
+
+        prefix = list()
+
+        for part in parts[:-1]:
+            if not part.startswith("d") or not part[1:].isdigit():
+                return None
+
+            prefix.append(int(part[1:]))
+
+        return tuple(prefix), kind, pattern
+
+    def client_root(self):
+        return self.root.replace("\\", "/")
+
+    def match(self, spec):
+        """ Yields the indices of the files matching a file spec.
+
+        Args:
+            spec (str)
+
+        Returns:
+            generator[int]
+        """
+        parsed = self.parse(spec)
+
+        if parsed is None:
+            return
+
+        prefix, kind, pattern = parsed
+
+        if kind == "file":
+            if len(prefix) != self.depth or not self.dir_exists(prefix):
+                return
+
+            leaf = self.leaf_range(prefix)[0]
+
+            for j in range(self.leaf_file_count(leaf)):
+                index = leaf * self.files_per_dir + j
+
+                if self.file_name(index) == pattern:
+                    yield index
+            return
+
+        if kind == "dir" and len(prefix) != self.depth:
+            return
+
+        if not self.dir_exists(prefix):
+            return
+
+        first, last = self.leaf_range(prefix)
+
+        for leaf in range(first, last):
+            for j in range(self.leaf_file_count(leaf)):
+                index = leaf * self.files_per_dir + j
+
+                if not pattern or self.file_name(index).endswith(pattern):
+                    yield index
+
+    # Changes
+
+    def change(self, index, rev):
+        return (rev - 1) * self.files + index + 1
+
+    def change_file(self, change):
+        return (change - 1) % self.files, (change - 1) // self.files + 1
+
+    def opened_change(self, index):
+        """ Returns the pending change number a file is opened in, "default", or None if it isn't opened.
+
+        Args:
+            index (int)
+
+        Returns:
+            str
+        """
+        if index >= self.opened_files:
+            return None
+
+        slot = index % (len(self.pending) + 1)
+
+        if slot == len(self.pending):
+            return "default"
+
+        return str(self.pending[slot])
+
+    def opened_indices(self, change=None):
+        for index in range(self.opened_files):
+            if change is None or self.opened_change(index) == str(change):
+                yield index
+
+    # Records
+
+    def file_record(self, index):
+        return {
+            "depotFile": self.file_path(index),
+            "rev": str(self.revisions),
+            "change": str(self.change(index, self.revisions)),
+            "action": "edit" if self.revisions > 1 else "add",
+            "type": "binary+l",
+            "time": str(1600000000 + self.change(index, self.revisions))
+        }
+
+    def fstat_record(self, index):
+        change = self.change(index, self.revisions)
+        record = {
+            "depotFile": self.file_path(index),
+            "clientFile": self.client_path(index),
+            "isMapped": "",
+            "headAction": "edit" if self.revisions > 1 else "add",
+            "headType": "binary+l",
+            "headTime": str(1600000000 + change),
+            "headRev": str(self.revisions),
+            "headChange": str(change),
+            "headModTime": str(1600000000 + change),
+            "haveRev": str(self.revisions)
+        }
+
+        opened = self.opened_change(index)
+
+        if opened is not None:
+            record.update({
+                "action": "edit",
+                "change": opened,
+                "type": "binary+l",
+                "actionOwner": self.user,
+                "workRev": str(self.revisions)
+            })
+
+        return record
+
+    def filelog_record(self, index, max_revisions=None, max_rev=None):
+        revs = list(range(min(self.revisions, max_rev or self.revisions), 0, -1))
+
+        if max_revisions:
+            revs = revs[:max_revisions]
+
+        changes = [self.change(index, rev) for rev in revs]
+
+        return {
+            "depotFile": self.file_path(index),
+            "rev": [str(rev) for rev in revs],
+            "change": [str(change) for change in changes],
+            "action": ["edit" if rev > 1 else "add" for rev in revs],
+            "type": ["binary+l" for rev in revs],
+            "time": [str(1600000000 + change) for change in changes],
+            "user": ["user{}".format(change % 7) for change in changes],
+            "client": ["ws{}".format(change % 7) for change in changes],
+            "desc": ["Update {}\n".format(change) for change in changes]
+        }
+
+    def opened_record(self, index):
+        return {
+            "depotFile": self.file_path(index),
+            "clientFile": self.client_path(index),
+            "rev": str(self.revisions),
+            "haveRev": str(self.revisions),
+            "action": "edit",
+            "change": self.opened_change(index),
+            "type": "binary+l",
+            "user": self.user,
+            "client": self.client
+        }
+
+    def change_record(self, change, status="submitted"):
+        return {
+            "change": str(change),
+            "time": str(1600000000 + change),
+            "user": self.user if status == "pending" else "user{}".format(change % 7),
+            "client": self.client if status == "pending" else "ws{}".format(change % 7),
+            "status": status,
+            "changeType": "public",
+            "desc": "Update {}\n".format(change)
+        }
+
+
+class FakeP4(PrivateAttributes, P4):
+    """ In-process stand-in for a P4 connection that answers from a SyntheticDepot.
+
+    Depots are registered per port, so sessions created by a SessionPool with the same port share the same depot.
+    Every command sleeps for the configured latency, plus the per-row latency for each record returned, before it
+    answers. Warnings such as "no such file(s)" raise at the default exception level like a real server.
+    """
+
+    DEPOTS = dict()
+
+    @classmethod
+    def register(cls, port, depot, latency=0.0, row_latency=0.0):
+        """ Registers a depot that connections to a port will answer from.
+
+        Args:
+            port (str)
+            depot (SyntheticDepot)
+            latency (float, dict[str, float]): Seconds per round trip, optionally per command with a "*" default.
+            row_latency (float): Seconds per record returned.
+
+        Returns:
+            None
+        """
+        cls.DEPOTS[port] = (depot, latency, row_latency)
+        return
+
+    def __init__(self, *args, **kwargs):
+        super(FakeP4, self).__init__(*args, **kwargs)
+
+        self._fake = {"connected": False, "depot": None, "latency": 0.0, "row_latency": 0.0}
+
+    def connect(self):
+        if self.port not in FakeP4.DEPOTS:
+            raise P4Exception("[P4.connect()] Connect to server failed; check $P4PORT.")
+
+        depot, latency, row_latency = FakeP4.DEPOTS[self.port]
+        self._fake.update({"connected": True, "depot": depot, "latency": latency, "row_latency": row_latency})
+        return self
+
+    def disconnect(self):
+        self._fake["connected"] = False
+        return
+
+    def connected(self):
+        return self._fake["connected"]
+
+    def depot(self):
+        return self._fake["depot"]
+
+    def run(self, *args, **kwargs):
+        args = self._flatten(args)
+
+        if not self._fake["connected"]:
+            raise P4Exception("[P4#run] Errors during command execution( \"p4 {}\" )\n\n"
+                              "\t[Error]: 'not connected.'".format(args[0] if args else str()))
+
+        command, args = args[0], args[1:]
+        method = getattr(self, "_fake_" + command, None)
+        result = method(args) if method is not None else list()
+
+        latency = self._fake["latency"]
+
+        if isinstance(latency, dict):
+            latency = latency.get(command, latency.get("*", 0.0))
+
+        delay = latency + self._fake["row_latency"] * len(result)
+
+        if delay > 0:
+            time.sleep(delay)
+
+        if not result and command in ("files", "fstat", "filelog", "opened", "dirs", "sync"):
+            if self.exception_level >= P4.RAISE_ALL:
+                raise P4Exception("[P4#run] Warnings during command execution( \"p4 {}\" )\n\n"
+                                  "\t[Warning]: 'no such file(s).'".format(command))
+
+        handler = kwargs.get("handler")
+
+        if isinstance(handler, OutputHandler):
+            for item in result:
+                if isinstance(item, dict):
+                    status = handler.outputStat(item)
+                else:
+                    status = handler.outputMessage(item)
+
+                if status & OutputHandler.CANCEL:
+                    break
+
+            return list()
+
+        return result
+
+    @staticmethod
+    def _flatten(args):
+        result = list()
+
+        for arg in args:
+            if isinstance(arg, (list, tuple)):
+                result += FakeP4._flatten(arg)
+            else:
+                result.append(str(arg))
+
+        return result
+
+    @staticmethod
+    def _options(args, flags=(), values=()):
+        """ Splits command arguments into options and file specs.
+
+        Args:
+            args (list[str])
+            flags (tuple[str]): Options without a value.
+            values (tuple[str]): Options followed by a value.
+
+        Returns:
+            tuple(dict, list[str])
+        """
+        options = dict()
+        specs = list()
+        i = 0
+
+        while i < len(args):
+            arg = args[i]
+
+            if arg in values and i + 1 < len(args):
+                options[arg] = args[i + 1]
+                i += 2
+                continue
+
+            if arg in flags or (arg.startswith("-") and len(arg) > 1):
+                options[arg] = True
+            else:
+                specs.append(arg)
+
+            i += 1
+
+        return options, specs
+
+    def _indices(self, specs):
+        depot = self.depot()
+        found = set()
+
+        for spec in specs:
+            for index in depot.match(spec):
+                if index not in found:
+                    found.add(index)
+                    yield index
+
+    @staticmethod
+    def _filter(expression):
+        """ Compiles an "fstat -F" filter expression into a predicate of a record.
+
+        Supports "=" with "*" wildcards, "<", ">", "<=" and ">=" on integers, "^" negation, "&", "|" and parentheses.
+
+        Args:
+            expression (str)
+
+        Returns:
+            callable
+        """
+        tokens = list()
+        term = str()
+        i = 0
+
+        while i < len(expression):
+            char = expression[i]
+
+            if char == "\\" and i + 1 < len(expression):
+                term += expression[i + 1]
+                i += 2
+                continue
+
+            if char.isspace() or char in "()&|^":
+                if term:
+                    tokens.append(("term", term))
+                    term = str()
+
+                if not char.isspace():
+                    tokens.append((char, char))
+            else:
+                term += char
+
+            i += 1
+
+        if term:
+            tokens.append(("term", term))
+
+        def compile_term(text):
+            for operator in (">=", "<=", "=", ">", "<"):
+                if operator in text:
+                    field, value = text.split(operator, 1)
+                    break
+            else:
+                raise P4Exception("Invalid filter expression: {}".format(expression))
+
+            def predicate(record):
+                actual = record.get(field)
+
+                if actual is None:
+                    return False
+
+                if operator == "=":
+                    return fnmatch.fnmatchcase(str(actual), value)
+
+                actual, expected = int(actual), int(value)
+                return {">": actual > expected, "<": actual < expected,
+                        ">=": actual >= expected, "<=": actual <= expected}[operator]
+
+            return predicate
+
+        def parse_or(position):
+            left, position = parse_and(position)
+
+            while position < len(tokens) and tokens[position][0] == "|":
+                right, position = parse_and(position + 1)
+                left = (lambda a, b: lambda record: a(record) or b(record))(left, right)
+
+            return left, position
+
+        def parse_and(position):
+            left, position = parse_unary(position)
+
+            while position < len(tokens) and tokens[position][0] in ("&", "term", "^", "("):
+                if tokens[position][0] == "&":
+                    position += 1
+
+                right, position = parse_unary(position)
+                left = (lambda a, b: lambda record: a(record) and b(record))(left, right)
+
+            return left, position
+
+        def parse_unary(position):
+            if position >= len(tokens):
+                raise P4Exception("Invalid filter expression: {}".format(expression))
+
+            kind, text = tokens[position]
+
+            if kind == "^":
+                inner, position = parse_unary(position + 1)
+                return (lambda record: not inner(record)), position
+
+            if kind == "(":
+                inner, position = parse_or(position + 1)
+                return inner, position + 1
+
+            return compile_term(text), position + 1
+
+        predicate, _ = parse_or(0)
+        return predicate
+
+    # Commands
+
+    def _fake_info(self, args):
+        depot = self.depot()
+        return [{
+            "userName": depot.user,
+            "clientName": depot.client,
+            "clientRoot": depot.root,
+            "serverAddress": self.port,
+            "serverVersion": "P4D/LINUX26X86_64/FAKE"
+        }]
+
+    def _fake_dirs(self, args):
+        depot = self.depot()
+        result = list()
+
+        for spec in args:
+            if spec == "//*":
+                result.append({"dir": depot.root_path()})
+                continue
+
+            parsed = depot.parse(spec)
+
+            if parsed is None or parsed[1] != "dir" or not depot.dir_exists(parsed[0]):
+                continue
+
+            for prefix in depot.subdirs(parsed[0]):
+                result.append({"dir": depot.dir_path(prefix)})
+
+        return result
+
+    def _fake_files(self, args):
+        options, specs = self._options(args, values=("-m",))
+        return [self.depot().file_record(index) for index in self._indices(specs)]
+
+    def _fake_fstat(self, args):
+        options, specs = self._options(args, values=("-T", "-F", "-O", "-m", "-e"))
+        depot = self.depot()
+        fields = options.get("-T")
+        predicate = self._filter(options["-F"]) if options.get("-F") else None
+        result = list()
+
+        for index in self._indices(specs):
+            if "-Ro" in options and depot.opened_change(index) is None:
+                continue
+
+            record = depot.fstat_record(index)
+
+            if predicate is not None and not predicate(record):
+                continue
+
+            if fields:
+                names = [name.strip() for name in fields.replace(",", " ").split()]
+                record = {name: record[name] for name in names if name in record}
+
+            result.append(record)
+
+        return result
+
+    def _fake_filelog(self, args):
+        options, specs = self._options(args, values=("-m",))
+        max_revisions = int(options["-m"]) if "-m" in options else None
+        result = list()
+
+        for spec in specs:
+            # Only the upper bound of a revision range such as "#1,#42" is honoured
+            max_rev = None
+            revision = spec.split("#")[-1] if "#" in spec else str()
+
+            if revision.isdigit():
+                max_rev = int(revision)
+
+                if max_rev < 1:
+                    continue
+
+            for index in self._indices([spec]):
+                result.append(self.depot().filelog_record(index, max_revisions, max_rev))
+
+        return result
+
+    def _fake_changes(self, args):
+        options, specs = self._options(args, values=("-m", "-s", "-u", "-c"))
+        depot = self.depot()
+        limit = int(options["-m"]) if "-m" in options else None
+        result = list()
+
+        if options.get("-s") == "pending":
+            for change in reversed(depot.pending):
+                result.append(depot.change_record(change, "pending"))
+
+            return result[:limit] if limit else result
+
+        after = 0
+        prefix = None
+
+        for spec in specs:
+            if "@>" in spec:
+                after = int(spec.split("@>")[1])
+
+            parsed = depot.parse(spec)
+
+            if parsed is not None:
+                prefix = parsed[0]
+
+        for change in range(depot.latest_change, after, -1):
+            if limit and len(result) >= limit:
+                break
+
+            index, rev = depot.change_file(change)
+
+            if prefix is not None and depot.leaf_prefix(index // depot.files_per_dir)[:len(prefix)] != prefix:
+                continue
+
+            result.append(depot.change_record(change))
+
+        return result
+
+    def _fake_describe(self, args):
+        options, specs = self._options(args)
+        depot = self.depot()
+        result = list()
+
+        for spec in specs:
+            change = int(spec)
+
+            if change in depot.pending:
+                record = depot.change_record(change, "pending")
+                indices = list(depot.opened_indices(change))
+                revs = [str(depot.revisions) for index in indices]
+                actions = ["edit" for index in indices]
+            elif 0 < change <= depot.latest_change:
+                record = depot.change_record(change)
+                index, rev = depot.change_file(change)
+                indices = [index]
+                revs = [str(rev)]
+                actions = ["edit" if rev > 1 else "add"]
+            else:
+                continue
+
+            record["depotFile"] = [depot.file_path(index) for index in indices]
+            record["action"] = actions
+            record["type"] = ["binary+l" for index in indices]
+            record["rev"] = revs
+            result.append(record)
+
+        return result
+
+    def _fake_opened(self, args):
+        options, specs = self._options(args, values=("-u", "-C", "-c", "-m"))
+        depot = self.depot()
+        change = options.get("-c")
+
+        if specs:
+            indices = [index for index in self._indices(specs) if depot.opened_change(index) is not None]
+        else:
+            indices = list(depot.opened_indices())
+
+        if change is not None:
+            indices = [index for index in indices if depot.opened_change(index) == change]
+
+        return [depot.opened_record(index) for index in indices]
+
+    def _fake_where(self, args):
+        options, specs = self._options(args)
+        depot = self.depot()
+        result = list()
+
+        for spec in specs:
+            parsed = depot.parse(spec)
+
+            if parsed is None:
+                continue
+
+            depot_path = depot.dir_path(parsed[0])
+            result.append({
+                "depotFile": spec,
+                "clientFile": "//" + depot.client + spec[len(depot.root_path()):],
+                "path": depot.root + depot_path[len(depot.root_path()):]
+            })
+
+        return result
+
+    def _file_action(self, args, action):
+        options, specs = self._options(args, values=("-c", "-t"))
+        return [
+            {"depotFile": self.depot().file_path(index), "clientFile": self.depot().client_path(index),
+             "action": action, "rev": str(self.depot().revisions)}
+            for index in self._indices(specs)
+        ]
+
+    def _fake_edit(self, args):
+        return self._file_action(args, "edit")
+
+    def _fake_add(self, args):
+        return self._file_action(args, "add")
+
+    def _fake_delete(self, args):
+        return self._file_action(args, "delete")
+
+    def _fake_revert(self, args):
+        return self._file_action(args, "reverted")
+
+    def _fake_reopen(self, args):
+        return self._file_action(args, "reopened")
+
+    def _fake_lock(self, args):
+        return self._file_action(args, "locked")
+
+    def _fake_sync(self, args):
+        options, specs = self._options(args, values=("--parallel",))
+        depot = self.depot()
+        result = [
+            {"depotFile": depot.file_path(index), "clientFile": depot.client_path(index),
+             "rev": str(depot.revisions), "action": "updated", "fileSize": "1024"}
+            for index in self._indices(specs or [depot.root_path() + "/..."])
+        ]
+
+        # Like a server, the totals of the transfer come with the first file
+        if result:
+            result[0].update({"totalFileCount": str(len(result)), "totalFileSize": str(1024 * len(result))})
+
+        return result
+
+    def _fake_change(self, args):
+        depot = self.depot()
+
+        if "-o" in args:
+            return [{"Change": "new", "Client": depot.client, "User": depot.user, "Status": "new",
+                     "Description": "<enter description here>\n"}]
+
+        depot.pending.append(max(depot.pending + [depot.latest_change]) + 1)
+        return ["Change {} created.".format(depot.pending[-1])]
+
+    def _fake_submit(self, args):
+        depot = self.depot()
+        depot.latest_change += 1
+        return [{"submittedChange": str(depot.latest_change)}]
+
+
+class FakeSession(Session, FakeP4):
+    """ Session that answers from a registered SyntheticDepot.
+    """
@@ -0,0 +1,346 @@
+""" Replays a recorded P4 session against the current build to compare its round trips and wall time.
+
+A recording is captured with pyp4qt.recording.SessionRecorder during a real session. The replay backend answers every
+command from the recording, sleeping for the recorded latency (optionally scaled) so the wall time reflects the
+original server. A scenario is a function that takes a session and repeats the user actions of the recording, e.g.
+opening the browser, expanding three shots and submitting.
+
+Usage:
+    python -m test_perforce.benchmarks.replay_p4 browse.p4rec.gz --scenario my_scenarios:open_expand_submit
+    python -m test_perforce.benchmarks.replay_p4 browse.p4rec.gz --latency-scale 0.5
+"""
+
+# Python Modules
+import os
+import sys
+import time
+import argparse
+import importlib
+from collections import deque
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+from P4 import P4, P4Exception, OutputHandler
+
+# Project Modules
+from pyp4qt.session import Session, PrivateAttributes
+from pyp4qt.recording import load_recording
+from pyp4qt.tracing import CommandTracer
+
+
+class Recording(object):
+    """ Responses of a recording keyed by the exact command and arguments that produced them.
+
+    When a command was sent several times its responses are served in the recorded order, and the last one is
+    repeated once they run out.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.header, self.commands, self.marks = load_recording(path)
+
+        self._responses = dict()
+
+        for entry in self.commands:
+            self._responses.setdefault(tuple(entry["args"]), list()).append(entry)
+
+    def round_trips(self):
+        return len(self.commands)
+
+    def wall_time(self):
+        """ Returns the time from the first command sent to the last command answered.
+
+        Returns:
+            float
+        """
+        if not self.commands:
+            return 0.0
+
+        start = min(entry["offset"] for entry in self.commands)
+        end = max(entry["offset"] + entry["elapsed"] for entry in self.commands)
+        return end - start
+
+    def server_time(self):
+        return sum(entry["elapsed"] for entry in self.commands)
+
+    def queues(self):
+        """ Returns a fresh queue of responses per command, for a replay to consume.
+
+        Returns:
+            dict[tuple, deque]
+        """
+        return {key: deque(entries) for key, entries in self._responses.items()}
+
+
+class ReplayP4(PrivateAttributes, P4):
+    """ In-process stand-in for a P4 connection that answers from a Recording.
+
+    Recordings are registered per port, so sessions created by a SessionPool with the same port replay the same
+    recording. Commands that weren't recorded answer with no results and are counted as misses, since they mean the
+    build being tested asks the server for something the recorded build didn't.
+    """
+
+    RECORDINGS = dict()
+
+    @classmethod
+    def register(cls, port, recording, latency_scale=1.0):
+        """ Registers a recording that connections to a port will answer from.
+
+        Args:
+            port (str)
+            recording (Recording)
+            latency_scale (float): Multiplier of the recorded latencies, 0 to answer immediately.
+
+        Returns:
+            None
+        """
+        cls.RECORDINGS[port] = {
+            "recording": recording,
+            "latency_scale": latency_scale,
+            "queues": recording.queues(),
+            "misses": list()
+        }
+        return
+
+    @classmethod
+    def misses(cls, port):
+        """ Returns the commands sent to a port that weren't in its recording.
+
+        Args:
+            port (str)
+
+        Returns:
+            list[list[str]]
+        """
+        return list(cls.RECORDINGS[port]["misses"])
+
+    def __init__(self, *args, **kwargs):
+        super(ReplayP4, self).__init__(*args, **kwargs)
+
+        self._replay = None
+
+    def connect(self):
+        if self.port not in ReplayP4.RECORDINGS:
+            raise P4Exception("[P4.connect()] Connect to server failed; check $P4PORT.")
+
+        self._replay = ReplayP4.RECORDINGS[self.port]
+        return self
+
+    def disconnect(self):
+        self._replay = None
+        return
+
+    def connected(self):
+        return self._replay is not None
+
+    def run(self, *args, **kwargs):
+        args = self._flatten(args)
+
+        if self._replay is None:
+            raise P4Exception("[P4#run] Errors during command execution( \"p4 {}\" )\n\n"
+                              "\t[Error]: 'not connected.'".format(args[0] if args else str()))
+
+        queue = self._replay["queues"].get(tuple(args))
+
+        if not queue:
+            self._replay["misses"].append(args)
+            return list()
+
+        entry = queue.popleft() if len(queue) > 1 else queue[0]
+        delay = entry["elapsed"] * self._replay["latency_scale"]
+
+        if delay > 0:
+            time.sleep(delay)
+
+        error = entry["error"]
+
+        if error:
+            warning = "[Error]" not in error
+
+            if self.exception_level >= (P4.RAISE_ALL if warning else P4.RAISE_ERRORS):
+                raise P4Exception(error)
+
+        result = list(entry["result"])
+        handler = kwargs.get("handler")
+
+        if isinstance(handler, OutputHandler):
+            for item in result:
+                if isinstance(item, dict):
+                    status = handler.outputStat(item)
+                else:
+                    status = handler.outputMessage(item)
+
+                if status & OutputHandler.CANCEL:
+                    break
+
+            return list()
+
+        return result
+
+    @staticmethod
+    def _flatten(args):
+        result = list()
+
+        for arg in args:
+            if isinstance(arg, (list, tuple)):
+                result += ReplayP4._flatten(arg)
+            else:
+                result.append(str(arg))
+
+        return result
+
+
+class ReplaySession(Session, ReplayP4):
+    """ Session whose commands are answered from a recording.
+    """
+    pass
+
+
+def replay_commands(session):
+    """ Default scenario that sends the recorded commands again in their recorded order.
+
+    Args:
+        session (ReplaySession)
+
+    Returns:
+        None
+    """
+    recording = ReplayP4.RECORDINGS[session.port]["recording"]
+
+    for entry in sorted(recording.commands, key=lambda item: item["offset"]):
+        try:
+            session.run(entry["args"])
+        except P4Exception:
+            pass
+    return
+
+
+def load_scenario(name):
+    """ Returns a scenario function from its "module:function" name.
+
+    Args:
+        name (str)
+
+    Returns:
+        callable
+    """
+    if ":" not in name:
+        raise RuntimeError("Scenario must be given as module:function, got {}".format(name))
+
+    module, function = name.split(":", 1)
+    return getattr(importlib.import_module(module), function)
+
+
+def replay(path, scenario=replay_commands, latency_scale=1.0):
+    """ Runs a scenario against a recording and compares it with the recorded session.
+
+    Args:
+        path (str): Path of the recording.
+        scenario (callable): Called with a connected ReplaySession.
+        latency_scale (float)
+
+    Returns:
+        dict
+    """
+    recording = Recording(path)
+    port = "replay:{}".format(os.path.basename(path))
+    ReplayP4.register(port, recording, latency_scale)
+
+    tracer = CommandTracer()
+
+    session = ReplaySession()
+    session.port = port
+    session.user = recording.header.get("user") or session.user
+    session.client = recording.header.get("client") or session.client
+    session.add_tracer(tracer)
+    session.connect()
+
+    start = time.perf_counter()
+
+    try:
+        scenario(session)
+    finally:
+        wall_time = time.perf_counter() - start
+        session.disconnect()
+
+    return {
+        "recorded": {
+            "round_trips": recording.round_trips(),
+            "wall_time": recording.wall_time() * latency_scale,
+            "commands": _count_commands(entry["args"] for entry in recording.commands)
+        },
+        "replayed": {
+            "round_trips": sum(stats["count"] for stats in tracer.stats().values()),
+            "wall_time": wall_time,
+            "commands": {command: stats["count"] for command, stats in tracer.stats().items()}
+        },
+        "misses": ReplayP4.misses(port)
+    }
+
+
+def _count_commands(args_list):
+    result = dict()
+
+    for args in args_list:
+        command = args[0] if args else str()
+        result[command] = result.get(command, 0) + 1
+
+    return result
+
+
+def report(result):
+    """ Returns a readable comparison of a replay with its recording.
+
+    Args:
+        result (dict)
+
+    Returns:
+        str
+    """
+    recorded = result["recorded"]
+    replayed = result["replayed"]
+
+    line = "{:<16} {:>12} {:>12} {:>12}"
+    lines = [
+        line.format(str(), "recorded", "replayed", "change"),
+        line.format("round trips", recorded["round_trips"], replayed["round_trips"],
+                    replayed["round_trips"] - recorded["round_trips"]),
+        line.format("wall s", "{:.3f}".format(recorded["wall_time"]), "{:.3f}".format(replayed["wall_time"]),
+                    "{:+.3f}".format(replayed["wall_time"] - recorded["wall_time"])),
+        str()
+    ]
+
+    for command in sorted(set(recorded["commands"]) | set(replayed["commands"])):
+        before = recorded["commands"].get(command, 0)
+        after = replayed["commands"].get(command, 0)
+        lines.append(line.format(command, before, after, after - before))
+
+    if result["misses"]:
+        lines.append(str())
+        lines.append("{} commands were not in the recording:".format(len(result["misses"])))
+
+        for args in result["misses"][:20]:
+            lines.append("    p4 " + " ".join(args))
+
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("recording", help="Path of a recording made with SessionRecorder.")
+    parser.add_argument("--scenario", default=None, help="Scenario to run as module:function.")
+    parser.add_argument("--latency-scale", type=float, default=1.0, help="Multiplier of the recorded latencies.")
+    args = parser.parse_args(argv)
+
+    scenario = load_scenario(args.scenario) if args.scenario else replay_commands
+
+    # Scenarios that drive the models need an application
+    from PySide2.QtWidgets import QApplication
+    app = QApplication.instance() or QApplication(sys.argv[:1])
+
+    print(report(replay(args.recording, scenario, args.latency_scale)))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,366 @@
+""" Scaling benchmarks for Session and the depot models against an in-process fake P4 server.
+
+Every operation runs against a SyntheticDepot of each requested size and reports its wall time, the number of round
+trips sent to the server and the peak Python memory allocated while it ran. No server or display is needed.
+
+Usage:
+    python -m test_perforce.benchmarks.run_benchmarks --files 1000 10000 100000 --latency 0.005
+    python -m test_perforce.benchmarks.run_benchmarks --files 1000000 --operations listing expand --json out.json
+"""
+
+# Python Modules
+import os
+import sys
+import json
+import time
+import argparse
+import tracemalloc
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+# Qt Modules
+from PySide2.QtCore import Qt, QModelIndex
+from PySide2.QtWidgets import QApplication
+
+# Project Modules
+import pyp4qt.utils
+from pyp4qt.tracing import CommandTracer
+from pyp4qt.qt.depot_model import DepotModel, DepotItem
+from pyp4qt.qt.config_depot_model import ConfigDepotModel, ConfigDepotItem
+from pyp4qt.qt.pending_model import PendingModel
+from test_perforce.benchmarks.fake_p4 import SyntheticDepot, FakeP4, FakeSession
+
+
+class BenchmarkResult(object):
+    """ Measurements of a single operation against a depot of a given size.
+    """
+
+    def __init__(self, operation, files, wall_time, round_trips, peak_memory, rows=0):
+        self.operation = operation
+        self.files = files
+        self.wall_time = wall_time
+        self.round_trips = round_trips
+        self.peak_memory = peak_memory
+        self.rows = rows
+
+    def to_dict(self):
+        return dict(vars(self))
+
+
+def measure(session, operation, files, function):
+    """ Runs a function with a session and measures it.
+
+    Args:
+        session (FakeSession)
+        operation (str)
+        files (int): Size of the depot.
+        function (callable): Called with the session, returns the number of rows it produced.
+
+    Returns:
+        BenchmarkResult
+    """
+    tracer = CommandTracer()
+    session.add_tracer(tracer)
+
+    tracemalloc.start()
+    start = time.perf_counter()
+
+    try:
+        rows = function(session, tracer)
+    finally:
+        wall_time = time.perf_counter() - start
+        peak_memory = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        session.remove_tracer(tracer)
+
+    round_trips = sum(stats["count"] for stats in tracer.stats().values())
+    return BenchmarkResult(operation, files, wall_time, round_trips, peak_memory, rows or 0)
+
+
+# Number of times the views are painted by the repaint operation
+REPAINTS = 10
+
+
+def wait_for(condition, timeout=600.0):
+    """ Processes Qt events until a condition is met.
+
+    Args:
+        condition (callable)
+        timeout (float)
+
+    Returns:
+        None
+    """
+    app = QApplication.instance()
+    end = time.time() + timeout
+
+    while not condition():
+        if time.time() > end:
+            raise RuntimeError("Timed out waiting for the model.")
+
+        app.processEvents()
+        time.sleep(0.001)
+    return
+
+
+# Operations
+
+def list_directory(session, tracer):
+    depot = session.depot()
+    leaf = depot.dir_path(depot.leaf_prefix(0))
+
+    dirs = session.depot_dirs(depot.dir_path(depot.leaf_prefix(0)[:-1]))
+    files = session.depot_files(leaf)
+    filtered = session.depot_files(leaf, extension_filter=[".ma", ".mb"])
+
+    return len(dirs) + len(files) + len(filtered)
+
+
+def list_recursive(session, tracer):
+    return len(session.depot_files(session.depot().root_path(), recursive=True))
+
+
+def expand_depot_model(session, tracer):
+    model = DepotModel(None, session)
+    model.pool().add_tracer(tracer)
+
+    parent = QModelIndex()
+    rows = 0
+
+    # Expand the first directory of every level down to the first leaf
+    while True:
+        index = model.index(0, 0, parent)
+
+        if not index.isValid() or model.itemFromIndex(index).type() != DepotItem.TYPE_DIR:
+            break
+
+        item = model.itemFromIndex(index)
+
+        if model.canFetchMore(index):
+            model.fetchMore(index)
+            wait_for(lambda: not model.isFetching(item))
+
+        rows += model.rowCount(index)
+        parent = index
+
+    model.clear()
+    return rows
+
+
+def expand_config_model(session, tracer):
+    depot = session.depot()
+    item = ConfigDepotItem(session, type=DepotItem.TYPE_DIR, path=depot.dir_path(depot.leaf_prefix(0)))
+    item.load()
+
+    return item.childCount()
+
+
+def refresh_pending(session, tracer):
+    model = PendingModel(None, session)
+    rows = 0
+
+    for row in range(model.rowCount()):
+        rows += model.rowCount(model.index(row, 0, QModelIndex()))
+
+    return rows
+
+
+def paint(model, parent=QModelIndex(), depth=2):
+    """ Calls what a view calls on every visible row while painting.
+
+    Args:
+        model (QAbstractItemModel)
+        parent (QModelIndex)
+        depth (int): Number of expanded levels below the parent.
+
+    Returns:
+        int: The number of rows painted.
+    """
+    rows = 0
+
+    for row in range(model.rowCount(parent)):
+        index = model.index(row, 0, parent)
+
+        model.hasChildren(index)
+        model.data(index, Qt.DisplayRole)
+        rows += 1
+
+        if depth > 1:
+            rows += paint(model, index, depth - 1)
+
+    return rows
+
+
+def repaint_models(session, tracer):
+    depot = session.depot()
+
+    # Building the models isn't measured, only painting their unloaded nodes
+    session.remove_tracer(tracer)
+
+    try:
+        depot_model = DepotModel(None, session)
+        pending_model = PendingModel(None, session)
+        config_model = ConfigDepotModel(None, session)
+
+        # A loaded directory of unloaded files next to an unloaded directory
+        directory = ConfigDepotItem(session, type=DepotItem.TYPE_DIR, path=depot.dir_path(depot.leaf_prefix(0)))
+        directory.load()
+
+        config_model.root().append_child(directory)
+        config_model.root().append_child(
+            ConfigDepotItem(session, type=DepotItem.TYPE_DIR, path=depot.dir_path(depot.leaf_prefix(1)))
+        )
+    finally:
+        session.add_tracer(tracer)
+
+    depot_model.pool().add_tracer(tracer)
+    rows = 0
+
+    for _ in range(REPAINTS):
+        for model in (depot_model, pending_model, config_model):
+            rows += paint(model)
+
+    depot_model.clear()
+    return rows
+
+
+def submit_selection(session, tracer):
+    depot = session.depot()
+    opened = [depot.client_path(index) for index in depot.opened_indices("default")]
+    selection = opened[:max(1, len(opened) // 2)]
+
+    pyp4qt.utils.submit_change(session, selection, "Benchmark submit", None)
+    return len(selection)
+
+
+OPERATIONS = [
+    ("listing", list_directory),
+    ("listing recursive", list_recursive),
+    ("expand depot", expand_depot_model),
+    ("expand config", expand_config_model),
+    ("pending refresh", refresh_pending),
+    ("repaint", repaint_models),
+    ("submit selection", submit_selection)
+]
+
+
+def run(files_list,
+        fan_out=10,
+        files_per_dir=100,
+        revisions=3,
+        pending_changelists=40,
+        opened_files=3000,
+        latency=0.0,
+        row_latency=0.0,
+        operations=None
+        ):
+    """ Runs the benchmarks for every depot size.
+
+    Args:
+        files_list (list[int])
+        fan_out (int)
+        files_per_dir (int)
+        revisions (int)
+        pending_changelists (int)
+        opened_files (int)
+        latency (float): Seconds per round trip.
+        row_latency (float): Seconds per record returned.
+        operations (list[str]): Operation names to run, all of them if None.
+
+    Returns:
+        list[BenchmarkResult]
+    """
+    result = list()
+
+    for files in files_list:
+        depot = SyntheticDepot(
+            files=files,
+            fan_out=fan_out,
+            files_per_dir=files_per_dir,
+            revisions=revisions,
+            pending_changelists=pending_changelists,
+            opened_files=opened_files
+        )
+
+        port = "fake:{}".format(files)
+        FakeP4.register(port, depot, latency, row_latency)
+
+        session = FakeSession()
+        session.port = port
+        session.connect()
+
+        for name, function in OPERATIONS:
+            if operations and not any(name.startswith(operation) for operation in operations):
+                continue
+
+            result.append(measure(session, name, files, function))
+
+        session.disconnect()
+
+    return result
+
+
+def report(results):
+    """ Returns a readable table of results.
+
+    Args:
+        results (list[BenchmarkResult])
+
+    Returns:
+        str
+    """
+    line = "{:<20} {:>10} {:>12} {:>12} {:>12} {:>10}"
+    lines = [line.format("operation", "files", "wall s", "round trips", "peak MB", "rows")]
+
+    for item in results:
+        lines.append(line.format(
+            item.operation,
+            item.files,
+            "{:.3f}".format(item.wall_time),
+            item.round_trips,
+            "{:.1f}".format(item.peak_memory / 1048576.0),
+            item.rows
+        ))
+
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--files", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--fan-out", type=int, default=10)
+    parser.add_argument("--files-per-dir", type=int, default=100)
+    parser.add_argument("--revisions", type=int, default=3)
+    parser.add_argument("--pending", type=int, default=40)
+    parser.add_argument("--opened", type=int, default=3000)
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds per round trip.")
+    parser.add_argument("--row-latency", type=float, default=0.0, help="Seconds per record returned.")
+    parser.add_argument("--operations", nargs="+", default=None, help="Names of the operations to run.")
+    parser.add_argument("--json", default=None, help="Path to write the results to as JSON.")
+    args = parser.parse_args(argv)
+
+    app = QApplication.instance() or QApplication(sys.argv[:1])
+
+    results = run(
+        args.files,
+        fan_out=args.fan_out,
+        files_per_dir=args.files_per_dir,
+        revisions=args.revisions,
+        pending_changelists=args.pending,
+        opened_files=args.opened,
+        latency=args.latency,
+        row_latency=args.row_latency,
+        operations=args.operations
+    )
+
+    print(report(results))
+
+    if args.json:
+        with open(args.json, "w") as _file:
+            json.dump([item.to_dict() for item in results], _file, indent=4)
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())